@@ -0,0 +1,180 @@
+"""Per-frame activity scores, for finding the busy parts of a long recording.
+
+A frame's activity is its motion energy: the mean absolute difference, in
+gray levels, between its 64x36 signature (see capture_filters) and the
+previous saved frame's. The writer pool makes the signature while the frame
+is at hand, and the score is recorded in capture order as the frame is
+saved, so a week of captures can be ranked without decoding any of them.
+
+Scores live in a compact append-only file in the capture folder
+(.timelapse_activity), one 16-byte record per frame keyed by the catalog
+sequence number and capture time, and are held in NumPy arrays in memory.
+Frames captured before the index existed are scored on demand by
+fill_activity() from a 1/8 scale decode.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from capture_filters import SIGNATURE_SIZE, signature_difference
+from frame_catalog import TEMP_SUFFIX
+
+ACTIVITY_FILENAME = ".timelapse_activity"
+COMPACT_DEAD_RATIO = 0.5
+
+RECORD_DTYPE = np.dtype([("seq", "<u4"), ("timestamp", "<f8"), ("score", "<f4")])
+
+
+def signature_from_bytes(data):
+    """The capture_filters signature of encoded image bytes, from a 1/8 scale decode; None if unreadable"""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    return cv2.resize(image, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class ActivityIndex:
+    """The activity file of a capture folder"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._count = 0
+        self._file = None
+        self._last_signature = None  # Signature of the last frame passed to record()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, ACTIVITY_FILENAME)
+
+    def load(self, frames=None):
+        """Read the scores; those of frames no longer in `frames` are dropped"""
+        with self._lock:
+            self.close()
+            try:
+                records = np.fromfile(self.path, dtype=np.uint8)
+            except OSError:
+                records = np.zeros(0, dtype=np.uint8)
+            whole = len(records) - len(records) % RECORD_DTYPE.itemsize
+            if whole < len(records):
+                # Cut off a record that was only partly written
+                with open(self.path, "r+b") as f:
+                    f.truncate(whole)
+            self._records = records[:whole].view(RECORD_DTYPE).copy()
+            self._count = len(self._records)
+
+            if frames is not None and self._count:
+                live = self._rows(frames) if frames else np.zeros(0, dtype=np.int64)
+                live = np.unique(live[live >= 0])
+                if self._count - len(live) > self._count * COMPACT_DEAD_RATIO:
+                    self._compact(self._records[live])
+        return self
+
+    def _compact(self, records):
+        tmp_path = self.path + TEMP_SUFFIX
+        records.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        self._records = records.copy()
+        self._count = len(records)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rows(self, frames):
+        """Row of each frame's newest record, -1 where it has none; call with the lock held"""
+        records = self._records[:self._count]
+        seqs = np.fromiter((frame.seq for frame in frames), dtype=np.int64, count=len(frames))
+        times = np.fromiter((frame.timestamp for frame in frames), dtype=np.float64, count=len(frames))
+        if not len(records):
+            return np.full(len(frames), -1, dtype=np.int64)
+        order = np.argsort(records["seq"], kind="stable")
+        sorted_seqs = records["seq"][order].astype(np.int64)
+        # The last of several records of a sequence number is the current one
+        found = np.searchsorted(sorted_seqs, seqs, side="right") - 1
+        rows = order[np.maximum(found, 0)]
+        # The catalog log keeps timestamps to the millisecond
+        match = (found >= 0) & (sorted_seqs[np.maximum(found, 0)] == seqs)
+        match &= np.abs(records["timestamp"][rows] - times) < 0.002
+        return np.where(match, rows, -1)
+
+    def add(self, frame, score):
+        """Store the activity score of a catalog frame"""
+        self.add_many([frame], [score])
+
+    def add_many(self, frames, scores):
+        """Store the activity scores of several catalog frames in one write"""
+        records = np.array([(frame.seq, frame.timestamp, score) for frame, score in zip(frames, scores)],
+                           dtype=RECORD_DTYPE)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(records.tobytes())
+            self._file.flush()
+            needed = self._count + len(records)
+            if needed > len(self._records):
+                grown = np.zeros(max(1024, 2 * len(self._records), needed), dtype=RECORD_DTYPE)
+                grown[:self._count] = self._records[:self._count]
+                self._records = grown
+            self._records[self._count:needed] = records
+            self._count = needed
+
+    def record(self, frame, signature):
+        """Score a newly saved frame against the one saved before it"""
+        previous, self._last_signature = self._last_signature, signature
+        if previous is None or previous.shape != signature.shape:
+            return  # Nothing to compare with, fill_activity() scores it later if needed
+        self.add(frame, signature_difference(signature, previous))
+
+    def scores(self, frames):
+        """float32 array of the frames' scores, NaN where a frame has none"""
+        with self._lock:
+            rows = self._rows(frames)
+            scores = np.full(len(frames), np.nan, dtype=np.float32)
+            known = rows >= 0
+            scores[known] = self._records["score"][rows[known]]
+        return scores
+
+    def __len__(self):
+        return self._count
+
+
+def fill_activity(catalog, frames, index=None, threads=4, cancelled=None):
+    """Scores of `frames` (chronological), computing the ones `index` does not have.
+
+    A missing score needs the frame and the one before it, decoded at 1/8
+    scale on a thread pool. New scores are added to the index. The first
+    frame of the list has nothing before it and scores NaN unless known.
+    """
+    scores = index.scores(frames) if index is not None else np.full(len(frames), np.nan, dtype=np.float32)
+    missing = [i for i in np.flatnonzero(np.isnan(scores)).tolist() if i > 0]
+    if not missing:
+        return scores
+    needed = sorted(set(missing) | {i - 1 for i in missing})
+
+    def signature(i):
+        if cancelled is not None and cancelled():
+            return None
+        try:
+            return signature_from_bytes(catalog.read_bytes(frames[i]))
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="Activity") as pool:
+        signatures = dict(zip(needed, pool.map(signature, needed)))
+    scored = []
+    for i in missing:
+        current, previous = signatures.get(i), signatures.get(i - 1)
+        if current is None or previous is None or current.shape != previous.shape:
+            continue
+        scores[i] = signature_difference(current, previous)
+        scored.append(i)
+    if index is not None and scored:
+        index.add_many([frames[i] for i in scored], [scores[i] for i in scored])
+    return scores
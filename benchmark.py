@@ -0,0 +1,257 @@
+"""Performance benchmarks that run without a webcam.
+
+    python benchmark.py                       # every benchmark, JSON on stdout
+    python benchmark.py -o hasil.json         # ...and written to a file
+    python benchmark.py --quick               # smaller workloads
+    python benchmark.py --compare lama.json   # compare with an earlier run
+
+Frames come from frame_source.SyntheticCamera, so results only depend on the
+machine and the code. The output is JSON; --compare reports the change of
+every metric against an earlier result file and exits with status 1 when a
+metric got worse by more than --threshold, so it can gate a release.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from capture_engine import CaptureEngine
+from frame_catalog import FrameCatalog
+from frame_pack import FramePackStore
+from frame_source import SyntheticCamera
+from video_render import ParallelRenderJob, RenderJob
+
+RESULT_VERSION = 1
+COMPRESSIONS = (50, 70, 85, 95)
+RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080))
+
+# Metric name endings and whether a larger value is better
+HIGHER_IS_BETTER = ("fps", "mb_per_sec")
+LOWER_IS_BETTER = ("ms", "cpu_percent")
+
+
+def encode(frame, quality):
+    ok, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes()
+
+
+def bench_capture_loop(workdir, seconds, low_power=False, preview_fps=10, resolution=(0, 0)):
+    """CPU used by the capture loop, writer pool and preview for a 30 FPS camera"""
+    name = "capture_loop_low_power" if low_power else "capture_loop"
+    engine = CaptureEngine(interval=1, output_dir=os.path.join(workdir, name),
+                           camera_index="synthetic:1280x720@30", preview_fps=preview_fps,
+                           resolution=resolution, low_power=low_power)
+    timer = threading.Timer(seconds, engine.stop)
+    timer.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    engine.run()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    timer.cancel()
+    return {
+        "seconds": round(wall, 2),
+        "captures": engine.saved_count,
+        "cpu_percent": round(cpu / wall * 100, 1),
+    }
+
+
+def bench_encode(seconds_each):
+    """JPEG encode throughput for every compression/resolution combination"""
+    results = {}
+    for width, height in RESOLUTIONS:
+        frame = SyntheticCamera((width, height), fps=0).read()[1]
+        for quality in COMPRESSIONS:
+            count = 0
+            total_bytes = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds_each:
+                total_bytes += len(encode(frame, quality))
+                count += 1
+            elapsed = time.perf_counter() - start
+            results[f"{width}x{height}_q{quality}"] = {
+                "fps": round(count / elapsed, 1),
+                "kb_per_frame": round(total_bytes / count / 1024, 1),
+            }
+    return results
+
+
+def make_frames(directory, count, size, quality=85):
+    """Fill a folder with `count` captures one minute apart, returns their encoded bytes"""
+    os.makedirs(directory, exist_ok=True)
+    camera = SyntheticCamera(size, fps=0)
+    samples = [encode(camera.read()[1], quality) for _ in range(min(count, 20))]
+    start = datetime(2024, 1, 1).timestamp()
+    for i in range(count):
+        name = f"capture_{datetime.fromtimestamp(start + i * 60).strftime('%Y%m%d_%H%M%S')}.jpg"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(samples[i % len(samples)])
+    return samples
+
+
+def bench_storage_scan(workdir, count):
+    """How long it takes to open a capture folder with many frames"""
+    directory = os.path.join(workdir, "scan")
+    samples = make_frames(directory, count, (320, 180))
+
+    start = time.perf_counter()
+    FrameCatalog(directory).load()  # Every file is stat-ed and its JPEG header read
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    FrameCatalog(directory).load()  # Known frames come from the catalog log
+    warm = time.perf_counter() - start
+
+    packs = FramePackStore(os.path.join(workdir, "scan_pack")).load()
+    start_ts = datetime(2024, 1, 1).timestamp()
+    for i in range(count):
+        name = f"frame_{i}"
+        packs.write_file(name, samples[i % len(samples)])
+        packs.add(name, start_ts + i * 60, 320, 180)
+    packs.close()
+    start = time.perf_counter()
+    FramePackStore(os.path.join(workdir, "scan_pack")).load()
+    pack = time.perf_counter() - start
+
+    return {
+        "frames": count,
+        "catalog_cold_ms": round(cold * 1000, 1),
+        "catalog_warm_ms": round(warm * 1000, 1),
+        "pack_load_ms": round(pack * 1000, 1),
+    }
+
+
+def bench_render(workdir, count, parallel=False):
+    """generate_video throughput for 1280x720 captures"""
+    directory = os.path.join(workdir, "render")
+    if not os.path.isdir(directory):
+        make_frames(directory, count, (1280, 720))
+    catalog = FrameCatalog(directory).load()
+    if parallel:
+        job = ParallelRenderJob(catalog, catalog.frames(), os.path.join(workdir, "render.avi"))
+    else:
+        job = RenderJob(catalog, catalog.frames(), os.path.join(workdir, "render.mp4"))
+    start = time.perf_counter()
+    job.run()
+    elapsed = time.perf_counter() - start
+    catalog.close()
+    return {
+        "frames": job.frames_written,
+        "fps": round(job.frames_written / elapsed, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(quick=False, only=None):
+    workdir = tempfile.mkdtemp(prefix="timelapse_bench_")
+    benchmarks = {
+        "capture_loop": lambda: bench_capture_loop(workdir, 3 if quick else 10),
+        # Unattended 360p recording on battery: no preview, the camera scales the frames
+        "capture_loop_low_power": lambda: bench_capture_loop(workdir, 3 if quick else 10, low_power=True,
+                                                             preview_fps=0, resolution=(640, 360)),
+        "encode": lambda: bench_encode(0.2 if quick else 1.0),
+        "storage_scan": lambda: bench_storage_scan(workdir, 2000 if quick else 20000),
+        "render": lambda: bench_render(workdir, 60 if quick else 300),
+        "render_parallel": lambda: bench_render(workdir, 60 if quick else 300, parallel=True),
+    }
+    results = {}
+    try:
+        for name, bench in benchmarks.items():
+            if only and name not in only:
+                continue
+            print(f"Menjalankan {name}...", file=sys.stderr, flush=True)
+            results[name] = bench()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": RESULT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def flatten(results, prefix=""):
+    """{"encode": {"640x360_q50": {"fps": 1}}} -> {"encode/640x360_q50/fps": 1}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "/"))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """Print every metric's change, returns the names of the metrics that regressed"""
+    old = flatten(baseline["results"])
+    new = flatten(current["results"])
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        if name.endswith(HIGHER_IS_BETTER):
+            direction = 1
+        elif name.endswith(LOWER_IS_BETTER):
+            direction = -1
+        else:
+            continue
+        if old[name] == 0:
+            continue
+        change = (new[name] - old[name]) / old[name]
+        marker = ""
+        if change * direction < -threshold:
+            regressions.append(name)
+            marker = "  << REGRESI"
+        print(f"{name}: {old[name]} -> {new[name]} ({change:+.1%}){marker}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark perekam timelapse tanpa webcam")
+    parser.add_argument("-o", "--output", help="simpan hasil JSON ke file")
+    parser.add_argument("--quick", action="store_true", help="beban kerja lebih kecil")
+    parser.add_argument("--only", nargs="+", choices=("capture_loop", "capture_loop_low_power", "encode", "storage_scan", "render",
+                                                     "render_parallel"),
+                        help="jalankan benchmark tertentu saja")
+    parser.add_argument("--compare", metavar="JSON", help="bandingkan dengan hasil sebelumnya")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="penurunan yang dianggap regresi (default: 0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    result = run_benchmarks(quick=args.quick, only=args.only)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, result, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,4 +15,12 @@ subprocess.call([
     "timelapse.py"
 ])
 
-print("Selesai! File exe berada di folder 'dist'.") 
\ No newline at end of file
+print("Membuat executable CLI (tanpa GUI)...")
+subprocess.call([
+    "pyinstaller",
+    "--noconfirm",
+    "--clean",
+    "TimelapseCLI.spec"  # One-dir tanpa UPX agar startup cepat
+])
+
+print("Selesai! File exe berada di folder 'dist' (CLI di 'dist/TimelapseCLI').") 
\ No newline at end of file
@@ -2,6 +2,7 @@
 echo Membuat file executable...
 
 python -m PyInstaller --name=Timelapse --windowed --onefile --clean timelapse.py
+python -m PyInstaller --noconfirm --clean TimelapseCLI.spec
 
 echo.
 echo Jika berhasil, file Timelapse.exe akan berada di folder "dist"
@@ -0,0 +1,108 @@
+"""Camera discovery and capturing from several cameras at once.
+
+Opening a camera index that has no device behind it can block for seconds,
+so probe_cameras tries the indices in parallel. MultiCapture runs one
+CaptureEngine per camera, each on its own thread and in its own subfolder
+(cam0, cam1, ...) with its own catalog and storage budget. The engines share
+a capture_schedule.CaptureClock, so every camera saves its frames with the
+same timestamps and video_render.GridRenderJob can put them side by side.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from capture_schedule import CaptureClock
+
+CAMERA_DIR_PREFIX = "cam"
+MAX_PROBE_INDEX = 8
+
+
+def probe_camera(index):
+    """Open a camera and grab one frame, returns (index, width, height) or None"""
+    camera = cv2.VideoCapture(index)
+    try:
+        if not camera.isOpened():
+            return None
+        ret, frame = camera.read()
+        if not ret or frame is None:
+            return None
+        return index, frame.shape[1], frame.shape[0]
+    finally:
+        camera.release()
+
+
+def probe_cameras(max_index=MAX_PROBE_INDEX):
+    """The working cameras among indices 0..max_index-1, probed in parallel"""
+    with ThreadPoolExecutor(max_workers=max_index, thread_name_prefix="CameraProbe") as pool:
+        results = list(pool.map(probe_camera, range(max_index)))
+    return [result for result in results if result is not None]
+
+
+def camera_dir(output_dir, index):
+    return os.path.join(output_dir, f"{CAMERA_DIR_PREFIX}{index}")
+
+
+def list_camera_dirs(output_dir):
+    """Camera subfolders of a multi-camera capture, in camera order"""
+    if not os.path.isdir(output_dir):
+        return []
+    indices = []
+    for name in os.listdir(output_dir):
+        suffix = name[len(CAMERA_DIR_PREFIX):]
+        if name.startswith(CAMERA_DIR_PREFIX) and suffix.isdigit() and os.path.isdir(os.path.join(output_dir, name)):
+            indices.append(int(suffix))
+    return [camera_dir(output_dir, index) for index in sorted(indices)]
+
+
+class MultiCapture:
+    """Runs one CaptureEngine per camera, each on its own thread.
+
+    The storage limit is split evenly between the cameras. Status messages
+    are prefixed with the camera index before being passed to on_status.
+    """
+
+    def __init__(self, cameras, output_dir="captures", interval=60, max_storage_mb=1000,
+                 on_status=None, **settings):
+        from capture_engine import CaptureEngine
+
+        on_status = on_status or (lambda message: None)
+        # Frames taken for the same slot get identical timestamps on every camera
+        self.clock = CaptureClock(interval, settings.get("schedule"), align=True)
+        self.engines = []
+        for index in cameras:
+            self.engines.append(CaptureEngine(
+                interval=interval,
+                output_dir=camera_dir(output_dir, index),
+                max_storage_mb=max_storage_mb / len(cameras),
+                camera_index=index,
+                clock=self.clock,
+                on_status=lambda message, index=index: on_status(f"[kamera {index}] {message}"),
+                **settings))
+
+    def run(self):
+        """Capture from every camera until stop() is called"""
+        threads = [threading.Thread(target=engine.run, name=f"Capture-{engine.camera_index}")
+                   for engine in self.engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self):
+        for engine in self.engines:
+            engine.stop()
+
+    def capture_now(self, before=0, after=0):
+        for engine in self.engines:
+            engine.capture_now(before, after)
+
+    @property
+    def saved_count(self):
+        return sum(engine.saved_count for engine in self.engines)
+
+    @property
+    def first_frame_time(self):
+        times = [engine.first_frame_time for engine in self.engines if engine.first_frame_time is not None]
+        return min(times) if times else None
@@ -0,0 +1,576 @@
+"""Qt-free capture loop shared by the GUI and the headless command line tool."""
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from capture_filters import ChangeDetector, FrameStacker
+from capture_schedule import CaptureClock
+from frame_archive import ArchiveWorker, DEFAULT_ARCHIVE_QUALITY
+from frame_catalog import FrameCatalog, capture_name, open_store
+from frame_ring import DEFAULT_RING_FPS, RingCamera
+from frame_source import open_source, request_resolution
+from frame_writer import FrameWriter
+from metrics import Metrics
+from retention import RetentionWorker, default_tiers
+from segment_recorder import SegmentRecorder, segments_dir, list_segments, segments_size, remove_segment
+
+
+# A capture this many seconds (or half an interval) behind its deadline counts as late
+LATE_CAPTURE_SECONDS = 1.0
+# Longest sleep between camera reads; shorter when a capture or preview is due sooner
+IDLE_SLEEP_SECONDS = 0.03
+
+
+class LatestFrameSlot:
+    """Single-slot handoff that keeps only the most recent frame"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self._put_time = 0.0
+
+    def put(self, frame):
+        """Replace the pending frame, returns True if the slot was empty"""
+        with self._lock:
+            was_empty = self._frame is None
+            self._frame = frame
+            self._put_time = time.perf_counter()
+        return was_empty
+
+    def take(self):
+        """Get the pending frame (or None) and empty the slot"""
+        return self.take_timed()[0]
+
+    def take_timed(self):
+        """Like take(), also returns the perf_counter() time the frame was put"""
+        with self._lock:
+            frame, self._frame = self._frame, None
+            return frame, self._put_time
+
+
+class CaptureEngine:
+    """The capture loop: camera reads, preview frames, saving and storage upkeep.
+
+    Progress is reported through plain callbacks (on_status(message),
+    on_storage(current_mb, max_mb) and on_preview()), so the same engine runs
+    inside the GUI's CaptureThread and in the headless command line tool.
+    Every stage of the loop is timed into `metrics` (see metrics.py).
+
+    Frames are only flipped, resized and encoded when they are saved or
+    previewed. With low_power set the camera delivers the target resolution
+    itself and frames in between are grab()bed without being decoded, so the
+    loop costs next to nothing between captures.
+
+    With process_capture set the camera is read in its own process and the
+    frames arrive through a shared memory ring (see frame_ring), which also
+    keeps `preroll_seconds` of recent frames. capture_now() saves the current
+    frame right away, or every ring frame in a window around the moment it
+    was called (a burst), including frames from before the call.
+
+    A preview_server.PreviewServer given as `stream` is fed live frames at
+    its own rate while clients are connected; it costs nothing otherwise.
+
+    With stack_frames above 1 every scheduled capture is the average of the
+    camera frames just before its deadline (see capture_filters.FrameStacker),
+    which removes sensor noise in low light and makes the JPEGs smaller.
+    """
+
+    def __init__(self, interval=60, output_dir="captures", compression=85,
+                 max_storage_mb=1000, auto_cleanup=False, resolution=(0, 0), catalog=None,
+                 preview_fps=10, preview_size=(640, 480), writer_threads=2, max_pending_writes=8,
+                 backpressure="drop_oldest", segment_seconds=0, segment_fps=10,
+                 delete_after_seal=False, camera_index=0, max_captures=0, change_threshold=0,
+                 keepalive_seconds=300, packed=None, keep_all_hours=24, thumbnails=None, activity=None, clock=None,
+                 metrics=None, low_power=False, schedule=None, process_capture=False, preroll_seconds=3,
+                 archive_after_hours=0, archive_format="webp", archive_quality=DEFAULT_ARCHIVE_QUALITY,
+                 archive_resolution=(0, 0), stream=None, stack_frames=0, on_status=None, on_storage=None,
+                 on_preview=None):
+        self.interval = interval  # Interval in seconds, may be fractional
+        self.schedule = schedule  # capture_schedule.CaptureSchedule overriding the interval, optional
+        self.active = False
+        self.output_dir = output_dir
+        self.compression = compression  # JPEG compression level (0-100)
+        self.max_storage_mb = max_storage_mb  # Maximum storage in MB
+        self.auto_cleanup = auto_cleanup  # Auto cleanup when storage limit reached
+        self.keep_all_hours = keep_all_hours  # Auto cleanup keeps every frame this recent
+        self.retention = None
+        # Frames older than archive_after_hours are re-encoded smaller, 0 keeps them as captured
+        self.archive_after_hours = archive_after_hours
+        self.archive_format = archive_format  # "webp" or "jpg"
+        self.archive_quality = archive_quality
+        self.archive_resolution = archive_resolution  # Archived frames fit in (width, height), (0, 0) keeps the size
+        self.archiver = None
+        self.resolution = resolution  # Desired resolution (width, height)
+        self.low_power = low_power  # Grab without decoding between captures, camera-side resolution
+        self.process_capture = process_capture  # Read the camera in its own process, through a FrameRing
+        self.preroll_seconds = preroll_seconds  # Recent frames the ring keeps for capture_now()
+        self._manual_requests = deque()  # (time.time(), before, after) from capture_now()
+
+        # Preview settings, may be changed from the GUI thread while running
+        self.preview_fps = preview_fps  # 0 disables the preview
+        self.preview_size = preview_size  # Size of the preview label (width, height)
+        self.preview_enabled = True
+        self.preview_slot = LatestFrameSlot()
+        self.stream = stream  # PreviewServer for remote viewers, optional
+
+        # Create output directory if it doesn't exist
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # Frame catalog shared with the GUI, keeps storage accounting in memory.
+        # packed=True stores frames in pack files, None follows the folder's contents
+        if catalog is None:
+            started = time.perf_counter()
+            catalog = open_store(output_dir, packed=packed)
+            self.metrics.observe("catalog_load", time.perf_counter() - started)
+        self.catalog = catalog
+        self.thumbnails = thumbnails  # ThumbnailStore filled as captures are saved, optional
+        self.activity = activity  # activity.ActivityIndex scored as captures are saved, optional
+
+        # Background encoder/writer pool settings
+        self.writer_threads = writer_threads
+        self.max_pending_writes = max_pending_writes
+        self.backpressure = backpressure  # "block", "drop_oldest" or "drop_newest"
+        self.saved_count = 0
+
+        # Incremental video segments, 0 disables them
+        self.segment_seconds = segment_seconds
+        self.segment_fps = segment_fps
+        self.delete_after_seal = delete_after_seal  # Delete JPGs once their segment is sealed
+        self.segments = None
+        self.segment_bytes = segments_size(segments_dir(output_dir))
+
+        # Change detection, 0 saves every frame
+        self.change_detector = (ChangeDetector(change_threshold, keepalive_seconds)
+                                if change_threshold > 0 else None)
+        # Camera frames averaged into each scheduled capture, 0 or 1 saves single frames
+        self.stack_frames = stack_frames
+
+        self.camera_index = camera_index  # Camera index or frame_source spec (synthetic:..., video file)
+        self.clock = clock  # CaptureClock shared with other cameras, by default each run gets its own
+        self.max_captures = max_captures  # Stop after this many captures, 0 runs until stop()
+        self.first_frame_time = None  # time.perf_counter() of the first camera frame
+
+        self.on_status = on_status or (lambda message: None)
+        self.on_storage = on_storage or (lambda current_mb, max_mb: None)
+        self.on_preview = on_preview or (lambda: None)
+
+    def run(self):
+        """Capture until stop() is called (or max_captures is reached)"""
+        self.active = True
+        if self.process_capture:
+            # Flipped and resized in the camera process, frames here are views into the ring
+            ring = self.camera = RingCamera(self.camera_index, self.resolution, self.preroll_seconds)
+        else:
+            ring = None
+            self.camera = open_source(self.camera_index)
+
+        if not self.camera.isOpened():
+            self.on_status(getattr(self.camera, "error", None) or "Gagal membuka kamera!")
+            self.camera.release()
+            return
+
+        # Teardown runs however the loop ends, an exception included
+        frame = writer = None
+        try:
+            resize_to = None
+            if ring is None and self.resolution[0] > 0 and self.resolution[1] > 0:
+                resize_to = tuple(self.resolution)
+                if self.low_power:
+                    # Let the camera scale, cv2.resize is only left to fix up what it could not do
+                    delivered = request_resolution(self.camera, resize_to)
+                    if delivered != resize_to:
+                        self.on_status(f"Kamera memberikan {delivered[0]}x{delivered[1]}, "
+                                       f"gambar diubah ke {resize_to[0]}x{resize_to[1]}")
+
+            # JPEG encoding and disk writes happen off the capture loop
+            if self.segment_seconds > 0:
+                self.segments = SegmentRecorder(segments_dir(self.output_dir), fps=self.segment_fps,
+                                                segment_seconds=self.segment_seconds,
+                                                on_sealed=self.on_segment_sealed)
+            writer = FrameWriter(self.catalog, workers=self.writer_threads,
+                                 max_pending=self.max_pending_writes, policy=self.backpressure,
+                                 on_result=self.on_write_result,
+                                 keep_encoded=self.segments is not None,
+                                 thumbnails=self.thumbnails is not None,
+                                 signatures=self.activity is not None,
+                                 metrics=self.metrics, on_status=self.on_status)
+            # Old captures are thinned in the background to stay within the storage limit
+            if self.auto_cleanup:
+                self.retention = RetentionWorker(self.catalog, self.max_storage_mb * 1024 * 1024,
+                                                 tiers=default_tiers(self.keep_all_hours),
+                                                 extra_bytes=lambda: self.segment_bytes,
+                                                 free_extra=self.remove_old_segments,
+                                                 on_done=self.on_retention_done, on_status=self.on_status)
+            # Aged captures are transcoded on a low-priority process pool, never while captures are waiting
+            if self.archive_after_hours > 0:
+                if isinstance(self.catalog, FrameCatalog):
+                    self.archiver = ArchiveWorker(self.catalog, self.archive_after_hours, self.archive_format,
+                                                  self.archive_quality, self.archive_resolution,
+                                                  busy=lambda: writer.pending > 0, metrics=self.metrics,
+                                                  on_done=self.on_archive_done, on_status=self.on_status).start()
+                else:
+                    self.on_status("Pengarsipan hanya untuk folder JPG, gambar dalam file pack tidak diubah")
+
+            stacker = None
+            if self.stack_frames > 1:
+                if ring is None:
+                    stacker = FrameStacker(self.stack_frames)
+                else:
+                    # The ring only holds frames at its own low rate, a stack would span seconds
+                    self.on_status("Penumpukan frame tidak tersedia dengan kamera di proses terpisah")
+
+            # Deadlines are kept on the monotonic clock, see capture_schedule.CaptureClock
+            scheduler = self.clock if self.clock is not None else CaptureClock(self.interval, self.schedule)
+            capture_count = 0
+            last_slot = None
+            last_preview_time = 0
+            last_timestamp = 0.0  # Captures are added to the catalog in chronological order
+            burst = None  # [start, end] wall times of the burst being saved
+            self._manual_requests.clear()
+
+            metrics = self.metrics
+            clock = time.perf_counter
+            grab_only = self.low_power or ring is not None
+            while self.active:
+                # In low power mode the frame stays undecoded in the driver until it is needed
+                started = clock()
+                if grab_only:
+                    ret, frame = self.camera.grab(), None
+                else:
+                    ret, frame = self.camera.read()
+                finished = clock()
+                metrics.observe("camera_grab" if grab_only else "camera_read", finished - started)
+                if not ret:
+                    self.on_status(getattr(self.camera, "error", None) or "Gagal mengambil frame dari kamera!")
+                    metrics.count("camera_errors")
+                    break
+                if self.first_frame_time is None:
+                    self.first_frame_time = finished
+
+                # Is this frame shown in the preview, saved, or neither?
+                current_time = time.monotonic()
+                preview_period = 1.0 / self.preview_fps if self.preview_enabled and self.preview_fps > 0 else None
+                preview_due = preview_period is not None and current_time - last_preview_time >= preview_period
+                stream_due = self.stream is not None and self.stream.wants_frame(current_time)
+                slot, deadline = scheduler.poll(current_time)
+                capture_due = slot >= 0 and slot != last_slot
+
+                # Frames close enough to the next deadline are stacked for it
+                stack_slot = None
+                if stacker is not None:
+                    stacker.observe(finished)
+                    if capture_due:
+                        stack_slot = slot
+                    elif scheduler.until_next(current_time) <= stacker.window:
+                        stack_slot = slot + 1
+
+                # Requests from capture_now(): single frames and bursts
+                manual_due = False
+                while self._manual_requests:
+                    pressed, before, after = self._manual_requests.popleft()
+                    if before <= 0 and after <= 0:
+                        manual_due = True
+                        continue
+                    if ring is None and before > 0:
+                        self.on_status("Pre-roll hanya tersedia dengan kamera di proses terpisah")
+                    start = pressed - before if ring is not None else pressed
+                    burst = ([min(start, burst[0]), max(pressed + after, burst[1])] if burst
+                             else [start, pressed + after])
+                    self.on_status(f"Burst: menyimpan frame {before:g} detik sebelum "
+                                   f"sampai {after:g} detik sesudah")
+                if burst is not None:
+                    wall_now = time.time()
+                    if ring is not None:
+                        last_timestamp = self._save_ring_frames(ring, writer, burst, last_timestamp)
+                    elif wall_now - last_timestamp >= 1.0 / DEFAULT_RING_FPS:
+                        manual_due = True  # Without a ring, a burst saves the live frames at the ring's rate
+                    if ring is None:
+                        finished_burst = wall_now > burst[1]
+                    else:
+                        # Done once the last frame of the window has arrived and nothing in it is left unsaved
+                        finished_burst = (wall_now > burst[1] + 1.0 / ring.ring_fps
+                                          and not ring.frames_between(last_timestamp + 0.0005, burst[1]))
+                    if finished_burst:
+                        burst = None
+                    elif capture_due:
+                        # The burst already covers this slot, its deadline would land between burst frames
+                        last_slot = slot
+                        capture_due = False
+
+                if (not preview_due and not capture_due and not manual_due and not stream_due
+                        and stack_slot is None):
+                    self._idle(scheduler, preview_period, last_preview_time)
+                    continue
+
+                if frame is None:
+                    started = clock()
+                    ret, frame = self.camera.retrieve()
+                    metrics.observe("camera_retrieve", clock() - started)
+                    if not ret or frame is None:
+                        self.on_status("Gagal mengambil frame dari kamera!")
+                        metrics.count("camera_errors")
+                        break
+
+                if stack_slot is not None:
+                    started = clock()
+                    stacker.add(frame, stack_slot)
+                    if capture_due:
+                        metrics.count("frames_stacked", stacker.stacked)
+                        # From here on the capture (and this loop's preview) is the averaged frame
+                        frame = stacker.take()
+                    metrics.observe("stack", clock() - started)
+                    if not preview_due and not capture_due and not manual_due and not stream_due:
+                        self._idle(scheduler, preview_period, last_preview_time)
+                        continue
+
+                if ring is None:
+                    # Flip horizontally for selfie-view
+                    started = clock()
+                    frame = cv2.flip(frame, 1)
+                    finished = clock()
+                    metrics.observe("flip", finished - started)
+
+                    # Resize if resolution is specified and the camera did not deliver it
+                    if resize_to is not None and (frame.shape[1], frame.shape[0]) != resize_to:
+                        started = finished
+                        frame = cv2.resize(frame, resize_to, interpolation=cv2.INTER_AREA)
+                        metrics.observe("resize", clock() - started)
+
+                # Update the displayed frame at the preview rate
+                if preview_due:
+                    last_preview_time = current_time
+                    started = clock()
+                    if self.preview_slot.put(self.make_preview(frame)):
+                        self.on_preview()
+                    metrics.observe("preview", clock() - started)
+
+                # Remote viewers get the frame as it is, the server scales and encodes it on its own thread
+                if stream_due:
+                    seq = self.camera.last_seq if ring is not None else None
+                    self.stream.put(frame, current_time,
+                                    (lambda: self.camera.valid(seq)) if seq is not None else None)
+
+                if manual_due:
+                    # Stamped with the time the frame was taken, not a deadline
+                    if ring is not None:
+                        seq = self.camera.last_seq
+                        timestamp = round(ring.frame(seq)[0], 3) if ring.valid(seq) else round(time.time(), 3)
+                    else:
+                        timestamp = round(time.time(), 3)
+                    if timestamp > last_timestamp:
+                        self._submit(writer, frame, timestamp)
+                        last_timestamp = timestamp
+                        metrics.count("captures_manual")
+
+                if capture_due:
+                    # How far off its deadline this capture is. The first one only shows how long
+                    # the camera took to open, and slots the loop was too slow for are skipped
+                    if last_slot is not None:
+                        jitter = current_time - deadline
+                        metrics.observe("capture_jitter", jitter)
+                        if jitter > min(LATE_CAPTURE_SECONDS, scheduler.interval / 2):
+                            metrics.count("captures_late")
+                        if slot - last_slot > 1:
+                            metrics.count("captures_missed", slot - last_slot - 1)
+                    metrics.gauge("capture_interval_s", round(scheduler.interval, 3))
+                    last_slot = slot
+
+                    # Skip near-duplicates of the last saved frame while the scene is static
+                    if self.change_detector is not None:
+                        started = clock()
+                        keep = self.change_detector.should_save(frame, current_time)
+                        metrics.observe("change_detect", clock() - started)
+                    else:
+                        keep = True
+                    if not keep:
+                        metrics.count("captures_skipped_static")
+                        self.on_status(f"Tidak ada perubahan, capture dilewati "
+                                       f"({self.change_detector.skipped} total)")
+                        self._idle(scheduler, preview_period, last_preview_time)
+                        continue
+
+                    # Captures are stamped with their deadline, so cameras sharing a clock
+                    # get identical names and the video has an even rhythm
+                    timestamp = round(scheduler.wall_time(deadline), 3)
+                    if timestamp <= last_timestamp:
+                        # A manual capture was just saved, this one would come before it
+                        self._idle(scheduler, preview_period, last_preview_time)
+                        continue
+                    self._submit(writer, frame, timestamp)
+                    last_timestamp = timestamp
+
+                    capture_count += 1
+                    if self.max_captures and capture_count >= self.max_captures:
+                        break
+
+                self._idle(scheduler, preview_period, last_preview_time)
+        finally:
+            # Flush the captures still being written, they may be views into the camera's frame ring
+            frame = None
+            if writer is not None:
+                writer.close()
+            self.camera.release()
+            if self.segments is not None:
+                self.segments.close()
+            if self.archiver is not None:
+                self.archiver.close()
+                self.archiver = None
+            if self.retention is not None:
+                self.retention.close()
+                self.retention = None
+            if writer is not None and writer.dropped:
+                self.on_status(f"{writer.dropped} capture dilewati karena penulisan disk terlambat")
+            if self.change_detector is not None and self.change_detector.skipped:
+                self.on_status(f"{self.change_detector.skipped} capture tanpa perubahan dilewati")
+            jitter = self.metrics.snapshot()["timers"].get("capture_jitter")
+            if jitter:
+                self.on_status(f"Ketepatan jadwal: median {jitter['p50_ms']:.1f} ms, "
+                               f"p95 {jitter['p95_ms']:.1f} ms, maks {jitter['max_ms']:.1f} ms dari tenggat")
+
+    def _submit(self, writer, frame, timestamp, seq=None):
+        """Hand a frame to the writer pool, saving is reported in on_write_result"""
+        if seq is None and self.process_capture:
+            seq = self.camera.last_seq
+        still_valid = (lambda: self.camera.valid(seq)) if seq is not None else None
+        started = time.perf_counter()
+        writer.submit(frame, capture_name(timestamp), timestamp, self.compression, still_valid=still_valid)
+        self.metrics.observe("submit", time.perf_counter() - started)
+        self.metrics.gauge("write_queue", writer.pending)
+
+    def _save_ring_frames(self, ring, writer, window, last_timestamp):
+        """Submit the ring's frames inside the burst window that are newer than
+        last_timestamp, as far as the writer queue has room. Returns the
+        timestamp of the last frame submitted."""
+        start, end = window
+        for seq, timestamp in ring.frames_between(max(start, last_timestamp + 0.0005), end):
+            if writer.pending >= writer.max_pending:
+                break  # The rest stays in the ring until the writers catch up
+            entry = ring.frame(seq)
+            timestamp = round(timestamp, 3)
+            if entry is None or timestamp <= last_timestamp:
+                continue
+            self._submit(writer, entry[1], timestamp, seq)
+            last_timestamp = timestamp
+            self.metrics.count("captures_burst")
+        return last_timestamp
+
+    def capture_now(self, before=0, after=0):
+        """Save a frame right away, or with before/after (seconds) every frame from
+        `before` seconds ago until `after` seconds from now. Frames from before
+        the call come from the pre-roll ring of process capture. Thread-safe."""
+        self._manual_requests.append((time.time(), before, after))
+
+    def _idle(self, scheduler, preview_period, last_preview_time):
+        """Sleep between camera reads, waking up in time for the next capture or preview"""
+        now = time.monotonic()
+        delay = min(IDLE_SLEEP_SECONDS, scheduler.until_next(now))
+        if preview_period is not None:
+            delay = min(delay, last_preview_time + preview_period - now)
+        if self.stream is not None:
+            delay = min(delay, self.stream.until_next(now))
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_write_result(self, result):
+        """Called by the writer pool, in capture order, when a capture has been handled"""
+        if result.dropped:
+            self.on_status(f"Capture dilewati (antrian penulisan penuh): {result.name}")
+            return
+        if result.error is not None:
+            self.metrics.count("write_errors")
+            self.on_status(f"Gagal menyimpan {result.name}: {result.error}")
+            return
+
+        self.saved_count += 1
+        self.metrics.count("captures_saved")
+        # A packed frame has no file of its own, the store names its pack and offset
+        self.on_status(f"Capture #{self.saved_count} tersimpan: {self.catalog.path(result.frame)}")
+
+        if self.thumbnails is not None and result.thumbnail is not None:
+            try:
+                self.thumbnails.add(result.frame, result.thumbnail)
+            except OSError as e:
+                self.on_status(f"Gagal menyimpan thumbnail: {e}")
+
+        # Motion against the previous saved frame, for highlight videos
+        if self.activity is not None and result.signature is not None:
+            try:
+                self.activity.record(result.frame, result.signature)
+            except OSError as e:
+                self.on_status(f"Gagal menyimpan skor aktivitas: {e}")
+
+        # Append the already encoded JPEG to the current video segment
+        if self.segments is not None:
+            try:
+                self.segments.append(result.data, result.timestamp, result.width, result.height,
+                                     result.name)
+            except Exception as e:
+                self.on_status(f"Gagal menulis segmen video: {e}")
+
+        # Storage usage comes from the catalog, so it is cheap to check every capture
+        current_storage = self.catalog.total_mb() + self.segment_bytes / (1024 * 1024)
+        self.metrics.gauge("storage_mb", round(current_storage, 2))
+        self.on_storage(current_storage, self.max_storage_mb)
+
+        # If storage exceeds limit and auto cleanup is enabled, thin out old captures
+        if self.retention is not None and current_storage > self.max_storage_mb:
+            self.retention.request()
+
+    def on_segment_sealed(self, path, frame_names):
+        """Called when a video segment is finished"""
+        self.segment_bytes = segments_size(segments_dir(self.output_dir))
+        self.on_status(f"Segmen video selesai: {os.path.basename(path)} ({len(frame_names)} frame)")
+        if self.delete_after_seal:
+            names = set(frame_names)
+            files_removed, _ = self.catalog.remove([f for f in self.catalog.frames() if f.name in names])
+            self.on_status(f"{files_removed} file JPG dihapus, sudah tersimpan di segmen")
+
+    def stop(self):
+        """Ask the loop to finish; run() returns after flushing pending writes"""
+        self.active = False
+
+    def make_preview(self, frame):
+        """Downscale a frame to fit the preview label and convert it to RGB"""
+        h, w = frame.shape[:2]
+        label_w, label_h = self.preview_size
+        scale = min(label_w / w, label_h / h)
+        if 0 < scale < 1:
+            frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def take_preview(self):
+        frame, put_time = self.preview_slot.take_timed()
+        if frame is not None:
+            # How long a preview frame waits for the GUI to pick it up
+            self.metrics.observe("preview_latency", time.perf_counter() - put_time)
+        return frame
+
+    def on_retention_done(self, files_removed, size_removed):
+        """Called from the retention thread after a thinning pass"""
+        self.on_status(f"Penipisan selesai: {files_removed} file dihapus "
+                       f"({size_removed/(1024*1024):.1f} MB), rentang waktu tetap utuh")
+        self.on_storage(self.catalog.total_mb() + self.segment_bytes / (1024 * 1024), self.max_storage_mb)
+
+    def on_archive_done(self, count, bytes_saved):
+        """Called from the archive thread after transcoding aged captures"""
+        self.on_status(f"Pengarsipan selesai: {count} gambar lama dikecilkan "
+                       f"({bytes_saved/(1024*1024):.1f} MB dihemat)")
+        self.on_storage(self.catalog.total_mb() + self.segment_bytes / (1024 * 1024), self.max_storage_mb)
+
+    def remove_old_segments(self, bytes_needed):
+        """Delete the oldest video segments, once thinning the captures is not enough"""
+        # With JPGs deleted after sealing, old video segments have to go as well
+        size_removed = 0
+        for path in list_segments(segments_dir(self.output_dir)):
+            if size_removed >= bytes_needed:
+                break
+            size_removed += remove_segment(path)
+        self.segment_bytes = segments_size(segments_dir(self.output_dir))
+        return size_removed
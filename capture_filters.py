@@ -0,0 +1,98 @@
+"""Cheap per-frame analysis done in the capture loop before a frame is saved."""
+import cv2
+import numpy as np
+
+SIGNATURE_SIZE = (64, 36)
+
+
+def frame_signature(frame, size=SIGNATURE_SIZE):
+    """Heavily downscaled grayscale copy of a frame, used for cheap comparisons"""
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def signature_difference(a, b):
+    """Mean absolute difference between two signatures, in gray levels (0-255)"""
+    return float(cv2.absdiff(a, b).mean())
+
+
+class ChangeDetector:
+    """Skips captures while the scene is static.
+
+    A frame is kept when its signature differs from the last kept frame by at
+    least `threshold` gray levels on average, or when `keepalive` seconds have
+    passed since the last kept frame so the timeline still advances.
+    """
+
+    def __init__(self, threshold=3.0, keepalive=300):
+        self.threshold = threshold
+        self.keepalive = keepalive
+        self.skipped = 0
+        self._last_signature = None
+        self._last_kept = None
+
+    def should_save(self, frame, now):
+        """Decide whether to save a frame captured at `now` (seconds)"""
+        signature = frame_signature(frame)
+        if (self._last_signature is None
+                or signature.shape != self._last_signature.shape
+                or now - self._last_kept >= self.keepalive
+                or signature_difference(signature, self._last_signature) >= self.threshold):
+            self._last_signature = signature
+            self._last_kept = now
+            return True
+        self.skipped += 1
+        return False
+
+
+class FrameStacker:
+    """Averages the camera frames leading up to a capture, to cut sensor noise.
+
+    Frames are summed into a single float32 accumulator with cv2.accumulate,
+    so memory stays at one frame however many are stacked. The capture loop
+    starts stacking `window` seconds before a deadline, which is sized from
+    the measured time between camera frames to take in about `count` frames.
+    Noise averages out by the square root of the frames stacked, and JPEGs
+    of the cleaner frame are smaller at the same quality. Anything moving
+    during the window is blurred, like a longer exposure.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.period = None  # Smoothed seconds between camera frames
+        self.stacked = 0
+        self._sum = None
+        self._target = None
+        self._last_frame_time = None
+
+    def observe(self, now):
+        """Note a camera frame arriving at perf_counter() `now`, to learn the frame period"""
+        if self._last_frame_time is not None:
+            elapsed = now - self._last_frame_time
+            self.period = elapsed if self.period is None else 0.9 * self.period + 0.1 * elapsed
+        self._last_frame_time = now
+
+    @property
+    def window(self):
+        """Seconds before a deadline from which frames are stacked"""
+        return (self.count - 1) * self.period if self.period is not None else 0.0
+
+    def add(self, frame, target):
+        """Add a frame to the stack for capture `target`; a new target starts a new stack"""
+        if self.stacked and (target != self._target or self._sum.shape != frame.shape):
+            self.stacked = 0
+        if not self.stacked:
+            if self._sum is None or self._sum.shape != frame.shape:
+                self._sum = np.empty(frame.shape, dtype=np.float32)
+            self._sum[...] = frame
+        else:
+            cv2.accumulate(frame, self._sum)
+        self._target = target
+        self.stacked += 1
+
+    def take(self):
+        """The mean of the stacked frames as a new uint8 frame (None if there are none), and start over"""
+        count, self.stacked = self.stacked, 0
+        if not count:
+            return None
+        return cv2.convertScaleAbs(self._sum, alpha=1.0 / count)
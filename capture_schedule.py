@@ -0,0 +1,198 @@
+"""When to capture: interval schedules and drift-free deadlines.
+
+A CaptureSchedule gives the capture interval for a moment in time, either a
+fixed interval or rules such as "every 10 s during work hours, every 5
+minutes otherwise":
+
+    08:00-17:00=10; 300
+    sen-jum 08:00-17:00=10; sab,min 10:00-14:00=60; 300
+
+Rules are tried in order, the first one whose days and time of day match
+wins; a bare number is the interval everywhere else. Intervals may be
+fractional (0.1 = ten captures per second).
+
+A CaptureClock turns a schedule into deadlines on the monotonic clock and is
+shared by every camera of a recording, so they all capture the same slots.
+"""
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+MIN_INTERVAL = 0.05  # About as fast as a webcam delivers frames
+WALL_RESYNC_SECONDS = 1.0  # Wall clock jumps larger than this re-anchor capture names
+
+DAY_NAMES = {
+    "sen": 0, "sel": 1, "rab": 2, "kam": 3, "jum": 4, "sab": 5, "min": 6,
+    "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+
+# start and end in minutes since midnight (end < start wraps past midnight),
+# days a frozenset of weekdays (Monday = 0) or None for every day
+ScheduleRule = namedtuple("ScheduleRule", "start end interval days")
+
+_RULE_PATTERN = re.compile(r"^(?:(?P<days>[a-z,\-]+)\s+)?(?P<start>\d{1,2}:\d{2})\s*-\s*(?P<end>\d{1,2}:\d{2})"
+                           r"\s*=\s*(?P<interval>[\d.]+)$")
+
+
+def _parse_interval(text):
+    interval = float(text)
+    if interval < MIN_INTERVAL:
+        raise ValueError(f"Interval minimal {MIN_INTERVAL} detik: {text}")
+    return interval
+
+
+def _parse_minutes(text):
+    hours, minutes = (int(part) for part in text.split(":"))
+    if hours > 24 or minutes > 59 or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"Jam tidak valid: {text}")
+    return hours * 60 + minutes
+
+
+def _parse_days(text):
+    days = set()
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        if first not in DAY_NAMES or (last and last not in DAY_NAMES):
+            raise ValueError(f"Hari tidak dikenal: {part} (contoh: sen-jum)")
+        start, end = DAY_NAMES[first], DAY_NAMES[last or first]
+        day = start
+        days.add(day)
+        while day != end:
+            day = (day + 1) % 7
+            days.add(day)
+    return frozenset(days)
+
+
+def parse_schedule(text, default_interval=60):
+    """Parse a schedule such as "08:00-17:00=10; 300", raises ValueError on mistakes"""
+    rules = []
+    for part in re.split(r"[;\n]", text.strip().lower()):
+        part = part.strip()
+        if not part:
+            continue
+        match = _RULE_PATTERN.match(part)
+        if match is None:
+            try:
+                default_interval = _parse_interval(part)
+            except ValueError:
+                raise ValueError(f"Aturan jadwal tidak valid: {part} (contoh: 08:00-17:00=10)")
+            continue
+        days = _parse_days(match.group("days")) if match.group("days") else None
+        rules.append(ScheduleRule(_parse_minutes(match.group("start")), _parse_minutes(match.group("end")),
+                                  _parse_interval(match.group("interval")), days))
+    return CaptureSchedule(default_interval, rules)
+
+
+class CaptureSchedule:
+    """The capture interval as a function of the time of day and weekday"""
+
+    def __init__(self, interval=60, rules=()):
+        self.default_interval = interval
+        self.rules = list(rules)
+
+    def interval_at(self, when):
+        """The interval in effect at `when` (a datetime)"""
+        minute = when.hour * 60 + when.minute + when.second / 60
+        for rule in self.rules:
+            if rule.start <= rule.end:
+                inside = rule.start <= minute < rule.end
+                day = when.weekday()
+            else:
+                # An overnight rule belongs to the day it started on
+                inside = minute >= rule.start or minute < rule.end
+                day = when.weekday() if minute >= rule.start else (when.weekday() - 1) % 7
+            if inside and (rule.days is None or day in rule.days):
+                return rule.interval
+        return self.default_interval
+
+    def next_change(self, when):
+        """The first moment after `when` at which the interval changes, or None"""
+        if not self.rules:
+            return None
+        current = self.interval_at(when)
+        midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+        boundaries = sorted(midnight + timedelta(days=day, minutes=minute)
+                            for day in range(8)
+                            for rule in self.rules
+                            for minute in (rule.start, rule.end))
+        for boundary in boundaries:
+            if boundary > when and self.interval_at(boundary) != current:
+                return boundary
+        return None
+
+    def describe(self):
+        if not self.rules:
+            return f"{self.default_interval:g} detik"
+        return f"{len(self.rules)} aturan, selain itu {self.default_interval:g} detik"
+
+
+class CaptureClock:
+    """Capture deadlines on the monotonic clock, shared by the engines of a recording.
+
+    Each deadline is the previous deadline plus the schedule's interval, not
+    the time the last capture happened, so slow loop iterations never add up
+    to drift, and changes of the wall clock do not move the schedule. The wall
+    time of a deadline only names the capture; it is re-anchored when the wall
+    clock jumps (NTP, daylight saving, a suspended laptop). A loop that falls
+    more than an interval behind skips the missed slots instead of catching
+    up in a burst. Interval changes of the schedule start on time.
+
+    With align set, the first deadline falls on a whole second of wall time.
+    """
+
+    def __init__(self, interval=60, schedule=None, align=False):
+        self.schedule = schedule if schedule is not None else CaptureSchedule(interval)
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._offset = time.time() - now  # wall time = monotonic time + offset
+        wall_start = math.floor(now + self._offset) if align else now + self._offset
+        self._next = wall_start - self._offset
+        self._slot = -1
+        self._deadline = None
+        self.interval = self._interval_after(self._next)
+
+    def wall_time(self, deadline):
+        """The wall-clock time (epoch seconds) of a monotonic deadline"""
+        return deadline + self._offset
+
+    def _interval_after(self, deadline):
+        """Time from `deadline` to the next deadline"""
+        when = datetime.fromtimestamp(self.wall_time(deadline))
+        interval = self.schedule.interval_at(when)
+        change = self.schedule.next_change(when)
+        if change is not None:
+            interval = min(interval, (change - when).total_seconds())
+        return max(interval, MIN_INTERVAL / 10)
+
+    def poll(self, now=None):
+        """The latest slot whose deadline has passed: (slot number, monotonic deadline).
+
+        The slot is -1 before the first deadline. A caller captures once per
+        new slot number.
+        """
+        with self._lock:
+            if now is None:
+                now = time.monotonic()
+            drift = (time.time() - now) - self._offset
+            if abs(drift) > WALL_RESYNC_SECONDS:
+                self._offset += drift
+            while now >= self._next:
+                interval = self._interval_after(self._next)
+                if now - self._next >= interval:
+                    # Too far behind, skip to the last slot that has started
+                    skipped = int((now - self._next) // interval)
+                    self._next += skipped * interval
+                    self._slot += skipped
+                self._slot += 1
+                self._deadline = self._next
+                self.interval = interval
+                self._next += interval
+            return self._slot, self._deadline
+
+    def until_next(self, now=None):
+        """Seconds until the next deadline"""
+        with self._lock:
+            return self._next - (time.monotonic() if now is None else now)
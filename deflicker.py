@@ -0,0 +1,59 @@
+"""Deflicker: even out the brightness jumps webcam auto-exposure causes.
+
+Before rendering, every frame's brightness is measured on a grayscale
+decode at 1/8 scale (libjpeg scales while decoding, so this costs a
+fraction of a full decode). The brightness curve is smoothed over a window
+of frames, which keeps slow changes like a sunset and removes the frame to
+frame flicker. Each frame gets a 256-entry gamma lookup table that moves
+its brightness to the smoothed value. The tables are computed for all
+frames in one NumPy step and applied with cv2.LUT, one call per frame.
+"""
+import cv2
+import numpy as np
+
+DEFAULT_DEFLICKER_WINDOW = 15  # Frames the brightness is averaged over
+MIN_GAMMA = 0.5  # Corrections are limited, a black or blown-out frame is not "fixed"
+MAX_GAMMA = 2.0
+
+_LEVELS = np.arange(256, dtype=np.float32) / 255.0
+
+
+def frame_brightness(data):
+    """Mean gray level (0-255) of encoded image bytes, measured at 1/8 scale; None if unreadable"""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    return float(cv2.mean(image)[0])
+
+
+def smooth_brightness(brightness, window=DEFAULT_DEFLICKER_WINDOW):
+    """Centered moving average of a brightness curve; None entries are filled from their neighbours"""
+    values = np.array([np.nan if b is None else b for b in brightness], dtype=np.float64)
+    known = ~np.isnan(values)
+    if not known.any():
+        return values
+    positions = np.arange(len(values))
+    values = np.interp(positions, positions[known], values[known])
+    window = max(1, min(int(window), len(values)))
+    if window == 1:
+        return values
+    # Edge padding keeps the average unbiased at the start and end of the video
+    padded = np.pad(values, (window // 2, window - 1 - window // 2), mode="edge")
+    return np.convolve(padded, np.ones(window) / window, mode="valid")
+
+
+def deflicker_luts(brightness, window=DEFAULT_DEFLICKER_WINDOW):
+    """One uint8 lookup table per frame, shape (frames, 256), moving each frame to the smoothed curve"""
+    target = smooth_brightness(brightness, window)
+    measured = np.array([t if b is None else b for b, t in zip(brightness, target)], dtype=np.float64)
+    # out = in ** gamma maps the measured mean gray level onto the target one
+    measured = np.clip(measured, 1.0, 254.0) / 255.0
+    target = np.clip(np.nan_to_num(target, nan=127.0), 1.0, 254.0) / 255.0
+    gamma = np.clip(np.log(target) / np.log(measured), MIN_GAMMA, MAX_GAMMA).astype(np.float32)
+    luts = np.power(_LEVELS[None, :], gamma[:, None]) * 255.0
+    return np.clip(luts + 0.5, 0, 255).astype(np.uint8)
+
+
+def apply_lut(image, lut):
+    """Apply a lookup table from deflicker_luts to a BGR image"""
+    return cv2.LUT(image, lut)
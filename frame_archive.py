@@ -0,0 +1,241 @@
+"""Archival transcoding: shrink captures once they are old.
+
+Frames are saved at the capture quality and resolution, which is more than
+a long recording needs for the weeks it is kept. ArchiveWorker re-encodes
+frames older than a given age to WebP (or a smaller JPEG), optionally
+scaled down, in batches on a low-priority process pool. Every output is
+decoded again and checked before it replaces the original, and it is only
+kept when it is actually smaller. The catalog keeps each frame's place and
+storage usage is updated as batches finish.
+
+Only plain JPG folders are archived. Frames in packs (see frame_pack) are
+stored by capture order in the pack index, which has no room for a second
+format.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_catalog import TEMP_SUFFIX, FrameCatalog
+
+ARCHIVE_FORMATS = {
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+}
+DEFAULT_ARCHIVE_QUALITY = 80
+ARCHIVE_BATCH_SIZE = 20
+ARCHIVE_CHECK_SECONDS = 600  # How often a running worker looks for frames that aged
+BUSY_WAIT_SECONDS = 0.5  # Wait while captures are being written before the next batch
+BATCH_PAUSE_SECONDS = 0.2  # Breathing room between batches
+MAX_VERIFY_DIFFERENCE = 12.0  # Mean gray level difference a re-encode may add
+
+
+def _init_archive_worker():
+    # Archiving is never urgent, leave the CPU to the capture loop and the writers
+    if hasattr(os, "nice"):
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+
+
+def fit_within(width, height, box):
+    """(width, height) scaled down to fit inside box, (0, 0) means no limit"""
+    max_width, max_height = box
+    scale = 1.0
+    if max_width > 0:
+        scale = min(scale, max_width / width)
+    if max_height > 0:
+        scale = min(scale, max_height / height)
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def transcode_frame(path, new_path, fmt, quality, box):
+    """Re-encode one frame into new_path + TEMP_SUFFIX, verified.
+
+    Runs in a worker process. Returns (size, width, height) of the new file,
+    or an error message when the frame is left as it is.
+    """
+    extension, quality_flag = ARCHIVE_FORMATS[fmt]
+    try:
+        with open(path, "rb") as f:
+            original = f.read()
+    except OSError as e:
+        return f"tidak bisa dibaca: {e}"
+    image = cv2.imdecode(np.frombuffer(original, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return "tidak bisa di-decode"
+    height, width = image.shape[:2]
+    size = fit_within(width, height, box)
+    if size != (width, height):
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(extension, image, [int(quality_flag), quality])
+    if not ok:
+        return "gagal di-encode"
+    if len(encoded) >= len(original):
+        return "hasil tidak lebih kecil"
+
+    # The copy that replaces the original has to decode to the same picture
+    check = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    if check is None or check.shape != image.shape:
+        return "hasil tidak valid"
+    if float(cv2.absdiff(check, image).mean()) > MAX_VERIFY_DIFFERENCE:
+        return "hasil terlalu berbeda"
+
+    tmp_path = new_path + TEMP_SUFFIX
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(encoded.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return f"gagal ditulis: {e}"
+    return len(encoded), size[0], size[1]
+
+
+def archive_candidates(frames, now, max_age, fmt, box):
+    """Frames older than max_age seconds that are not in the archive format and size yet"""
+    extension = ARCHIVE_FORMATS[fmt][0]
+    candidates = []
+    for frame in frames:
+        if now - frame.timestamp < max_age:
+            break  # Chronological, the rest is younger
+        done_format = frame.name.lower().endswith(extension)
+        done_size = not frame.width or fit_within(frame.width, frame.height, box) == (frame.width, frame.height)
+        if not (done_format and done_size):
+            candidates.append(frame)
+    return candidates
+
+
+class ArchiveWorker:
+    """Background thread that transcodes aged frames of a FrameCatalog.
+
+    It looks for frames older than max_age_hours every check_seconds (and
+    on request()), and hands them to a process pool ARCHIVE_BATCH_SIZE at a
+    time. Before each batch it waits while busy() returns True, so pending
+    captures are written first; the worker processes run at the lowest
+    priority. on_done(count, bytes_saved) reports each pass.
+    """
+
+    def __init__(self, catalog, max_age_hours=24 * 7, fmt="webp", quality=DEFAULT_ARCHIVE_QUALITY,
+                 resolution=(0, 0), processes=1, busy=None, check_seconds=ARCHIVE_CHECK_SECONDS,
+                 metrics=None, on_done=None, on_status=None):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Format arsip tidak dikenal: {fmt}")
+        self.catalog = catalog
+        self.max_age = max_age_hours * 3600
+        self.fmt = fmt
+        self.quality = quality
+        self.resolution = tuple(resolution)
+        self.processes = max(1, processes)
+        self.busy = busy or (lambda: False)
+        self.check_seconds = check_seconds
+        self.metrics = metrics
+        self.on_done = on_done or (lambda count, bytes_saved: None)
+        self.on_status = on_status or (lambda message: None)
+        self._skipped = set()  # Frames that did not get smaller, not tried again
+        self._wake = threading.Event()
+        self._stop = False
+        self._pool = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="Archive", daemon=True)
+        self._thread.start()
+        return self
+
+    def request(self):
+        self._wake.set()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _run(self):
+        self._wake.set()  # First pass right away
+        while True:
+            self._wake.wait(self.check_seconds)
+            self._wake.clear()
+            if self._stop:
+                return
+            try:
+                count, saved = self.archive()
+            except OSError as e:
+                self.on_status(f"Gagal mengarsipkan: {e}")
+                continue
+            if count:
+                self.on_done(count, saved)
+
+    def archive(self):
+        """Transcode every frame due for archiving, returns (count, bytes_saved)"""
+        if not isinstance(self.catalog, FrameCatalog):
+            return 0, 0
+        frames = [frame for frame in archive_candidates(self.catalog.frames(), time.time(), self.max_age,
+                                                        self.fmt, self.resolution)
+                  if frame.name not in self._skipped]
+        count = saved = 0
+        for start in range(0, len(frames), ARCHIVE_BATCH_SIZE):
+            while self.busy() and not self._stop:
+                time.sleep(BUSY_WAIT_SECONDS)
+            if self._stop:
+                break
+            batch_count, batch_saved = self._archive_batch(frames[start:start + ARCHIVE_BATCH_SIZE])
+            count += batch_count
+            saved += batch_saved
+            time.sleep(BATCH_PAUSE_SECONDS)
+        return count, saved
+
+    def _archive_batch(self, frames):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_archive_worker)
+        extension = ARCHIVE_FORMATS[self.fmt][0]
+        started = time.perf_counter()
+        jobs = []
+        for frame in frames:
+            name = os.path.splitext(frame.name)[0] + extension
+            path = self.catalog.path(frame)
+            new_path = os.path.join(self.catalog.directory, name)
+            jobs.append((frame, name, self._pool.submit(transcode_frame, path, new_path, self.fmt,
+                                                        self.quality, self.resolution)))
+        changes = []
+        for frame, name, future in jobs:
+            result = future.result()
+            if isinstance(result, str):
+                self._skipped.add(frame.name)
+                if self.metrics is not None:
+                    self.metrics.count("archive_skipped")
+                continue
+            size, width, height = result
+            new_path = os.path.join(self.catalog.directory, name)
+            if name != frame.name and os.path.exists(new_path):
+                os.remove(new_path + TEMP_SUFFIX)  # Never overwrite a different frame
+                self._skipped.add(frame.name)
+                continue
+            # The verified copy takes the place of the original only now
+            os.replace(new_path + TEMP_SUFFIX, new_path)
+            changes.append((frame, name, size, width, height))
+        sizes = {name: size for _, name, size, _, _ in changes}
+        replaced = self.catalog.replace(changes)
+        saved = sum(frame.size - sizes[os.path.splitext(frame.name)[0] + extension] for frame in replaced)
+        if self.metrics is not None:
+            self.metrics.observe("archive_batch", time.perf_counter() - started)
+            self.metrics.count("frames_archived", len(replaced))
+            self.metrics.count("archive_bytes_saved", saved)
+        return len(replaced), saved
@@ -0,0 +1,354 @@
+"""Persistent catalog of captured frames.
+
+The catalog keeps capture time, file size, dimensions and a sequence number
+for every frame in memory, backed by an append-only log in the capture
+folder. Storage totals, oldest-first eviction and chronological ordering are
+answered from memory instead of walking and stat-ing the whole folder.
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+CATALOG_FILENAME = ".timelapse_catalog"
+FRAME_EXTENSIONS = (".jpg", ".webp")  # .webp for frames the archiver transcoded
+TEMP_SUFFIX = ".tmp"
+
+Frame = namedtuple("Frame", "name timestamp size width height seq")
+
+
+def open_store(directory, packed=None):
+    """Open and load the frame store of a capture folder.
+
+    packed=True selects frame packs (see frame_pack), False plain JPG files and
+    None picks whatever the folder already holds.
+    """
+    from frame_pack import FramePackStore, has_packs
+    if packed is None:
+        packed = has_packs(directory)
+    if packed:
+        return FramePackStore(directory).load()
+    return FrameCatalog(directory).load()
+
+
+def is_frame_file(name):
+    """Check whether a file name looks like a captured frame"""
+    return name.startswith("capture_") and name.lower().endswith(FRAME_EXTENSIONS)
+
+
+def capture_name(timestamp):
+    """The file name of a capture: capture_YYYYMMDD_HHMMSS_mmm.jpg"""
+    moment = datetime.fromtimestamp(round(timestamp, 3))
+    return f"capture_{moment.strftime('%Y%m%d_%H%M%S')}_{moment.microsecond // 1000:03d}.jpg"
+
+
+def parse_capture_time(name):
+    """Get the capture time (epoch seconds) from capture_YYYYMMDD_HHMMSS[_mmm].jpg"""
+    parts = os.path.splitext(name)[0].split("_")
+    if len(parts) < 3:
+        return None
+    try:
+        timestamp = datetime.strptime(parts[1] + parts[2], "%Y%m%d%H%M%S").timestamp()
+    except ValueError:
+        return None
+    # Captures made before sub-second intervals have no milliseconds part
+    if len(parts) > 3 and len(parts[3]) == 3 and parts[3].isdigit():
+        timestamp += int(parts[3]) / 1000
+    return timestamp
+
+
+def read_jpeg_size(path):
+    """Read (width, height) from a JPEG (or WebP) header without decoding the image"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(65536)
+    except OSError:
+        return 0, 0
+    if data[:4] == b"RIFF":
+        return webp_size(data)
+    return jpeg_size(data)
+
+
+def webp_size(data):
+    """Find (width, height) in the first chunk of WebP bytes"""
+    if len(data) < 30 or data[:4] != b"RIFF" or data[8:12] != b"WEBP":
+        return 0, 0
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return (int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1)
+    return 0, 0
+
+
+def jpeg_size(data):
+    """Find (width, height) in the SOF marker of JPEG bytes"""
+    if data[:2] != b"\xff\xd8":
+        return 0, 0
+    i = 2
+    n = len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return 0, 0
+
+
+class FrameCatalog:
+    """In-memory, chronologically ordered index of the frames in a capture folder"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._frames = OrderedDict()  # name -> Frame, oldest first
+        self._total_bytes = 0
+        self._next_seq = 0
+        self._log = None
+
+    @property
+    def log_path(self):
+        return os.path.join(self.directory, CATALOG_FILENAME)
+
+    def load(self):
+        """Rebuild the catalog with a single os.scandir pass over the folder.
+
+        Frames already recorded in the catalog log are trusted as-is, so only
+        new files are stat-ed and have their JPEG header read.
+        """
+        with self._lock:
+            self.close()
+            known = self._read_log()
+            frames = []
+            if os.path.isdir(self.directory):
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(TEMP_SUFFIX) and is_frame_file(entry.name[:-len(TEMP_SUFFIX)]):
+                            # Leftover from a write that was interrupted before the rename
+                            try:
+                                os.remove(entry.path)
+                            except OSError:
+                                pass
+                            continue
+                        if not is_frame_file(entry.name):
+                            continue
+                        frame = known.get(entry.name)
+                        if frame is None:
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            timestamp = parse_capture_time(entry.name)
+                            if timestamp is None:
+                                timestamp = stat.st_mtime
+                            width, height = read_jpeg_size(entry.path)
+                            frame = Frame(entry.name, timestamp, stat.st_size, width, height, -1)
+                        frames.append(frame)
+
+            frames.sort(key=lambda fr: (fr.timestamp, fr.name))
+            self._frames = OrderedDict()
+            self._total_bytes = 0
+            self._next_seq = max([fr.seq for fr in frames] + [-1]) + 1
+            for frame in frames:
+                if frame.seq < 0:
+                    frame = frame._replace(seq=self._next_seq)
+                    self._next_seq += 1
+                self._frames[frame.name] = frame
+                self._total_bytes += frame.size
+
+            if os.path.isdir(self.directory):
+                self._compact_log()
+        return self
+
+    def _read_log(self):
+        known = {}
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    try:
+                        if fields[0] == "+" and len(fields) == 7:
+                            known[fields[2]] = Frame(fields[2], float(fields[3]), int(fields[4]),
+                                                     int(fields[5]), int(fields[6]), int(fields[1]))
+                        elif fields[0] == "-" and len(fields) == 2:
+                            known.pop(fields[1], None)
+                    except ValueError:
+                        continue  # Truncated line from an interrupted write
+        except OSError:
+            pass
+        return known
+
+    def _compact_log(self):
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for frame in self._frames.values():
+                f.write(self._format_add(frame))
+        os.replace(tmp_path, self.log_path)
+
+    @staticmethod
+    def _format_add(frame):
+        return (f"+\t{frame.seq}\t{frame.name}\t{frame.timestamp:.3f}\t"
+                f"{frame.size}\t{frame.width}\t{frame.height}\n")
+
+    def _append_log(self, text):
+        if self._log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._log = open(self.log_path, "a", encoding="utf-8")
+        self._log.write(text)
+        self._log.flush()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def write_file(self, name, data):
+        """Atomically write an encoded frame (temp file, then rename)"""
+        path = os.path.join(self.directory, name)
+        tmp_path = path + TEMP_SUFFIX
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def add(self, name, timestamp, width, height, size=None):
+        """Record a newly written frame and return its catalog entry"""
+        if size is None:
+            size = os.path.getsize(os.path.join(self.directory, name))
+        with self._lock:
+            old = self._frames.pop(name, None)
+            if old is not None:
+                self._total_bytes -= old.size
+            frame = Frame(name, timestamp, size, width, height, self._next_seq)
+            self._next_seq += 1
+            self._frames[name] = frame
+            self._total_bytes += size
+            self._append_log(self._format_add(frame))
+        return frame
+
+    def replace(self, changes):
+        """Swap frames for re-encoded versions already written to disk, keeping their
+        place in the chronological order. `changes` holds (old frame, new name,
+        size, width, height); returns the replaced frames, old files are deleted.
+        Frames removed from the catalog meanwhile are skipped and their new file deleted."""
+        replaced = []
+        with self._lock:
+            by_name = {}
+            for frame, name, size, width, height in changes:
+                current = self._frames.get(frame.name)
+                if current is None:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+                    continue
+                by_name[frame.name] = current._replace(name=name, size=size, width=width, height=height)
+            if not by_name:
+                return replaced
+            lines = []
+            frames = OrderedDict()
+            for name, frame in self._frames.items():
+                new = by_name.get(name)
+                if new is not None:
+                    self._total_bytes += new.size - frame.size
+                    if new.name != name:
+                        lines.append(f"-\t{name}\n")
+                    lines.append(self._format_add(new))
+                    replaced.append(frame)
+                    frame = new
+                frames[frame.name] = frame
+            self._frames = frames
+            self._append_log("".join(lines))
+            for frame in replaced:
+                if by_name[frame.name].name != frame.name:
+                    try:
+                        os.remove(self.path(frame))
+                    except FileNotFoundError:
+                        pass
+        return replaced
+
+    def remove(self, frames, delete_files=True):
+        """Forget frames (and delete their files); returns (count, bytes_freed).
+
+        A file that cannot be deleted (on Windows, one open in a viewer) is
+        skipped and its frame stays in the catalog.
+        """
+        count = 0
+        bytes_freed = 0
+        with self._lock:
+            lines = []
+            for frame in frames:
+                current = self._frames.get(frame.name)
+                if current is None:
+                    continue
+                if delete_files:
+                    try:
+                        os.remove(self.path(current))
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        continue
+                del self._frames[current.name]
+                self._total_bytes -= current.size
+                bytes_freed += current.size
+                count += 1
+                lines.append(f"-\t{current.name}\n")
+            if lines:
+                self._append_log("".join(lines))
+        return count, bytes_freed
+
+    def reclaim(self):
+        """Nothing to do, remove() deletes the files; kept for the FramePackStore interface"""
+        return 0
+
+    def path(self, frame):
+        return os.path.join(self.directory, frame.name)
+
+    def read_bytes(self, frame):
+        """The encoded JPEG (or archived WebP) bytes of a frame"""
+        with open(self.path(frame), "rb") as f:
+            return f.read()
+
+    def frames(self):
+        """All frames in chronological order"""
+        with self._lock:
+            return list(self._frames.values())
+
+    def oldest(self, bytes_needed):
+        """The oldest frames whose sizes add up to at least bytes_needed"""
+        selected = []
+        total = 0
+        with self._lock:
+            for frame in self._frames.values():
+                if total >= bytes_needed:
+                    break
+                selected.append(frame)
+                total += frame.size
+        return selected
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def total_mb(self):
+        return self._total_bytes / (1024 * 1024)
+
+    def __len__(self):
+        return len(self._frames)
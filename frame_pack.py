@@ -0,0 +1,399 @@
+"""Append-only frame pack storage.
+
+Instead of one JPG file per capture, encoded frames are appended to large
+pack files (frames_00001.pack, ...). Each pack has a binary index
+(frames_00001.idx) with one fixed-size record per frame: sequence number,
+offset, length, timestamp, dimensions and a deleted flag. Frames are read
+back through memory mapping.
+
+FramePackStore offers the same interface as FrameCatalog, so the capture
+engine, renderer, cleanup and storage display work with either backend.
+Deleting a frame only flags its index record. A pack file is removed once all
+of its frames are deleted, and packs that are mostly deleted are compacted,
+the one being appended to included. reclaim() compacts every pack with
+deleted frames right away, for cleanup that has to free the space it deleted.
+"""
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+
+from frame_catalog import TEMP_SUFFIX, capture_name
+
+PACK_PREFIX = "frames_"
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx"
+MAX_PACK_BYTES = 256 * 1024 * 1024
+COMPACT_DEAD_RATIO = 0.5
+
+# seq, offset, length, timestamp, width, height, flags
+RECORD = struct.Struct("<IQIdHHB3x")
+FLAG_DELETED = 1
+
+PackFrame = namedtuple("PackFrame", "name timestamp size width height seq pack offset")
+
+
+def has_packs(directory):
+    """Check whether a folder holds frame packs"""
+    try:
+        return any(f.startswith(PACK_PREFIX) and f.endswith(INDEX_SUFFIX) for f in os.listdir(directory))
+    except OSError:
+        return False
+
+
+def pack_path(directory, number):
+    return os.path.join(directory, f"{PACK_PREFIX}{number:05d}{PACK_SUFFIX}")
+
+
+_index_cache = {}  # index path -> ((inode, size, mtime), {seq: (offset, length)})
+
+
+def _index_state(index_path):
+    stat = os.stat(index_path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _pack_entries(index_path):
+    """(state, {seq: (offset, length)}) of the live records of an index, cached until the file changes"""
+    state = _index_state(index_path)
+    cached = _index_cache.get(index_path)
+    if cached is None or cached[0] != state:
+        with open(index_path, "rb") as f:
+            raw = f.read()
+        entries = {}
+        for seq, offset, length, _, _, _, flags in RECORD.iter_unpack(raw[:len(raw) - len(raw) % RECORD.size]):
+            if flags & FLAG_DELETED:
+                entries.pop(seq, None)
+            else:
+                entries[seq] = (offset, length)
+        cached = _index_cache[index_path] = (state, entries)
+    return cached
+
+
+def read_packed_frame(directory, frame, attempts=3):
+    """Read a frame straight from its pack file, for processes that have no store loaded.
+
+    The offset comes from the pack's index on disk, not from `frame`, since
+    a compaction in the capturing process may have moved the frame since the
+    entry was made. FileNotFoundError once the frame is deleted.
+    """
+    path = pack_path(directory, frame.pack)
+    index_path = path[:-len(PACK_SUFFIX)] + INDEX_SUFFIX
+    for _ in range(attempts):
+        state, entries = _pack_entries(index_path)
+        if frame.seq not in entries:
+            break
+        offset, length = entries[frame.seq]
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        # A compaction that replaced the pack meanwhile also replaced its index
+        if _index_state(index_path)[0] == state[0] and len(data) == length:
+            return data
+    raise FileNotFoundError(f"Frame {frame.name} tidak ada lagi di {path}")
+
+
+class _Pack:
+    """One pack file with its index"""
+
+    def __init__(self, directory, number):
+        self.number = number
+        self.path = pack_path(directory, number)
+        self.index_path = self.path[:-len(PACK_SUFFIX)] + INDEX_SUFFIX
+        self.size = 0  # Bytes in the pack file
+        self.index_size = 0  # Bytes in the index file
+        self.live = 0  # Frames not deleted
+        self.dead_bytes = 0
+        self.records = {}  # seq -> position of the record in the index
+        self._data = None
+        self._index = None
+        self._map = None
+
+    def open_for_append(self):
+        if self._data is None:
+            self._data = open(self.path, "ab")
+            self._index = open(self.index_path, "ab")
+
+    def append(self, data, seq, timestamp, width, height):
+        self.open_for_append()
+        offset = self.size
+        self._data.write(data)
+        self._data.flush()
+        # The index record is written after the data, so it never points past the end of the pack
+        self._index.write(RECORD.pack(seq, offset, len(data), timestamp, width, height, 0))
+        self._index.flush()
+        self.records[seq] = self.index_size
+        self.index_size += RECORD.size
+        self.size += len(data)
+        self.live += 1
+        return offset
+
+    def read(self, offset, length):
+        if self._map is None or offset + length > len(self._map):
+            self.close_map()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length]
+
+    def mark_deleted(self, frames):
+        """Set the deleted flag on the index records of (seq, length) pairs"""
+        with open(self.index_path, "r+b") as f:
+            for seq, length in frames:
+                position = self.records.pop(seq, None)
+                if position is None:
+                    continue
+                f.seek(position + RECORD.size - 4)  # The flags byte
+                f.write(bytes([FLAG_DELETED]))
+                self.live -= 1
+                self.dead_bytes += length
+
+    def close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        self.close_map()
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = None
+            self._index = None
+
+    def delete_files(self):
+        self.close()
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class FramePackStore:
+    """Frame storage in append-only packs, with the same interface as FrameCatalog"""
+
+    def __init__(self, directory, max_pack_bytes=MAX_PACK_BYTES):
+        self.directory = directory
+        self.max_pack_bytes = max_pack_bytes
+        self._lock = threading.RLock()
+        self._frames = OrderedDict()  # seq -> PackFrame, oldest first
+        self._packs = {}  # number -> _Pack
+        self._staged = {}  # name -> encoded bytes waiting for add()
+        self._next_seq = 0
+        self._total_bytes = 0
+
+    def load(self):
+        """Read every pack index; the folder itself is never scanned per frame"""
+        with self._lock:
+            self.close()
+            self._frames = OrderedDict()
+            self._packs = {}
+            self._total_bytes = 0
+            frames = []
+            if os.path.isdir(self.directory):
+                numbers = sorted(int(f[len(PACK_PREFIX):-len(INDEX_SUFFIX)]) for f in os.listdir(self.directory)
+                                 if f.startswith(PACK_PREFIX) and f.endswith(INDEX_SUFFIX))
+                for number in numbers:
+                    frames.extend(self._load_pack(number, is_last=number == numbers[-1]))
+            frames.sort(key=lambda fr: fr.seq)
+            for frame in frames:
+                self._frames[frame.seq] = frame
+            self._next_seq = max([fr.seq for fr in frames] + [-1]) + 1
+            for pack in self._packs.values():
+                self._total_bytes += pack.size
+        return self
+
+    def _load_pack(self, number, is_last):
+        pack = _Pack(self.directory, number)
+        try:
+            with open(pack.index_path, "rb") as f:
+                raw = f.read()
+            pack.size = os.path.getsize(pack.path)
+        except OSError:
+            return []
+        usable = len(raw) - len(raw) % RECORD.size
+        frames = []
+        end = 0
+        for position in range(0, usable, RECORD.size):
+            seq, offset, length, timestamp, width, height, flags = RECORD.unpack_from(raw, position)
+            if offset + length > pack.size:
+                usable = position  # Record written without its data, cut it off
+                break
+            end = max(end, offset + length)
+            if flags & FLAG_DELETED:
+                pack.dead_bytes += length
+                continue
+            pack.records[seq] = position
+            pack.live += 1
+            frames.append(PackFrame(capture_name(timestamp), timestamp, length, width, height, seq,
+                                    number, offset))
+
+        # Drop whatever an interrupted write left behind in the newest pack
+        if is_last and (usable < len(raw) or end < pack.size):
+            with open(pack.index_path, "r+b") as f:
+                f.truncate(usable)
+            with open(pack.path, "r+b") as f:
+                f.truncate(end)
+            pack.size = end
+        pack.index_size = usable
+        if pack.live == 0 and not is_last:
+            pack.delete_files()
+            return []
+        self._packs[number] = pack
+        return frames
+
+    def close(self):
+        with self._lock:
+            for pack in self._packs.values():
+                pack.close()
+
+    def _active_pack(self, incoming):
+        numbers = sorted(self._packs)
+        if numbers:
+            pack = self._packs[numbers[-1]]
+            if pack.size + incoming <= self.max_pack_bytes or pack.size == 0:
+                return pack
+            pack.close()
+        number = numbers[-1] + 1 if numbers else 1
+        os.makedirs(self.directory, exist_ok=True)
+        pack = _Pack(self.directory, number)
+        self._packs[number] = pack
+        return pack
+
+    def write_file(self, name, data):
+        """Stage an encoded frame; it is appended to the pack by add(), in capture order"""
+        with self._lock:
+            self._staged[name] = bytes(data)
+
+    def add(self, name, timestamp, width, height, size=None):
+        """Append a staged frame to the active pack and return its entry"""
+        with self._lock:
+            data = self._staged.pop(name)
+            pack = self._active_pack(len(data))
+            seq = self._next_seq
+            self._next_seq += 1
+            offset = pack.append(data, seq, timestamp, width, height)
+            frame = PackFrame(name, timestamp, len(data), width, height, seq, pack.number, offset)
+            self._frames[seq] = frame
+            self._total_bytes += len(data)
+        return frame
+
+    def read_bytes(self, frame):
+        """The encoded JPEG bytes of a frame, read through the pack's memory map.
+
+        The frame is looked up by its sequence number, so an entry from before
+        a compaction moved it still reads its own bytes. FileNotFoundError
+        once the frame is deleted.
+        """
+        with self._lock:
+            current = self._frames.get(frame.seq)
+            pack = self._packs.get(current.pack) if current is not None else None
+            if pack is None or current.timestamp != frame.timestamp:
+                raise FileNotFoundError(f"Frame {frame.name} sudah dihapus")
+            return pack.read(current.offset, current.size)
+
+    def path(self, frame):
+        """Location of a frame, for messages"""
+        return f"{pack_path(self.directory, frame.pack)}@{frame.offset}"
+
+    def remove(self, frames, delete_files=True):
+        """Delete frames; returns (count, bytes_freed on disk)"""
+        count = 0
+        with self._lock:
+            size_before = self._total_bytes
+            by_pack = {}
+            for frame in frames:
+                current = self._frames.pop(frame.seq, None)
+                if current is None:
+                    continue
+                by_pack.setdefault(current.pack, []).append((current.seq, current.size))
+                count += 1
+            for number in sorted(by_pack):
+                self._packs[number].mark_deleted(by_pack[number])
+                pack = self._packs[number]
+                if pack.live == 0:
+                    pack.delete_files()
+                    del self._packs[number]
+                    self._total_bytes -= pack.size
+                elif pack.dead_bytes > pack.size * COMPACT_DEAD_RATIO:
+                    # The active pack too, new frames are appended to the compacted file
+                    self._compact(pack)
+            return count, size_before - self._total_bytes
+
+    def reclaim(self):
+        """Compact every pack that has deleted frames; returns bytes_freed on disk"""
+        with self._lock:
+            size_before = self._total_bytes
+            for pack in list(self._packs.values()):
+                if pack.dead_bytes > 0:
+                    self._compact(pack)
+            return size_before - self._total_bytes
+
+    def _compact(self, pack):
+        """Rewrite a pack without its deleted frames"""
+        live = [frame for frame in self._frames.values() if frame.pack == pack.number]
+        tmp_data = pack.path + TEMP_SUFFIX
+        tmp_index = pack.index_path + TEMP_SUFFIX
+        moved = []
+        offset = 0
+        with open(tmp_data, "wb") as data_file, open(tmp_index, "wb") as index_file:
+            for position, frame in enumerate(live):
+                data_file.write(pack.read(frame.offset, frame.size))
+                index_file.write(RECORD.pack(frame.seq, offset, frame.size, frame.timestamp,
+                                             frame.width, frame.height, 0))
+                moved.append((frame, offset, position * RECORD.size))
+                offset += frame.size
+        pack.close()
+        os.replace(tmp_data, pack.path)
+        os.replace(tmp_index, pack.index_path)
+        self._total_bytes -= pack.size - offset
+        pack.size = offset
+        pack.index_size = len(moved) * RECORD.size
+        pack.dead_bytes = 0
+        pack.records = {}
+        for frame, new_offset, position in moved:
+            self._frames[frame.seq] = frame._replace(offset=new_offset)
+            pack.records[frame.seq] = position
+
+    def frames(self):
+        """All frames in capture order"""
+        with self._lock:
+            return list(self._frames.values())
+
+    def oldest(self, bytes_needed):
+        """The oldest frames whose sizes add up to at least bytes_needed"""
+        selected = []
+        total = 0
+        with self._lock:
+            for frame in self._frames.values():
+                if total >= bytes_needed:
+                    break
+                selected.append(frame)
+                total += frame.size
+        return selected
+
+    def export_jpegs(self, dest_dir, frames=None, progress=None):
+        """Write frames out as plain JPG files, returns the number exported"""
+        os.makedirs(dest_dir, exist_ok=True)
+        frames = self.frames() if frames is None else frames
+        for i, frame in enumerate(frames):
+            path = os.path.join(dest_dir, frame.name)
+            if os.path.exists(path):
+                path = os.path.join(dest_dir, f"{os.path.splitext(frame.name)[0]}_{frame.seq}.jpg")
+            with open(path + TEMP_SUFFIX, "wb") as f:
+                f.write(self.read_bytes(frame))
+            os.replace(path + TEMP_SUFFIX, path)
+            if progress:
+                progress(i + 1, len(frames))
+        return len(frames)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def total_mb(self):
+        return self._total_bytes / (1024 * 1024)
+
+    def __len__(self):
+        return len(self._frames)
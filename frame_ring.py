@@ -0,0 +1,319 @@
+"""Raw frames shared between processes through a shared memory ring.
+
+With process capture, the camera is read in a separate process. That
+process flips and resizes each frame and writes it into a FrameRing, a
+multiprocessing.shared_memory block holding the last few seconds of frames.
+The capture engine reads frames from the ring as numpy views, so the JPEG
+encoder and the preview get the pixels without a copy, and camera reads
+no longer compete with them for the GIL.
+
+Each slot has a sequence number. The writer sets it to 0 before it
+overwrites the pixels and to the frame's number afterwards, so a reader can
+always tell whether the view it holds still shows the frame it asked for.
+Because the ring keeps its older frames, it also doubles as a pre-roll
+buffer: "capture now" can save frames from before the button was pressed.
+"""
+import math
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from frame_source import open_source, request_resolution
+
+DEFAULT_RING_FPS = 10
+DEFAULT_RING_BYTES = 256 * 1024 * 1024
+MIN_RING_SLOTS = 4
+# Slots beyond the pre-roll, so frames still being encoded are not overwritten
+RING_HEADROOM_SLOTS = 8
+CAPTURE_START_TIMEOUT = 30.0  # Opening a camera may take a while
+FRAME_TIMEOUT = 5.0
+POLL_SECONDS = 0.005
+
+_HEADER_FIELDS = 4  # slots, width, height, latest sequence number
+
+
+class FrameRing:
+    """A ring of fixed-size BGR frames in shared memory, one writer and any number of readers"""
+
+    def __init__(self, memory, owner):
+        self._memory = memory
+        self.owner = owner
+        self.name = memory.name
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=memory.buf)
+        self.slots, self.width, self.height = (int(value) for value in header[:3])
+        self._header = header
+        offset = header.nbytes
+        self._seqs = np.ndarray((self.slots,), dtype=np.int64, buffer=memory.buf, offset=offset)
+        offset += self._seqs.nbytes
+        self._times = np.ndarray((self.slots,), dtype=np.float64, buffer=memory.buf, offset=offset)
+        offset += self._times.nbytes
+        self._frames = np.ndarray((self.slots, self.height, self.width, 3), dtype=np.uint8,
+                                  buffer=memory.buf, offset=offset)
+
+    @staticmethod
+    def frame_bytes(width, height):
+        return width * height * 3
+
+    @classmethod
+    def create(cls, slots, width, height):
+        """A new ring, unlinked again by close() of this instance"""
+        size = (_HEADER_FIELDS + 2 * slots) * 8 + slots * cls.frame_bytes(width, height)
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=memory.buf)
+        header[:] = (slots, width, height, 0)
+        del header
+        ring = cls(memory, owner=True)
+        ring._seqs[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def latest(self):
+        """Sequence number of the newest frame, 0 while the ring is empty"""
+        return int(self._header[3])
+
+    def write(self, frame, timestamp):
+        """Store a frame of the ring's size, returns its sequence number"""
+        seq = self.latest + 1
+        slot = seq % self.slots
+        self._seqs[slot] = 0  # Readers of the old frame see it is gone
+        self._frames[slot] = frame
+        self._times[slot] = timestamp
+        self._seqs[slot] = seq
+        self._header[3] = seq
+        return seq
+
+    def valid(self, seq):
+        """Whether frame `seq` is still in the ring, unchanged"""
+        return seq > 0 and int(self._seqs[seq % self.slots]) == seq
+
+    def get(self, seq):
+        """(timestamp, frame view) of frame `seq`, or None once it has been overwritten.
+
+        The view is only good while valid(seq) holds, check again after using it.
+        """
+        slot = seq % self.slots
+        if seq <= 0 or int(self._seqs[slot]) != seq:
+            return None
+        return float(self._times[slot]), self._frames[slot]
+
+    def between(self, start, end):
+        """[(seq, timestamp)] of the frames in the ring taken from `start` to `end` (epoch seconds)"""
+        latest = self.latest
+        found = []
+        for seq in range(max(1, latest - self.slots + 1), latest + 1):
+            slot = seq % self.slots
+            timestamp = float(self._times[slot])
+            if int(self._seqs[slot]) == seq and start <= timestamp <= end:
+                found.append((seq, timestamp))
+        return found
+
+    def close(self):
+        """Detach, and remove the memory if this instance created it"""
+        self._header = self._seqs = self._times = self._frames = None
+        try:
+            self._memory.close()
+        except BufferError:
+            pass  # A frame view is still referenced somewhere, the memory goes with the process
+        if self.owner:
+            try:
+                self._memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _fit(frame, size):
+    if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def _capture_process(source, resolution, ring_fps, conn, stop_event):
+    """Body of the camera process: read, flip, resize and write frames into the ring"""
+    camera = open_source(source)
+    ring = None
+    try:
+        if not camera.isOpened():
+            conn.send(("error", "Gagal membuka kamera!"))
+            return
+        size = tuple(resolution) if resolution[0] > 0 and resolution[1] > 0 else None
+        if size is not None:
+            request_resolution(camera, size)
+        ret, frame = camera.read()
+        if not ret or frame is None:
+            conn.send(("error", "Gagal mengambil frame dari kamera!"))
+            return
+        if size is None:
+            size = (frame.shape[1], frame.shape[0])
+        conn.send(("size", size[0], size[1], camera.get(cv2.CAP_PROP_FPS) or 0.0))
+        message = conn.recv()
+        if message[0] != "ring":
+            return
+        ring = FrameRing.attach(message[1])
+
+        period = 1.0 / ring_fps
+        next_write = time.monotonic()
+        while not stop_event.is_set():
+            # Frames between ring writes are grabbed but never decoded
+            if time.monotonic() < next_write:
+                if not camera.grab():
+                    conn.send(("error", "Gagal mengambil frame dari kamera!"))
+                    return
+                continue
+            ret, frame = camera.read()
+            if not ret or frame is None:
+                conn.send(("error", "Gagal mengambil frame dari kamera!"))
+                return
+            timestamp = time.time()
+            ring.write(_fit(cv2.flip(frame, 1), size), timestamp)
+            next_write = max(next_write + period, time.monotonic())
+    except (EOFError, OSError):
+        pass  # The engine went away
+    finally:
+        camera.release()
+        if ring is not None:
+            ring.close()
+        conn.close()
+
+
+class RingCamera:
+    """A camera read in its own process, through a FrameRing.
+
+    Stands in for the camera in CaptureEngine (isOpened, grab, retrieve,
+    read, get, set, release). Frames are already flipped and at the capture
+    resolution. retrieve() returns a view into the ring, the sequence number
+    of the frame it returned is in last_seq. The ring holds `preroll_seconds`
+    of frames at `ring_fps` plus some headroom, within `max_bytes`.
+    """
+
+    def __init__(self, source, resolution=(0, 0), preroll_seconds=3, ring_fps=DEFAULT_RING_FPS,
+                 max_bytes=DEFAULT_RING_BYTES):
+        self.ring_fps = ring_fps
+        self.ring = None
+        self.error = None
+        self.last_seq = 0
+        self._grabbed = 0
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._stop = context.Event()
+        self._process = context.Process(target=_capture_process, name="CameraProcess",
+                                        args=(source, tuple(resolution), ring_fps, child_conn, self._stop),
+                                        daemon=True)
+        self._process.start()
+        child_conn.close()
+
+        message = self._receive(CAPTURE_START_TIMEOUT)
+        if message is None or message[0] != "size":
+            self.error = message[1] if message is not None and message[0] == "error" else "Gagal membuka kamera!"
+            self.release()
+            return
+        _, self.width, self.height, self.fps = message
+        frame_bytes = FrameRing.frame_bytes(self.width, self.height)
+        slots = math.ceil(preroll_seconds * ring_fps) + RING_HEADROOM_SLOTS
+        slots = max(MIN_RING_SLOTS, min(slots, max_bytes // frame_bytes))
+        self.ring = FrameRing.create(slots, self.width, self.height)
+        self._conn.send(("ring", self.ring.name))
+
+    @property
+    def preroll_seconds(self):
+        """How far back the ring reaches"""
+        return max(0, self.ring.slots - RING_HEADROOM_SLOTS) / self.ring_fps if self.ring else 0
+
+    def _receive(self, timeout):
+        try:
+            if self._conn.poll(timeout):
+                return self._conn.recv()
+        except (EOFError, OSError):
+            pass
+        return None
+
+    def _check(self):
+        """False once the camera process has failed or exited"""
+        if self.error is not None:
+            return False
+        try:
+            if self._conn.poll():
+                message = self._conn.recv()
+                if message[0] == "error":
+                    self.error = message[1]
+                    return False
+        except (EOFError, OSError):
+            self.error = "Proses kamera berhenti"
+            return False
+        if not self._process.is_alive():
+            self.error = "Proses kamera berhenti"
+            return False
+        return True
+
+    def isOpened(self):
+        return self.ring is not None and self._check()
+
+    def grab(self):
+        """Make the newest frame in the ring current, waiting only for the very first one"""
+        deadline = time.monotonic() + FRAME_TIMEOUT
+        while self.ring is not None and self._check():
+            latest = self.ring.latest
+            if latest:
+                self._grabbed = latest
+                return True
+            if time.monotonic() > deadline:
+                self.error = "Tidak ada frame dari proses kamera"
+                return False
+            time.sleep(POLL_SECONDS)
+        return False
+
+    def retrieve(self):
+        if self.ring is None or not self._grabbed:
+            return False, None
+        # The grabbed frame may have been overwritten meanwhile, take the newest one then
+        for seq in (self._grabbed, self.ring.latest):
+            entry = self.ring.get(seq)
+            if entry is not None:
+                self.last_seq = seq
+                return True, entry[1]
+        return False, None
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def valid(self, seq):
+        return self.ring is not None and self.ring.valid(seq)
+
+    def frames_between(self, start, end):
+        """[(seq, timestamp)] of the ring's frames taken between two epoch times"""
+        return self.ring.between(start, end) if self.ring is not None else []
+
+    def frame(self, seq):
+        """(timestamp, frame view) of frame `seq`, or None"""
+        return self.ring.get(seq) if self.ring is not None else None
+
+    def set(self, prop, value):
+        return False  # The size is fixed once the ring exists
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(getattr(self, "width", 0))
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(getattr(self, "height", 0))
+        if prop == cv2.CAP_PROP_FPS:
+            return float(getattr(self, "fps", 0))
+        return 0.0
+
+    def release(self):
+        self._stop.set()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._conn.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
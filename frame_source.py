@@ -0,0 +1,196 @@
+"""Frame sources that can stand in for a camera.
+
+Everything that reads frames goes through open_source(), which accepts the
+same values as the --camera option:
+
+    0, 1, ...                  a camera index (cv2.VideoCapture)
+    synthetic:1280x720@30      generated moving frames at the given size and rate
+    path/to/video.mp4          a video file, played in a loop
+
+The sources implement the small part of the cv2.VideoCapture interface the
+capture engine uses (isOpened, read, grab, retrieve, set, get, release), so
+capture and benchmarks run without a physical webcam.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+SYNTHETIC_PREFIX = "synthetic"
+DEFAULT_SYNTHETIC_SIZE = (1280, 720)
+DEFAULT_SYNTHETIC_FPS = 30
+
+
+def open_source(source):
+    """Open a camera index, synthetic:WxH[@fps] spec or video file"""
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return cv2.VideoCapture(int(source))
+    if source == SYNTHETIC_PREFIX or source.startswith(SYNTHETIC_PREFIX + ":"):
+        size, fps = parse_synthetic(source)
+        return SyntheticCamera(size, fps)
+    return VideoFileSource(source)
+
+
+def request_resolution(source, size):
+    """Ask the device to deliver frames of (width, height), returns the size it settled on.
+
+    Drivers pick the nearest mode they support (or ignore the request), so
+    the result may differ from `size`; (0, 0) means the size is unknown.
+    """
+    width, height = size
+    source.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    source.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return int(source.get(cv2.CAP_PROP_FRAME_WIDTH) or 0), int(source.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+
+
+def parse_synthetic(spec):
+    """Parse "synthetic:1280x720@30" into ((1280, 720), 30); parts may be left out"""
+    size, fps = DEFAULT_SYNTHETIC_SIZE, DEFAULT_SYNTHETIC_FPS
+    _, _, options = spec.partition(":")
+    if options:
+        size_text, _, fps_text = options.partition("@")
+        if size_text:
+            width, height = (int(part) for part in size_text.lower().split("x"))
+            size = (width, height)
+        if fps_text:
+            fps = float(fps_text)
+    return size, fps
+
+
+class FramePacer:
+    """Blocks like a camera driver until the next frame of a fixed rate is due"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self._next_time = None
+
+    def wait(self):
+        if self.fps <= 0:
+            return
+        now = time.perf_counter()
+        if self._next_time is None:
+            self._next_time = now
+        if self._next_time > now:
+            time.sleep(self._next_time - now)
+        # Never bank time while nobody was reading, a late reader gets the next frame at once
+        self._next_time = max(self._next_time + 1.0 / self.fps, now)
+
+
+class SyntheticCamera:
+    """Generated frames: a textured pattern that drifts and changes brightness.
+
+    read() is paced at `fps` like a real camera blocking until the next frame
+    (fps=0 returns frames as fast as they are asked for). The content changes
+    every frame so change detection and JPEG sizes behave realistically.
+    Like a driver, grab() only advances to the next frame and retrieve()
+    does the work of producing it; the frame size can be changed with set().
+    """
+
+    def __init__(self, size=DEFAULT_SYNTHETIC_SIZE, fps=DEFAULT_SYNTHETIC_FPS, seed=0):
+        self.fps = fps
+        self.seed = seed
+        self._make_pattern(size)
+        self._index = 0
+        self._grabbed = False
+        self._pacer = FramePacer(fps)
+        self._opened = True
+
+    def _make_pattern(self, size):
+        self.width, self.height = size
+        rng = np.random.default_rng(self.seed)
+        # Twice the frame size, so a moving window can slide over it
+        noise = rng.integers(0, 256, (self.height // 8 + 1, self.width // 4 + 1, 3), dtype=np.uint8)
+        texture = cv2.resize(noise, (self.width * 2, self.height), interpolation=cv2.INTER_CUBIC)
+        self._pattern = cv2.GaussianBlur(texture, (0, 0), 3)
+
+    def isOpened(self):
+        return self._opened
+
+    def grab(self):
+        if not self._opened:
+            return False
+        self._pacer.wait()
+        self._index += 1
+        self._grabbed = True
+        return True
+
+    def retrieve(self):
+        if not self._grabbed:
+            return False, None
+        index = self._index - 1
+        offset = (index * 4) % self.width
+        frame = self._pattern[:, offset:offset + self.width]
+        # Slow brightness wave, as if the light in the room changes
+        gain = 0.85 + 0.15 * np.sin(index / 50.0)
+        return True, cv2.convertScaleAbs(frame, alpha=gain)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self._make_pattern((max(16, int(value)), self.height))
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self._make_pattern((self.width, max(16, int(value))))
+        else:
+            return False
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def release(self):
+        self._opened = False
+
+
+class VideoFileSource:
+    """Frames from a video file, restarting at the end, paced at the file's frame rate"""
+
+    def __init__(self, path, paced=True):
+        self.path = path
+        self._capture = cv2.VideoCapture(path) if os.path.exists(path) else None
+        fps = self._capture.get(cv2.CAP_PROP_FPS) if self._capture is not None else 0
+        self.fps = fps if paced and fps and fps > 0 else 0
+        self._pacer = FramePacer(self.fps)
+
+    def isOpened(self):
+        return self._capture is not None and self._capture.isOpened()
+
+    def grab(self):
+        if not self.isOpened():
+            return False
+        self._pacer.wait()
+        if self._capture.grab():
+            return True
+        # Loop: rewind and try once more
+        self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self._capture.grab()
+
+    def retrieve(self):
+        if not self.isOpened():
+            return False, None
+        return self._capture.retrieve()
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def set(self, prop, value):
+        return False  # A file has the size it was recorded at
+
+    def get(self, prop):
+        return self._capture.get(prop) if self._capture is not None else 0.0
+
+    def release(self):
+        if self._capture is not None:
+            self._capture.release()
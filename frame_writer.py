@@ -0,0 +1,213 @@
+"""Background JPEG encoding and writing for captured frames.
+
+Captures are queued to a small pool of worker threads so that a slow disk or
+a large frame never stalls the camera loop. cv2.imencode releases the GIL,
+so encoding in the workers runs in parallel with the capture thread.
+"""
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from capture_filters import frame_signature
+from thumbnails import make_thumbnail
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class WriteResult:
+    """Outcome of one submitted capture, delivered in submission order"""
+
+    def __init__(self, name, timestamp, error=None, dropped=False):
+        self.name = name
+        self.timestamp = timestamp
+        self.frame = None  # Catalog entry once the write has been recorded
+        self.error = error
+        self.dropped = dropped
+        self.width = 0
+        self.height = 0
+        self.size = 0
+        self.data = None  # Encoded JPEG bytes, only kept when the writer has keep_encoded set
+        self.thumbnail = None  # Encoded thumbnail, only made when the writer has thumbnails set
+        self.signature = None  # capture_filters signature, only made when the writer has signatures set
+
+    @property
+    def ok(self):
+        return self.frame is not None
+
+
+class FrameWriter:
+    """Bounded pool of threads that encode frames and store them in the catalog.
+
+    When more than max_pending captures are waiting, the backpressure policy
+    decides what happens: "block" waits for a free slot, "drop_oldest"
+    discards the oldest queued capture and "drop_newest" rejects the new one.
+    Files are written in parallel, but they are added to the catalog and
+    reported through on_result in the order captures were submitted, so the
+    catalog stays chronological even with several workers. With thumbnails
+    set the workers also encode a small thumbnail while the frame is at hand,
+    and with signatures set they make its signature for the activity index.
+    With a metrics.Metrics registry, queue wait, encode and write times are
+    recorded per capture. An exception from on_result is counted and reported
+    through on_status(message), it does not stop delivery of later captures.
+    """
+
+    def __init__(self, catalog, workers=2, max_pending=8, policy="drop_oldest", on_result=None,
+                 keep_encoded=False, thumbnails=False, signatures=False, metrics=None, on_status=None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.catalog = catalog
+        self.max_pending = max(1, max_pending)
+        self.policy = policy
+        self.on_result = on_result
+        self.keep_encoded = keep_encoded
+        self.thumbnails = thumbnails
+        self.signatures = signatures
+        self.metrics = metrics
+        self.on_status = on_status or (lambda message: None)
+        self.dropped = 0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._next_ticket = 0
+        self._next_delivery = 0
+        self._done = {}
+        self._delivery_lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"FrameWriter-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def submit(self, frame, name, timestamp, quality, still_valid=None):
+        """Queue a frame for encoding, returns False if it was rejected.
+
+        A frame that is a view into a buffer the producer reuses (see
+        frame_ring) comes with still_valid(), checked once the frame has
+        been encoded; if it returns False the capture fails instead of
+        saving a half-overwritten image.
+        """
+        accepted = True
+        dropped_job = None
+        with self._cond:
+            if len(self._queue) >= self.max_pending and not self._closed:
+                if self.policy == "block":
+                    while len(self._queue) >= self.max_pending and not self._closed:
+                        self._cond.wait()
+                elif self.policy == "drop_oldest":
+                    dropped_job = self._queue.popleft()
+                else:
+                    accepted = False
+            if self._closed:
+                raise RuntimeError("FrameWriter is closed")
+
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            if accepted:
+                self._queue.append((ticket, frame, name, timestamp, quality, time.perf_counter(), still_valid))
+                self._cond.notify_all()
+            else:
+                dropped_job = (ticket, None, name, timestamp, quality, None, None)
+            if dropped_job is not None:
+                self.dropped += 1
+                if self.metrics is not None:
+                    self.metrics.count("captures_dropped")
+
+        if dropped_job is not None:
+            self._finish(dropped_job[0], WriteResult(name=dropped_job[2], timestamp=dropped_job[3],
+                                                     dropped=True))
+        return accepted
+
+    def close(self, wait=True):
+        """Stop accepting captures; with wait=True, flush everything still queued"""
+        with self._cond:
+            self._closed = True
+            if not wait:
+                dropped = list(self._queue)
+                self._queue.clear()
+            else:
+                dropped = []
+            self._cond.notify_all()
+        for job in dropped:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.count("captures_dropped")
+            self._finish(job[0], WriteResult(name=job[2], timestamp=job[3], dropped=True))
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                ticket, frame, name, timestamp, quality, queued, still_valid = self._queue.popleft()
+                self._cond.notify_all()  # Wake a producer blocked on a full queue
+
+            metrics = self.metrics
+            started = time.perf_counter()
+            if metrics is not None:
+                metrics.observe("queue_wait", started - queued)
+            result = WriteResult(name, timestamp)
+            try:
+                ok, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+                if not ok:
+                    raise IOError(f"Gagal meng-encode {name}")
+                if self.thumbnails:
+                    result.thumbnail = make_thumbnail(frame)
+                if self.signatures:
+                    result.signature = frame_signature(frame)
+                if still_valid is not None and not still_valid():
+                    raise IOError(f"Frame {name} sudah tertimpa sebelum selesai di-encode")
+                encoded = time.perf_counter()
+                self.catalog.write_file(name, buffer)
+                if metrics is not None:
+                    metrics.observe("encode", encoded - started)
+                    metrics.observe("write", time.perf_counter() - encoded)
+                    metrics.count("bytes_written", len(buffer))
+                result.height, result.width = frame.shape[:2]
+                result.size = len(buffer)
+                if self.keep_encoded:
+                    result.data = buffer.tobytes()
+            except Exception as e:
+                result.error = e
+            self._finish(ticket, result)
+
+    def _finish(self, ticket, result):
+        # Deliver results strictly in submission order. Runs on whichever worker completes the
+        # next ticket, so nothing may escape: a dead worker would leave later tickets undelivered
+        with self._delivery_lock:
+            self._done[ticket] = result
+            while self._next_delivery in self._done:
+                ready = self._done.pop(self._next_delivery)
+                self._next_delivery += 1
+                if not ready.dropped and ready.error is None:
+                    started = time.perf_counter()
+                    try:
+                        ready.frame = self.catalog.add(ready.name, ready.timestamp, ready.width,
+                                                       ready.height, size=ready.size)
+                    except Exception as e:
+                        ready.error = e
+                    if self.metrics is not None:
+                        self.metrics.observe("catalog_add", time.perf_counter() - started)
+                if self.on_result is not None:
+                    self._deliver(ready)
+                ready.data = None
+                ready.thumbnail = None
+                ready.signature = None
+
+    def _deliver(self, result):
+        try:
+            self.on_result(result)
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.count("result_errors")
+            self.on_status(f"Gagal memproses hasil {result.name}: {e}")
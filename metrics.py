@@ -0,0 +1,204 @@
+"""Low-overhead timing and counters for the capture and render paths.
+
+Code under measurement records plain numbers: observe(stage, seconds) for
+timings (kept in fixed-bucket histograms), count(name) for events and
+gauge(name, value) for current values. A snapshot can be written
+periodically as JSON lines by MetricsLogger, served as text in the
+Prometheus exposition format by MetricsServer, or shown in the GUI.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, float("inf"))
+METRIC_PREFIX = "timelapse"
+
+
+class Histogram:
+    """Counts of observations per bucket, plus sum and maximum"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max for the last bucket)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        ms = 1000
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * ms, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * ms, 3),
+            "p95_ms": round(self.quantile(0.95) * ms, 3),
+            "p99_ms": round(self.quantile(0.99) * ms, 3),
+            "max_ms": round(self.max * ms, 3),
+        }
+
+
+class Metrics:
+    """Thread-safe registry of stage timings, counters and gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+        self._gauges = {}
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._timers.get(stage)
+            if histogram is None:
+                histogram = self._timers[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        """Everything recorded so far, as plain JSON-friendly data"""
+        with self._lock:
+            return {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "uptime_s": round(time.time() - self.started, 1),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timers": {stage: histogram.summary() for stage, histogram in self._timers.items()},
+            }
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {METRIC_PREFIX}_stage_seconds histogram")
+            for stage, histogram in sorted(self._timers.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, histogram.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+                lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+                lines.append(f"{METRIC_PREFIX}_{name} {value}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_uptime_seconds gauge")
+            lines.append(f"{METRIC_PREFIX}_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsLogger:
+    """Appends a metrics snapshot as one JSON line every `interval` seconds.
+
+    The file is rotated to <path>.1 once it grows past max_bytes, so long
+    unattended runs do not fill the disk.
+    """
+
+    def __init__(self, metrics, path, interval=60, max_bytes=10 * 1024 * 1024):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsLogger", daemon=True)
+        self._thread.start()
+
+    def write(self):
+        line = json.dumps(self.metrics.snapshot()) + "\n"
+        try:
+            if os.path.getsize(self.path) + len(line) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def close(self):
+        """Stop logging, writing one last snapshot"""
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.write()
+        except OSError:
+            pass
+
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text) and /metrics.json on localhost"""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.prometheus_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,308 @@
+"""Minimal Motion-JPEG AVI muxer and reader.
+
+JPEG bytes are stored as-is in '00dc' chunks, so writing and concatenating
+videos never decodes or re-encodes pixels. Files use the OpenDML (AVI 2.0)
+layout, so a multi-day timelapse is not held to the 4 GB of plain AVI: the
+first RIFF list holds the headers, up to RIFF_MAX_BYTES of frames and an
+idx1 index for AVI 1.0 players, and the video goes on in 'AVIX' RIFF lists
+of the same size. Every movi list ends with an 'ix00' index of its frames,
+and a super index in the stream header points to them.
+"""
+import os
+import struct
+
+from frame_catalog import jpeg_size
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+AVI_INDEX_OF_INDEXES = 0x00
+AVI_INDEX_OF_CHUNKS = 0x01
+RIFF_MAX_BYTES = 1 << 30  # Size of each RIFF list, well below the 4 GB a 32-bit size can describe
+SUPER_INDEX_ENTRIES = 256  # RIFF lists a file can have, so at most 256 GB of video
+BASE_HEADER_SIZE = 224  # The AVI 1.0 headers (RIFF, hdrl with avih, strh, strf), read_info() reads these
+SUPER_INDEX_SIZE = 8 + 24 + 16 * SUPER_INDEX_ENTRIES  # 'indx' chunk in the stream header list
+ODML_SIZE = 12 + 8 + 248  # 'odml' list with the total frame count
+HEADER_SIZE = BASE_HEADER_SIZE + SUPER_INDEX_SIZE + ODML_SIZE  # Everything before the first movi chunk
+COPY_BLOCK_BYTES = 1 << 20
+
+
+class AviError(Exception):
+    """Raised for unreadable or oversized AVI files"""
+
+
+def write_chunk(f, data):
+    """Write JPEG bytes to an open file as a '00dc' chunk"""
+    f.write(b"00dc" + struct.pack("<I", len(data)))
+    f.write(data)
+    if len(data) % 2:
+        f.write(b"\0")
+
+
+def _chunk(fourcc, payload):
+    data = fourcc + struct.pack("<I", len(payload)) + payload
+    if len(payload) % 2:
+        data += b"\0"
+    return data
+
+
+def _rate(fps):
+    """AVI stores the frame rate as dwRate / dwScale"""
+    return int(round(fps * 1000)), 1000
+
+
+class MjpegAviWriter:
+    """Stream JPEG-encoded frames into an MJPEG AVI file"""
+
+    def __init__(self, path, width, height, fps):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = 0
+        self._max_chunk = 0
+        self._riffs = []  # (ix00 offset, ix00 size, frames) of each finished RIFF list, for the super index
+        self._first_riff = None  # (riff size, movi size, frames) of the first RIFF list, for the main header
+        self._index = []  # (file offset of the chunk, size) of the frames in the current RIFF list
+        self._file = open(path, "wb")
+        self._file.write(self._header())
+        self._riff_start = 0
+        self._movi_start = HEADER_SIZE - 4  # The 'movi' fourcc, idx1 offsets count from here
+        self._pos = HEADER_SIZE
+
+    def _header(self):
+        riff_size, movi_size, first_frames = self._first_riff or (0, 0, 0)
+        rate, scale = _rate(self.fps)
+        avih = struct.pack("<14I", int(1e6 / self.fps), 0, 0, AVIF_HASINDEX, first_frames, 0, 1,
+                           self._max_chunk, self.width, self.height, 0, 0, 0, 0)
+        strh = struct.pack("<4s4sI2H8I4h", b"vids", b"MJPG", 0, 0, 0, 0, scale, rate, 0,
+                           self.frame_count, self._max_chunk, 0xFFFFFFFF, 0,
+                           0, 0, self.width, self.height)
+        strf = struct.pack("<IiiHH4sIiiII", 40, self.width, self.height, 1, 24, b"MJPG",
+                           self.width * self.height * 3, 0, 0, 0, 0)
+        entries = b"".join(struct.pack("<QII", offset, size, frames) for offset, size, frames in self._riffs)
+        indx = struct.pack("<HBBI4s3I", 4, 0, AVI_INDEX_OF_INDEXES, len(self._riffs), b"00dc", 0, 0, 0) \
+            + entries.ljust(16 * SUPER_INDEX_ENTRIES, b"\0")
+        strl = b"LIST" + struct.pack("<I", 4 + 8 + len(strh) + 8 + len(strf) + 8 + len(indx)) + b"strl" \
+            + _chunk(b"strh", strh) + _chunk(b"strf", strf) + _chunk(b"indx", indx)
+        odml = b"LIST" + struct.pack("<I", ODML_SIZE - 8) + b"odml" \
+            + _chunk(b"dmlh", struct.pack("<I", self.frame_count).ljust(248, b"\0"))
+        hdrl = b"LIST" + struct.pack("<I", 4 + 8 + len(avih) + len(strl) + len(odml)) + b"hdrl" \
+            + _chunk(b"avih", avih) + strl + odml
+        header = b"RIFF" + struct.pack("<I", riff_size) + b"AVI " + hdrl \
+            + b"LIST" + struct.pack("<I", movi_size) + b"movi"
+        assert len(header) == HEADER_SIZE
+        return header
+
+    def _riff_overhead(self, frames):
+        """Bytes the indexes of a RIFF list with `frames` frames add after its last frame"""
+        overhead = 8 + 24 + 8 * frames  # ix00
+        if not self._riffs:
+            overhead += 8 + 16 * frames  # idx1, only in the first RIFF list
+        return overhead
+
+    def add_jpeg(self, data):
+        """Append one JPEG-encoded frame"""
+        size = len(data)
+        padded = size + (size % 2)
+        if (self._index and self._pos + 8 + padded + self._riff_overhead(len(self._index) + 1)
+                > self._riff_start + RIFF_MAX_BYTES):
+            self._next_riff()
+        self._index.append((self._pos, size))
+        write_chunk(self._file, data)
+        self._pos += 8 + padded
+        self._max_chunk = max(self._max_chunk, size)
+        self.frame_count += 1
+
+    def append_chunks(self, source, sizes):
+        """Append frames that were written to the open file `source` with
+        write_chunk(), `sizes` being their JPEG sizes in order. The index is
+        built from the sizes and the bytes are copied in bulk, nothing is parsed."""
+        pending = 0  # Bytes of chunks indexed but not copied yet
+        for size in sizes:
+            padded = size + (size % 2)
+            if (self._index and self._pos + pending + 8 + padded + self._riff_overhead(len(self._index) + 1)
+                    > self._riff_start + RIFF_MAX_BYTES):
+                self._copy(source, pending)
+                pending = 0
+                self._next_riff()
+            self._index.append((self._pos + pending, size))
+            pending += 8 + padded
+            self._max_chunk = max(self._max_chunk, size)
+            self.frame_count += 1
+        self._copy(source, pending)
+
+    def _copy(self, source, length):
+        while length > 0:
+            data = source.read(min(length, COPY_BLOCK_BYTES))
+            if not data:
+                raise AviError("Bagian video terpotong")
+            self._file.write(data)
+            length -= len(data)
+            self._pos += len(data)
+
+    def _finish_riff(self):
+        """Close the current movi list with its ix00 index (and idx1 in the first RIFF list)"""
+        ix_offset = self._pos
+        entries = b"".join(struct.pack("<II", offset + 8 - self._riff_start, size)
+                           for offset, size in self._index)
+        ix = _chunk(b"ix00", struct.pack("<HBBI4sQI", 2, 0, AVI_INDEX_OF_CHUNKS, len(self._index), b"00dc",
+                                         self._riff_start, 0) + entries)
+        self._file.write(ix)
+        self._pos += len(ix)
+        movi_size = self._pos - self._movi_start
+        if not self._riffs:
+            # idx1 offsets are relative to the 'movi' fourcc
+            idx = b"".join(struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, offset - self._movi_start, size)
+                           for offset, size in self._index)
+            idx1 = _chunk(b"idx1", idx)
+            self._file.write(idx1)
+            self._pos += len(idx1)
+            self._first_riff = (self._pos - 8, movi_size, len(self._index))
+        else:
+            # Patch the sizes of this AVIX list and its movi list
+            self._file.seek(self._riff_start + 4)
+            self._file.write(struct.pack("<I", self._pos - self._riff_start - 8))
+            self._file.seek(self._movi_start - 4)
+            self._file.write(struct.pack("<I", movi_size))
+            self._file.seek(self._pos)
+        self._riffs.append((ix_offset, len(ix), len(self._index)))
+        self._index = []
+
+    def _next_riff(self):
+        if len(self._riffs) + 1 >= SUPER_INDEX_ENTRIES:
+            raise AviError(f"File AVI mencapai batas {SUPER_INDEX_ENTRIES * RIFF_MAX_BYTES >> 30} GB")
+        self._finish_riff()
+        self._riff_start = self._pos
+        self._file.write(b"RIFF" + struct.pack("<I", 0) + b"AVIX" + b"LIST" + struct.pack("<I", 0) + b"movi")
+        self._movi_start = self._pos + 20
+        self._pos += 24
+
+    def close(self):
+        """Write the indexes and patch the header sizes"""
+        if self._file is None:
+            return
+        self._finish_riff()
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+        self._file = None
+
+    def abort(self):
+        """Close and delete an unfinished file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def read_info(path):
+    """Return (width, height, fps, frame_count) from the AVI headers"""
+    with open(path, "rb") as f:
+        head = f.read(BASE_HEADER_SIZE)
+    if len(head) < BASE_HEADER_SIZE or head[:4] != b"RIFF" or head[8:12] != b"AVI ":
+        raise AviError(f"Bukan file AVI: {path}")
+    avih = struct.unpack("<14I", head[32:88])
+    scale, rate, _, length = struct.unpack("<4I", head[128:144])
+    fps = rate / scale if scale else 0
+    # The stream length counts the frames of every RIFF list, avih only those of the first
+    return avih[8], avih[9], fps, max(length, avih[4])
+
+
+def iter_jpeg_frames(path):
+    """Yield the JPEG bytes of every video frame in file order.
+
+    Chunks are walked sequentially from the movi list, so files that were
+    never closed (no index, zero sizes in the header) can still be read.
+    Past the first movi list the walk goes on in the AVIX lists of OpenDML.
+    """
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if riff[:4] != b"RIFF" or riff[8:12] != b"AVI ":
+            raise AviError(f"Bukan file AVI: {path}")
+        movi_end = _find_movi(f)
+        while True:
+            if movi_end is not None and f.tell() >= movi_end:
+                movi_end = _next_movi(f, movi_end)
+                if movi_end == -1:
+                    return
+                continue
+            header = f.read(8)
+            if len(header) < 8:
+                return
+            fourcc, size = struct.unpack("<4sI", header)
+            if fourcc == b"LIST":
+                f.read(4)  # 'rec ' lists just group chunks, and an unfinished file's AVIX has its movi
+                continue
+            if fourcc == b"RIFF":
+                if f.read(4) != b"AVIX":
+                    return
+                continue
+            if fourcc == b"idx1":
+                f.seek(size + (size % 2), 1)  # Only reached in a file whose sizes were never written
+                continue
+            data = f.read(size)
+            if len(data) < size:
+                return  # Truncated by an interrupted write
+            if size % 2:
+                f.read(1)
+            if fourcc[2:] in (b"dc", b"db"):
+                yield data
+
+
+def _find_movi(f):
+    """Seek to the first chunk of the movi list, returns its end offset (or None if unknown)"""
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise AviError("Daftar movi tidak ditemukan")
+        fourcc, size = struct.unpack("<4sI", header)
+        if fourcc == b"LIST":
+            list_type = f.read(4)
+            if list_type == b"movi":
+                # An unfinished file has a zero movi size, read until EOF then
+                return f.tell() + size - 4 if size > 4 else None
+            f.seek(size - 4 + (size % 2), 1)
+        else:
+            f.seek(size + (size % 2), 1)
+
+
+def _next_movi(f, position):
+    """Seek into the movi list of the next AVIX list after `position`; returns its end
+    offset, None if unknown (an unfinished list), or -1 if there is none"""
+    f.seek(position)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return -1
+        fourcc, size = struct.unpack("<4sI", header)
+        if fourcc == b"RIFF":
+            if f.read(4) != b"AVIX":
+                return -1
+            continue  # Its chunks follow
+        if fourcc == b"LIST" and f.read(4) == b"movi":
+            return f.tell() + size - 4 if size > 4 else None
+        if fourcc == b"LIST":
+            f.seek(size - 4 + (size % 2), 1)
+        else:
+            f.seek(size + (size % 2), 1)
+
+
+def repair(path, out_path, fps):
+    """Rewrite an unfinished MJPEG AVI with correct headers and index"""
+    writer = None
+    try:
+        for data in iter_jpeg_frames(path):
+            if writer is None:
+                width, height = jpeg_size(data)
+                writer = MjpegAviWriter(out_path, width, height, fps)
+            writer.add_jpeg(data)
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is None:
+        return 0
+    writer.close()
+    return writer.frame_count
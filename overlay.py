@@ -0,0 +1,151 @@
+"""Timestamp and label overlay burned into rendered frames.
+
+Text is drawn from a glyph atlas: every printable character is rasterized
+once with cv2.putText into an alpha mask plus a dark halo around it, and the
+atlas is cached per text height. The line of text is put together from atlas
+slices once and then patched in place, so from one frame to the next only
+the digits that changed are copied. It is blended into a small region in a
+corner of the image with a per-pixel min (the halo) and max (the white
+text), so nothing is rasterized per frame and the rest of the image is never
+touched.
+"""
+import functools
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+CHARSET = "".join(chr(code) for code in range(32, 127))  # What the Hershey fonts can draw
+DEFAULT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+OVERLAY_POSITIONS = ("bottom-left", "bottom-right", "top-left", "top-right")
+TEXT_HEIGHT_RATIO = 1 / 30  # Text height as a share of the frame height
+MIN_TEXT_HEIGHT = 10
+HALO_LEVEL = 40  # Brightest gray level left right around the text, so it reads on any background
+
+
+class GlyphAtlas:
+    """The printable ASCII characters at one text height, side by side.
+
+    `alpha` is the white text and `cap` the brightest the image may stay in
+    every pixel (dark around the strokes, 255 elsewhere). Both are 3-channel
+    uint8, so a frame needs no conversions.
+    """
+
+    def __init__(self, height):
+        scale = height / cv2.getTextSize("0", FONT, 1.0, 1)[0][1]
+        thickness = max(1, round(height / 12))
+        sizes = [cv2.getTextSize(char, FONT, scale, thickness) for char in CHARSET]
+        ascent = max(size[1] for size, _ in sizes)
+        descent = max(baseline for _, baseline in sizes)
+        self.pad = pad = thickness + 1
+        self.height = ascent + descent + 2 * pad
+        widths = [size[0] + thickness for size, _ in sizes]
+        # Strokes may reach a little past a glyph's advance, the gaps keep them out of its neighbours
+        gap = 2 * pad
+        alpha = np.zeros((self.height, sum(widths) + gap * (len(widths) + 1)), dtype=np.uint8)
+        self.slices = {}
+        x = gap
+        for char, width in zip(CHARSET, widths):
+            cv2.putText(alpha, char, (x, pad + ascent), FONT, scale, 255, thickness, cv2.LINE_AA)
+            self.slices[char] = (x, x + width)
+            x += width + gap
+        halo = cv2.dilate(alpha, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * pad + 1, 2 * pad + 1)))
+        cap = 255 - halo.astype(np.float32) * ((255 - HALO_LEVEL) / 255)
+        self.alpha = cv2.merge([alpha] * 3)
+        self.cap = cv2.merge([np.round(cap).astype(np.uint8)] * 3)
+
+    def span(self, char):
+        return self.slices.get(char, self.slices["?"])
+
+
+class TextLine:
+    """A line of text rendered from a GlyphAtlas, patched in place as its text changes"""
+
+    def __init__(self, atlas, text):
+        self.atlas = atlas
+        self.text = text
+        spans = [atlas.span(char) for char in text]
+        self.offsets = np.concatenate(([0], np.cumsum([end - start for start, end in spans]))).tolist()
+        self.alpha = np.concatenate([atlas.alpha[:, start:end] for start, end in spans], axis=1)
+        self.cap = np.concatenate([atlas.cap[:, start:end] for start, end in spans], axis=1)
+
+    def update(self, text):
+        """Switch to another text of the same layout, False if it needs a new TextLine"""
+        if text == self.text:
+            return True
+        if len(text) != len(self.text):
+            return False
+        changed = [(i, self.atlas.span(new)) for i, (old, new) in enumerate(zip(self.text, text)) if old != new]
+        if any(end - start != self.offsets[i + 1] - self.offsets[i] for i, (start, end) in changed):
+            return False
+        for i, (start, end) in changed:
+            x = self.offsets[i]
+            self.alpha[:, x:x + end - start] = self.atlas.alpha[:, start:end]
+            self.cap[:, x:x + end - start] = self.atlas.cap[:, start:end]
+        self.text = text
+        return True
+
+
+@functools.lru_cache(maxsize=8)
+def glyph_atlas(height):
+    return GlyphAtlas(height)
+
+
+class TextOverlay:
+    """Draws a frame's capture time and an optional label into a corner of the image.
+
+    Safe to use from several render threads, each keeps its own TextLine.
+    Only the settings are pickled, so an overlay is cheap to send to render
+    worker processes; each process builds the atlas it needs once.
+    """
+
+    def __init__(self, label="", time_format=DEFAULT_TIME_FORMAT, position="bottom-left", text_height=0):
+        if position not in OVERLAY_POSITIONS:
+            raise ValueError(f"Posisi overlay tidak dikenal: {position}")
+        self.label = label
+        self.time_format = time_format  # strftime format, empty for the label only
+        self.position = position
+        self.text_height = text_height  # Pixels, 0 follows the frame height
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def text(self, timestamp):
+        parts = []
+        if self.time_format:
+            parts.append(datetime.fromtimestamp(timestamp).strftime(self.time_format))
+        if self.label:
+            parts.append(self.label)
+        return "  ".join(parts)
+
+    def apply(self, image, timestamp):
+        """Draw the text for capture time `timestamp` into a BGR image, in place; returns the image"""
+        text = self.text(timestamp)
+        if not text:
+            return image
+        h, w = image.shape[:2]
+        atlas = glyph_atlas(self.text_height or max(MIN_TEXT_HEIGHT, round(h * TEXT_HEIGHT_RATIO)))
+        line = getattr(self._local, "line", None)
+        if line is None or line.atlas is not atlas or not line.update(text):
+            line = self._local.line = TextLine(atlas, text)
+
+        margin = atlas.height // 4
+        mh = min(atlas.height, h - 2 * margin)
+        mw = min(line.alpha.shape[1], w - 2 * margin)
+        if mh <= 0 or mw <= 0:
+            return image
+        y = margin if self.position.startswith("top") else h - margin - mh
+        x = margin if self.position.endswith("left") else w - margin - mw
+        roi = image[y:y + mh, x:x + mw]
+        cv2.min(roi, line.cap[:mh, :mw], dst=roi)
+        cv2.max(roi, line.alpha[:mh, :mw], dst=roi)
+        return image
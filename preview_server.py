@@ -0,0 +1,208 @@
+"""Live preview over HTTP as an MJPEG stream, for watching a rig remotely.
+
+PreviewServer serves the capture loop's frames at /stream as a
+multipart/x-mixed-replace stream of JPEGs, which browsers, VLC and ffmpeg
+play as live video, and the next frame at /snapshot.jpg. The capture loop
+only hands a frame over (a reference, no work) while a client is connected
+and the stream rate says one is due. One encoder thread scales and encodes
+it once, and each client's handler thread sends the newest JPEG whenever it
+is ready for one. A slow client skips the frames it missed instead of
+queueing them, so the server never holds more than one frame.
+"""
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+DEFAULT_STREAM_FPS = 5
+DEFAULT_STREAM_QUALITY = 70
+DEFAULT_STREAM_SIZE = (1280, 720)  # Frames are scaled down to fit, never up
+CLIENT_TIMEOUT = 10.0  # A client that takes a frame for this long is disconnected
+BOUNDARY = "timelapseframe"
+
+_PAGE = """<!doctype html>
+<html><head><title>Timelapse</title></head>
+<body style="margin:0;background:#000">
+<img src="/stream" style="display:block;max-width:100%;margin:auto" alt="Pratinjau kamera">
+</body></html>
+"""
+
+
+class PreviewServer:
+    """Serves /stream (MJPEG), /snapshot.jpg and a viewer page at / on localhost.
+
+    CaptureEngine asks wants_frame() every loop and calls put() when it says
+    so; that stays False while nobody is watching. Encoding happens on the
+    server's own thread at `fps`, `quality` and at most `size`.
+    """
+
+    def __init__(self, port, host="127.0.0.1", fps=DEFAULT_STREAM_FPS, quality=DEFAULT_STREAM_QUALITY,
+                 size=DEFAULT_STREAM_SIZE, metrics=None):
+        self.fps = fps
+        self.quality = quality
+        self.size = tuple(size)
+        self.metrics = metrics
+        self.clients = 0
+        self._lock = threading.Lock()
+        self._raw_ready = threading.Condition(self._lock)
+        self._jpeg_ready = threading.Condition(self._lock)
+        self._pending = None  # (frame, still_valid) waiting for the encoder
+        self._jpeg = None
+        self._version = 0  # Number of the newest encoded frame
+        self._last_put = -math.inf
+        self._closed = False
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            timeout = CLIENT_TIMEOUT  # Socket timeout, a stalled client is dropped
+
+            def do_GET(self):
+                if self.path == "/":
+                    body = _PAGE.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == "/stream":
+                    server._stream(self)
+                elif self.path == "/snapshot.jpg":
+                    server._snapshot(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._encoder = threading.Thread(target=self._encode_loop, name="PreviewEncoder", daemon=True)
+        self._encoder.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="PreviewServer", daemon=True)
+        self._thread.start()
+
+    def wants_frame(self, now):
+        """Whether the capture loop should put() a frame at time.monotonic() `now`"""
+        return self.clients > 0 and now - self._last_put >= 1.0 / self.fps
+
+    def until_next(self, now):
+        """Seconds until the next frame is due, infinite while nobody is watching"""
+        if self.clients <= 0:
+            return math.inf
+        return self._last_put + 1.0 / self.fps - now
+
+    def put(self, frame, now, still_valid=None):
+        """Hand a BGR frame to the encoder, replacing one it has not picked up yet.
+
+        The frame is read later on the encoder thread; still_valid() tells
+        whether a frame view (see frame_ring) was overwritten meanwhile.
+        """
+        with self._lock:
+            self._last_put = now
+            self._pending = (frame, still_valid)
+            self._raw_ready.notify()
+
+    def _encode_loop(self):
+        while True:
+            with self._lock:
+                while self._pending is None and not self._closed:
+                    self._raw_ready.wait()
+                if self._closed:
+                    return
+                (frame, still_valid), self._pending = self._pending, None
+
+            started = time.perf_counter()
+            h, w = frame.shape[:2]
+            scale = min(self.size[0] / w, self.size[1] / h)
+            if 0 < scale < 1:
+                frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            frame = None
+            if not ok or (still_valid is not None and not still_valid()):
+                continue  # The ring slot was reused while it was read, the next frame follows soon
+            with self._lock:
+                self._jpeg = encoded.tobytes()
+                self._version += 1
+                self._jpeg_ready.notify_all()
+            if self.metrics is not None:
+                self.metrics.observe("stream_encode", time.perf_counter() - started)
+
+    def _next_jpeg(self, version, timeout):
+        """(version, jpeg) of the first frame newer than `version`; jpeg is None on timeout or close"""
+        with self._lock:
+            self._jpeg_ready.wait_for(lambda: self._version != version or self._closed, timeout)
+            if self._closed or self._version == version:
+                return version, None
+            return self._version, self._jpeg
+
+    def _join(self):
+        with self._lock:
+            self.clients += 1
+            version = self._version
+        if self.metrics is not None:
+            self.metrics.gauge("stream_clients", self.clients)
+        return version
+
+    def _leave(self):
+        with self._lock:
+            self.clients -= 1
+        if self.metrics is not None:
+            self.metrics.gauge("stream_clients", self.clients)
+
+    def _stream(self, handler):
+        version = self._join()
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+            handler.send_header("Cache-Control", "no-cache, no-store")
+            handler.end_headers()
+            while not self._closed:
+                latest, jpeg = self._next_jpeg(version, CLIENT_TIMEOUT)
+                if jpeg is None:
+                    continue  # No frame from the camera yet, keep the connection
+                if self.metrics is not None and latest - version > 1:
+                    # Encoded while this client was still busy with an older frame
+                    self.metrics.count("stream_frames_skipped", latest - version - 1)
+                version = latest
+                handler.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+                handler.wfile.flush()
+        except OSError:
+            pass  # The client went away or stalled
+        finally:
+            self._leave()
+
+    def _snapshot(self, handler):
+        version = self._join()
+        try:
+            _, jpeg = self._next_jpeg(version, CLIENT_TIMEOUT)
+        finally:
+            self._leave()
+        if jpeg is None:
+            handler.send_error(503, "Belum ada frame dari kamera")
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Length", str(len(jpeg)))
+        handler.send_header("Cache-Control", "no-cache, no-store")
+        handler.end_headers()
+        try:
+            handler.wfile.write(jpeg)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._raw_ready.notify_all()
+            self._jpeg_ready.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+        self._encoder.join()
@@ -0,0 +1,171 @@
+"""Tiered retention: free storage by thinning old captures instead of deleting them.
+
+Recent frames are all kept, older ones only one per time bucket, and the
+buckets grow with age (every frame for the last day, one per 10 minutes for
+the last week, ...). When that is not enough to fit the storage budget the
+buckets are widened further, so the catalog keeps covering the whole
+recording span at a lower density instead of losing whole days.
+"""
+import threading
+import time
+from collections import namedtuple
+
+HOUR = 3600
+DAY = 24 * HOUR
+MAX_WIDEN_LEVEL = 12  # Buckets are widened up to 2**12 times before recent frames are thinned
+RECENT_SPACING = 60  # Starting bucket width once the "keep everything" tier has to be thinned
+STALLED_RETRY_SECONDS = 300  # Pause after a pass that freed nothing, before trying again
+
+# Frames younger than max_age seconds keep one frame per `spacing` seconds (0 keeps all)
+RetentionTier = namedtuple("RetentionTier", "max_age spacing")
+
+
+def default_tiers(keep_all_hours=24):
+    """Every frame for keep_all_hours, then one per 10 minutes, per hour and per 6 hours"""
+    keep_all = keep_all_hours * HOUR
+    return [
+        RetentionTier(keep_all, 0),
+        RetentionTier(max(keep_all, 7 * DAY), 10 * 60),
+        RetentionTier(max(keep_all, 30 * DAY), HOUR),
+        RetentionTier(float("inf"), 6 * HOUR),
+    ]
+
+
+def thinning_candidates(frames, now, tiers):
+    """Frames the tiers do not need, oldest first.
+
+    A frame is kept when it is the first of its time bucket. Buckets are
+    aligned to the epoch and the default widths are multiples of each other,
+    so a frame kept in a coarser bucket was also kept in every finer one and
+    repeated passes only ever remove frames.
+    """
+    candidates = []
+    last_bucket = None
+    for frame in frames:
+        age = now - frame.timestamp
+        spacing = next((tier.spacing for tier in tiers if age < tier.max_age), tiers[-1].spacing)
+        if spacing <= 0:
+            last_bucket = None
+            continue
+        bucket = (spacing, int(frame.timestamp // spacing))
+        if bucket == last_bucket:
+            candidates.append(frame)
+        else:
+            last_bucket = bucket
+    return candidates
+
+
+def _escalate(tiers):
+    """Tier sets of growing sparseness: older tiers get wider buckets first, then the recent ones"""
+    for level in range(MAX_WIDEN_LEVEL + 1):
+        yield [tier._replace(spacing=tier.spacing * 2 ** level) for tier in tiers]
+    widest = [tier._replace(spacing=tier.spacing * 2 ** MAX_WIDEN_LEVEL) for tier in tiers]
+    for level in range(MAX_WIDEN_LEVEL + 1):
+        yield [tier._replace(spacing=tier.spacing or RECENT_SPACING * 2 ** level) for tier in widest]
+
+
+def plan_thinning(frames, bytes_needed, tiers, now=None):
+    """Pick frames (oldest first) whose deletion frees bytes_needed while keeping the time span.
+
+    The first and the last frame are never picked, however much is needed.
+    """
+    if bytes_needed <= 0 or not frames:
+        return []
+    now = time.time() if now is None else now
+    ends = (frames[0], frames[-1])
+    candidates = []
+    for tier_set in _escalate(tiers):
+        candidates = [frame for frame in thinning_candidates(frames, now, tier_set)
+                      if frame is not ends[0] and frame is not ends[1]]
+        if sum(frame.size for frame in candidates) >= bytes_needed:
+            break
+
+    selected = []
+    total = 0
+    for frame in candidates:
+        if total >= bytes_needed:
+            break
+        selected.append(frame)
+        total += frame.size
+    return selected
+
+
+class RetentionWorker:
+    """Background thread that keeps a catalog within its storage budget by thinning.
+
+    request() asks for a check; the thread compares catalog.total_bytes plus
+    extra_bytes() with the budget and, when it is exceeded, deletes a thinning
+    plan in small batches so the capture loop and writer pool are never held
+    up for long. free_extra(bytes_needed) is called when thinning the catalog
+    is not enough (for example to drop old video segments) and returns the
+    bytes it freed. on_done(count, bytes_freed) reports each pass. A pass
+    that frees nothing is not repeated for STALLED_RETRY_SECONDS, so frames
+    are not thinned away one pass after another without making room;
+    on_status(message) says so.
+    """
+
+    def __init__(self, catalog, budget_bytes, tiers=None, target_ratio=0.9, batch_size=200,
+                 extra_bytes=None, free_extra=None, on_done=None, on_status=None):
+        self.catalog = catalog
+        self.budget_bytes = budget_bytes
+        self.tiers = tiers or default_tiers()
+        self.target_ratio = target_ratio  # Usage to thin down to, as a fraction of the budget
+        self.batch_size = batch_size
+        self.extra_bytes = extra_bytes or (lambda: 0)
+        self.free_extra = free_extra
+        self.on_done = on_done or (lambda count, bytes_freed: None)
+        self.on_status = on_status or (lambda message: None)
+        self._retry_at = 0.0  # time.monotonic() before which requests are ignored after a stalled pass
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="Retention", daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Check the budget soon; cheap enough to call after every capture"""
+        self._wake.set()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop:
+                return
+            if time.monotonic() < self._retry_at:
+                continue
+            usage = self.catalog.total_bytes + self.extra_bytes()
+            if usage <= self.budget_bytes:
+                continue
+            try:
+                count, freed = self.thin(usage - self.budget_bytes * self.target_ratio)
+            except Exception as e:
+                # Keep the thread alive, the next request tries again
+                self.on_status(f"Gagal menipiskan: {e}")
+                continue
+            self.on_done(count, freed)
+            if freed <= 0:
+                self._retry_at = time.monotonic() + STALLED_RETRY_SECONDS
+                self.on_status(f"Penipisan tidak mengosongkan ruang, dicoba lagi "
+                               f"{STALLED_RETRY_SECONDS // 60} menit lagi")
+
+    def thin(self, bytes_needed):
+        """Delete a thinning plan worth bytes_needed, returns (count, bytes_freed)"""
+        plan = plan_thinning(self.catalog.frames(), bytes_needed, self.tiers)
+        count = freed = 0
+        for start in range(0, len(plan), self.batch_size):
+            if self._stop:
+                break
+            removed, size = self.catalog.remove(plan[start:start + self.batch_size])
+            count += removed
+            freed += size
+        if freed < bytes_needed and not self._stop:
+            # Frames deleted from a frame pack only free their space once the pack is compacted
+            freed += self.catalog.reclaim()
+        if freed < bytes_needed and self.free_extra is not None and not self._stop:
+            freed += self.free_extra(bytes_needed - freed)
+        return count, freed
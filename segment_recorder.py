@@ -0,0 +1,266 @@
+"""Incremental video segments recorded alongside the JPG captures.
+
+Every saved capture is also appended, as the JPEG bytes that were already
+encoded for the file, to a rolling MJPEG segment (one per hour by default).
+Exporting a video then only concatenates the finished segments, which is
+bounded by disk speed instead of decoding and re-encoding the whole history.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import mjpeg_avi
+from frame_catalog import jpeg_size
+from video_render import RenderCancelled, fit_frame
+
+SEGMENT_DIRNAME = "segments"
+PART_SUFFIX = ".part"
+FRAMES_SUFFIX = ".frames"
+
+
+def segments_dir(output_dir):
+    return os.path.join(output_dir, SEGMENT_DIRNAME)
+
+
+def list_segments(directory):
+    """Sealed segment files, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(f for f in os.listdir(directory) if f.startswith("segment_") and f.endswith(".avi"))
+    return [os.path.join(directory, f) for f in names]
+
+
+def segment_start(path):
+    """Wall time of a segment's first frame, from its name (segment_YYYYmmdd_HHMMSS.avi)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(stem[len("segment_"):], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return os.path.getmtime(path)
+
+
+def segment_frame_names(path):
+    """Names of the captures stored in a segment, from its sidecar file"""
+    try:
+        with open(path + FRAMES_SUFFIX, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def segments_size(directory):
+    """Total size in bytes of the sealed segments"""
+    return sum(os.path.getsize(path) for path in list_segments(directory))
+
+
+def remove_segment(path):
+    """Delete a sealed segment and its sidecar, returns the bytes freed"""
+    size = os.path.getsize(path)
+    os.remove(path)
+    try:
+        os.remove(path + FRAMES_SUFFIX)
+    except OSError:
+        pass
+    return size
+
+
+class SegmentRecorder:
+    """Appends captures to rolling MJPEG segments and seals them on rollover.
+
+    A new segment starts when the capture time enters a new segment_seconds
+    window or the frame size changes. on_sealed(path, frame_names) is called
+    whenever a segment is finished.
+    """
+
+    def __init__(self, directory, fps=10, segment_seconds=3600, on_sealed=None):
+        self.directory = directory
+        self.fps = fps
+        self.segment_seconds = max(1, segment_seconds)
+        self.on_sealed = on_sealed
+        self._lock = threading.Lock()
+        self._writer = None
+        self._sidecar = None
+        self._bucket = None
+        self._names = []
+        os.makedirs(directory, exist_ok=True)
+        self.recover()
+
+    def recover(self):
+        """Seal segments left unfinished by a crash or power loss"""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".avi" + PART_SUFFIX):
+                continue
+            part_path = os.path.join(self.directory, name)
+            final_path = part_path[:-len(PART_SUFFIX)]
+            try:
+                count = mjpeg_avi.repair(part_path, final_path, self.fps)
+            except mjpeg_avi.AviError:
+                count = 0
+            os.remove(part_path)
+            if count == 0:
+                try:
+                    os.remove(final_path + FRAMES_SUFFIX)
+                except OSError:
+                    pass
+
+    def append(self, data, timestamp, width, height, name):
+        """Add one encoded capture to the current segment"""
+        with self._lock:
+            bucket = int(timestamp // self.segment_seconds)
+            if self._writer is not None and (bucket != self._bucket or
+                                             (width, height) != (self._writer.width, self._writer.height)):
+                self._seal_locked()
+            if self._writer is None:
+                start = datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
+                final_path = os.path.join(self.directory, f"segment_{start}.avi")
+                self._writer = mjpeg_avi.MjpegAviWriter(final_path + PART_SUFFIX, width, height, self.fps)
+                self._sidecar = open(final_path + FRAMES_SUFFIX, "a", encoding="utf-8")
+                self._bucket = bucket
+                self._names = []
+            self._writer.add_jpeg(data)
+            # The sidecar is written after the frame, so it never lists a frame the segment lacks
+            self._sidecar.write(name + "\n")
+            self._sidecar.flush()
+            self._names.append(name)
+
+    def seal(self):
+        """Finish the current segment, if any"""
+        with self._lock:
+            self._seal_locked()
+
+    def _seal_locked(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._sidecar.close()
+        part_path = self._writer.path
+        final_path = part_path[:-len(PART_SUFFIX)]
+        os.replace(part_path, final_path)
+        names = self._names
+        self._writer = None
+        self._sidecar = None
+        self._names = []
+        if self.on_sealed is not None:
+            self.on_sealed(final_path, names)
+
+    def close(self):
+        self.seal()
+
+
+class SegmentConcatJob:
+    """Join sealed segments into one MJPEG AVI without re-encoding.
+
+    Has the same interface as video_render.RenderJob. Segments whose frame
+    size differs from the majority are the only ones that get decoded, fitted
+    and re-encoded. Captures no sealed segment holds (those from before
+    segment recording was switched on, and those of the segment still being
+    recorded) are read from the catalog and put in their place by capture
+    time, copied as they are when their size matches.
+    """
+
+    def __init__(self, catalog, segments, video_path, fps=10, quality=90, progress_interval=0.25):
+        self.catalog = catalog
+        self.segments = list(segments)
+        self.video_path = video_path
+        self.fps = fps
+        self.quality = quality
+        self.progress_interval = progress_interval
+        self.frames_written = 0
+        self._cancel = threading.Event()
+
+        covered = set()
+        for path in self.segments:
+            covered.update(segment_frame_names(path))
+        # Every capture that goes into the video, for "Buat Video & Hapus JPG"
+        self.frames = catalog.frames()
+        self.loose_frames = [frame for frame in self.frames if frame.name not in covered]
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _frame_bytes(self, frame, size, encode_param):
+        """JPEG bytes of a catalog frame at the video size, None if unreadable"""
+        try:
+            data = self.catalog.read_bytes(frame)
+        except OSError:
+            return None
+        if jpeg_size(data[:65536]) == size:
+            return data
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        ok, encoded = cv2.imencode(".jpg", fit_frame(image, size), encode_param)
+        return encoded.tobytes() if ok else None
+
+    def run(self, progress=None, status=None):
+        """Write the joined video, see RenderJob.run"""
+        status = status or (lambda message: None)
+        infos = [mjpeg_avi.read_info(path) for path in self.segments]
+        total = sum(info[3] for info in infos) + len(self.loose_frames)
+        if total == 0:
+            raise RuntimeError("Tidak ada segmen video untuk digabung!")
+
+        # Use the size holding the most frames
+        counts = {}
+        for w, h, _, n in infos:
+            counts[(w, h)] = counts.get((w, h), 0) + n
+        for frame in self.loose_frames:
+            if frame.width:
+                counts[(frame.width, frame.height)] = counts.get((frame.width, frame.height), 0) + 1
+        if not counts:
+            raise RuntimeError("Tidak bisa membaca file gambar")
+        size = max(counts, key=counts.get)
+        status(f"Menggabungkan {len(self.segments)} segmen: {size[0]}x{size[1]} dengan {self.fps} FPS")
+        if self.loose_frames:
+            status(f"{len(self.loose_frames)} gambar di luar segmen ikut dimasukkan")
+
+        # Segments and loose captures in capture order
+        pieces = [(segment_start(path), 0, path, info) for path, info in zip(self.segments, infos)]
+        pieces += [(frame.timestamp, 1, frame, None) for frame in self.loose_frames]
+        pieces.sort(key=lambda piece: piece[:2])
+
+        writer = mjpeg_avi.MjpegAviWriter(self.video_path, size[0], size[1], self.fps)
+        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        last_report = 0
+        try:
+            for _, _, item, info in pieces:
+                if info is None:
+                    chunks = [self._frame_bytes(item, size, encode_param)]
+                    passthrough = True  # Already fitted
+                else:
+                    chunks = mjpeg_avi.iter_jpeg_frames(item)
+                    passthrough = (info[0], info[1]) == size
+                for data in chunks:
+                    if self._cancel.is_set():
+                        raise RenderCancelled()
+                    if data is None:
+                        continue
+                    if not passthrough:
+                        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                        if image is None:
+                            continue
+                        ok, encoded = cv2.imencode(".jpg", fit_frame(image, size), encode_param)
+                        if not ok:
+                            continue
+                        data = encoded.tobytes()
+                    writer.add_jpeg(data)
+                    self.frames_written += 1
+                    now = time.monotonic()
+                    if progress and now - last_report >= self.progress_interval:
+                        last_report = now
+                        progress(self.frames_written, total)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        if progress:
+            progress(total, total)
+        return self.frames_written
@@ -0,0 +1,53 @@
+"""Thinning plans: which frames retention.plan_thinning gives up, and in what order."""
+from collections import namedtuple
+
+from retention import HOUR, DAY, default_tiers, plan_thinning, thinning_candidates
+
+NOW = 1_800_000_000.0
+SIZE = 1000
+
+Frame = namedtuple("Frame", "name timestamp size")
+
+
+def make_frames(start_age, end_age, spacing):
+    """Frames every `spacing` seconds from start_age to end_age seconds before NOW, oldest first"""
+    count = int((start_age - end_age) // spacing) + 1
+    return [Frame(f"f{start_age}_{i}", NOW - start_age + i * spacing, SIZE) for i in range(count)]
+
+
+def test_keep_all_tier_has_no_candidates():
+    frames = make_frames(HOUR, 0, 10)
+    assert thinning_candidates(frames, NOW, default_tiers(24)) == []
+
+
+def test_first_and_last_frame_survive():
+    frames = make_frames(HOUR - 10, 0, 10)
+    plan = plan_thinning(frames, len(frames) * SIZE, default_tiers(24), now=NOW)
+    assert plan
+    assert frames[0] not in plan
+    assert frames[-1] not in plan
+
+
+def test_older_tiers_are_widened_before_recent_frames():
+    old = make_frames(9 * DAY, 8 * DAY, 60)
+    recent = make_frames(2 * HOUR, 0, 60)
+    # More than the default one-per-hour tier gives up, less than every old frame
+    needed = (len(old) - 10) * SIZE
+    plan = plan_thinning(old + recent, needed, default_tiers(24), now=NOW)
+    assert sum(frame.size for frame in plan) >= needed
+    assert set(plan) <= set(old)
+
+
+def test_recent_frames_are_thinned_last_and_evenly():
+    old = make_frames(9 * DAY, 8 * DAY, 60)
+    recent = make_frames(6 * HOUR, 0, 10)
+    needed = (len(old) + len(recent) // 2) * SIZE
+    plan = set(plan_thinning(old + recent, needed, default_tiers(24), now=NOW))
+    assert plan & set(recent)
+    # Widening the old tiers came first, only their bucket starts are left
+    assert len(set(old) - plan) <= 2
+    # The recent frames are thinned across the whole span, not cut off at one end
+    kept = [frame for frame in recent if frame not in plan]
+    assert kept[0] is recent[0] and kept[-1] is recent[-1]
+    gaps = [b.timestamp - a.timestamp for a, b in zip(kept, kept[1:])]
+    assert max(gaps) <= 2 * HOUR
@@ -0,0 +1,247 @@
+"""Small thumbnails of the captures, for browsing without decoding full frames.
+
+Thumbnails live in a single append-only file in the capture folder
+(.timelapse_thumbs), one record per frame keyed by the catalog sequence
+number and capture time. They are made by the writer pool at capture time,
+and a ThumbnailWorker fills in the ones that are missing (older captures or
+captures made from the command line). A ThumbnailCache keeps the most
+recently used thumbnails decoded, so scrubbing through a week of frames does
+not touch the full-size JPGs at all.
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+from frame_catalog import TEMP_SUFFIX
+
+THUMBS_FILENAME = ".timelapse_thumbs"
+THUMB_SIZE = (160, 90)
+THUMB_QUALITY = 70
+COMPACT_DEAD_RATIO = 0.5
+
+# seq, timestamp, length; followed by the JPEG bytes
+RECORD = struct.Struct("<IdI")
+
+
+def _same_time(a, b):
+    # The catalog log keeps timestamps to the millisecond
+    return abs(a - b) < 0.002
+
+
+def make_thumbnail(image, size=THUMB_SIZE, quality=THUMB_QUALITY):
+    """Encode a BGR image as a small JPEG that fits within size, returns bytes or None"""
+    h, w = image.shape[:2]
+    scale = min(size[0] / w, size[1] / h, 1)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes() if ok else None
+
+
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                 (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def decode_reduced(data, width, height, size=THUMB_SIZE):
+    """Decode JPEG bytes at the smallest libjpeg scale that still covers size"""
+    flag = cv2.IMREAD_COLOR
+    for factor, reduced in REDUCED_FLAGS:
+        if width // factor >= size[0] and height // factor >= size[1]:
+            flag = reduced
+            break
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+
+
+class ThumbnailStore:
+    """The thumbnail file of a capture folder"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries = {}  # seq -> (timestamp, offset of the data, length)
+        self._size = 0
+        self._file = None
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, THUMBS_FILENAME)
+
+    def load(self, frames=None):
+        """Read the record headers; thumbnails of frames no longer in `frames` are dropped"""
+        with self._lock:
+            self.close()
+            self._entries = {}
+            self._size = 0
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                return self
+            with f:
+                file_size = os.fstat(f.fileno()).st_size
+                position = 0
+                while position + RECORD.size <= file_size:
+                    f.seek(position)
+                    seq, timestamp, length = RECORD.unpack(f.read(RECORD.size))
+                    if position + RECORD.size + length > file_size:
+                        break
+                    self._entries[seq] = (timestamp, position + RECORD.size, length)
+                    position += RECORD.size + length
+            self._size = position
+            if position < file_size:
+                # Cut off a record that was only partly written
+                with open(self.path, "r+b") as f:
+                    f.truncate(position)
+
+            if frames is not None:
+                live = {frame.seq: frame.timestamp for frame in frames}
+                self._entries = {seq: entry for seq, entry in self._entries.items()
+                                 if seq in live and _same_time(live[seq], entry[0])}
+                live_bytes = sum(RECORD.size + entry[2] for entry in self._entries.values())
+                if self._size - live_bytes > self._size * COMPACT_DEAD_RATIO:
+                    self._compact()
+        return self
+
+    def _compact(self):
+        tmp_path = self.path + TEMP_SUFFIX
+        entries = {}
+        position = 0
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            for seq, (timestamp, offset, length) in sorted(self._entries.items()):
+                src.seek(offset)
+                dst.write(RECORD.pack(seq, timestamp, length))
+                dst.write(src.read(length))
+                entries[seq] = (timestamp, position + RECORD.size, length)
+                position += RECORD.size + length
+        os.replace(tmp_path, self.path)
+        self._entries = entries
+        self._size = position
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def has(self, frame):
+        entry = self._entries.get(frame.seq)
+        return entry is not None and _same_time(entry[0], frame.timestamp)
+
+    def add(self, frame, data):
+        """Store the thumbnail bytes of a catalog frame"""
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(RECORD.pack(frame.seq, frame.timestamp, len(data)))
+            self._file.write(data)
+            self._file.flush()
+            self._entries[frame.seq] = (frame.timestamp, self._size + RECORD.size, len(data))
+            self._size += RECORD.size + len(data)
+
+    def read(self, frame):
+        """The thumbnail JPEG bytes of a frame, or None if it has none yet"""
+        with self._lock:
+            entry = self._entries.get(frame.seq)
+            if entry is None or not _same_time(entry[0], frame.timestamp):
+                return None
+            with open(self.path, "rb") as f:
+                f.seek(entry[1])
+                return f.read(entry[2])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ThumbnailWorker:
+    """Background thread that makes the thumbnails a store is missing.
+
+    fill(frames) queues frames in the background, request(frames) puts them at
+    the front of the queue (for what the browser is showing right now).
+    on_ready(frame) is called from the worker thread for every new thumbnail.
+    """
+
+    def __init__(self, catalog, store, on_ready=None):
+        self.catalog = catalog
+        self.store = store
+        self.on_ready = on_ready or (lambda frame: None)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="Thumbnails", daemon=True)
+        self._thread.start()
+
+    def fill(self, frames):
+        with self._cond:
+            self._queue.extend(frame for frame in frames if not self.store.has(frame))
+            self._cond.notify()
+
+    def request(self, frames):
+        with self._cond:
+            self._queue.extendleft(reversed([frame for frame in frames if not self.store.has(frame)]))
+            self._cond.notify()
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                frame = self._queue.popleft()
+            if self.store.has(frame):
+                continue
+            try:
+                image = decode_reduced(self.catalog.read_bytes(frame), frame.width, frame.height)
+            except (OSError, KeyError):
+                continue  # Deleted while it was queued
+            data = make_thumbnail(image) if image is not None else None
+            if data is not None:
+                self.store.add(frame, data)
+                self.on_ready(frame)
+
+
+class ThumbnailCache:
+    """LRU cache of decoded thumbnails (RGB arrays), keyed by frame sequence number"""
+
+    def __init__(self, store, capacity=2000):
+        self.store = store
+        self.capacity = capacity
+        self._images = OrderedDict()
+
+    def get(self, frame):
+        """The decoded thumbnail, or None if the frame has no thumbnail yet"""
+        key = (frame.seq, frame.timestamp)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            return image
+        data = self.store.read(frame)
+        if data is None:
+            return None
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        self._images[key] = image
+        if len(self._images) > self.capacity:
+            self._images.popitem(last=False)
+        return image
+
+    def clear(self):
+        self._images.clear()
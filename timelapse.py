@@ -1,142 +1,274 @@
 import sys
 import os
-import time
+import bisect
+import multiprocessing
 import cv2
-import numpy as np
 from datetime import datetime
 import shutil
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                             QHBoxLayout, QLabel, QSpinBox, QWidget, QFileDialog,
                             QProgressBar, QMessageBox, QLineEdit, QComboBox, 
-                            QSlider, QGroupBox, QCheckBox, QFormLayout)
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QThread
+                            QSlider, QGroupBox, QCheckBox, QFormLayout, QProgressDialog,
+                            QDoubleSpinBox, QDialog, QDialogButtonBox)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QThread, QEvent
 from PyQt5.QtGui import QPixmap, QImage
 
+from activity import ActivityIndex
+from cameras import camera_dir, list_camera_dirs, probe_cameras
+from capture_engine import CaptureEngine
+from capture_schedule import CaptureClock, MIN_INTERVAL, parse_schedule
+from frame_catalog import open_store
+from frame_pack import FramePackStore
+from metrics import Metrics, MetricsLogger, MetricsServer
+from overlay import DEFAULT_TIME_FORMAT, TextOverlay
+from preview_server import PreviewServer
+from retention import default_tiers, plan_thinning
+from thumbnails import ThumbnailStore, ThumbnailWorker, ThumbnailCache, decode_reduced
+from video_render import (RenderJob, GridRenderJob, HighlightRenderJob, ParallelRenderJob, PassthroughRenderJob,
+                          SampledRenderJob, RenderCancelled)
+from deflicker import DEFAULT_DEFLICKER_WINDOW
+from segment_recorder import SegmentConcatJob, segments_dir, list_segments, segments_size
+
 class CaptureThread(QThread):
-    update_frame = pyqtSignal(np.ndarray)
+    """Runs a CaptureEngine off the GUI thread and forwards its callbacks as signals"""
+    preview_ready = pyqtSignal()  # A new preview frame is waiting in the slot
     update_status = pyqtSignal(str)
-    update_storage = pyqtSignal(int, int)  # current_size, max_size
+    update_storage = pyqtSignal(float, int)  # current_size, max_size
     
-    def __init__(self, interval=60, output_dir="captures", compression=85, 
-                 max_storage_mb=1000, auto_cleanup=False, resolution=(0, 0)):
+    def __init__(self, **settings):
         super().__init__()
-        self.interval = interval  # Interval in seconds
-        self.active = False
-        self.output_dir = output_dir
-        self.compression = compression  # JPEG compression level (0-100)
-        self.max_storage_mb = max_storage_mb  # Maximum storage in MB
-        self.auto_cleanup = auto_cleanup  # Auto cleanup when storage limit reached
-        self.resolution = resolution  # Desired resolution (width, height)
-        
-        # Create output directory if it doesn't exist
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        self.engine = CaptureEngine(on_status=self.update_status.emit,
+                                    on_storage=self.update_storage.emit,
+                                    on_preview=self.preview_ready.emit,
+                                    **settings)
     
     def run(self):
-        self.active = True
-        self.camera = cv2.VideoCapture(0)
+        self.engine.run()
+    
+    def stop(self):
+        self.engine.stop()
+        self.wait()
+    
+    def take_preview(self):
+        return self.engine.take_preview()
+
+class CameraProbeThread(QThread):
+    """Looks for working cameras without blocking the GUI"""
+    found = pyqtSignal(list)  # [(index, width, height), ...]
+    
+    def run(self):
+        self.found.emit(probe_cameras())
+
+class RenderThread(QThread):
+    """Runs a RenderJob off the GUI thread"""
+    progress = pyqtSignal(int, int)  # done, total
+    status = pyqtSignal(str)
+    finished_render = pyqtSignal(bool, str)  # success, error message
+    
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+    
+    def run(self):
+        try:
+            self.job.run(progress=self.progress.emit, status=self.status.emit)
+            self.finished_render.emit(True, "")
+        except RenderCancelled:
+            self.finished_render.emit(False, "Dibatalkan")
+        except Exception as e:
+            import traceback
+            self.status.emit(traceback.format_exc())
+            self.finished_render.emit(False, str(e))
+
+class FrameBrowser(QDialog):
+    """Scrub through the captures using thumbnails and pick the range to render"""
+    thumbnail_ready = pyqtSignal(int)  # seq of a frame whose thumbnail was just made
+    
+    STRIP_SIZE = 7  # Thumbnails in the filmstrip around the current frame
+    
+    def __init__(self, catalog, thumbnails, render_range=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Jelajahi Frame")
+        self.setMinimumSize(800, 560)
+        self.catalog = catalog
+        self.frames = catalog.frames()
+        self.cache = ThumbnailCache(thumbnails)
+        # Missing thumbnails are made in the background, the frames on screen first
+        self.worker = ThumbnailWorker(catalog, thumbnails,
+                                      on_ready=lambda frame: self.thumbnail_ready.emit(frame.seq))
+        self.worker.fill(self.frames)
+        self.thumbnail_ready.connect(self.on_thumbnail_ready)
         
-        if not self.camera.isOpened():
-            self.update_status.emit("Gagal membuka kamera!")
-            return
+        self.start_index = 0
+        self.end_index = len(self.frames) - 1
+        if render_range is not None:
+            times = [frame.timestamp for frame in self.frames]
+            self.start_index = min(bisect.bisect_left(times, render_range[0]), self.end_index)
+            self.end_index = max(bisect.bisect_right(times, render_range[1]) - 1, self.start_index)
         
-        capture_count = 0
-        last_capture_time = 0
-        last_storage_check = 0
+        layout = QVBoxLayout()
         
-        while self.active:
-            ret, frame = self.camera.read()
-            if not ret:
-                self.update_status.emit("Gagal mengambil frame dari kamera!")
-                break
-                
-            # Flip horizontally for selfie-view
-            frame = cv2.flip(frame, 1)
-            
-            # Resize if resolution is specified
-            if self.resolution != (0, 0) and self.resolution[0] > 0 and self.resolution[1] > 0:
-                frame = cv2.resize(frame, self.resolution, interpolation=cv2.INTER_AREA)
-            
-            # Update the displayed frame
-            self.update_frame.emit(frame)
-            
-            # Check if it's time to capture a frame
-            current_time = time.time()
-            if current_time - last_capture_time >= self.interval:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = os.path.join(self.output_dir, f"capture_{timestamp}.jpg")
-                
-                # Save with compression
-                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.compression]
-                cv2.imwrite(filename, frame, encode_param)
-                
-                capture_count += 1
-                last_capture_time = current_time
-                self.update_status.emit(f"Capture #{capture_count} tersimpan: {filename}")
-                
-                # Check storage usage every 5 captures or if auto cleanup is enabled
-                if capture_count % 5 == 0 or self.auto_cleanup:
-                    current_storage = self.get_directory_size_mb(self.output_dir)
-                    self.update_storage.emit(current_storage, self.max_storage_mb)
-                    
-                    # If storage exceeds limit and auto cleanup is enabled, remove oldest files
-                    if self.auto_cleanup and current_storage > self.max_storage_mb:
-                        self.cleanup_old_files(current_storage - self.max_storage_mb * 0.8)  # Clean until 80% usage
-            
-            # Sleep a bit to reduce CPU usage
-            time.sleep(0.03)
+        self.image_label = QLabel()
+        self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label.setMinimumSize(640, 360)
+        self.image_label.setStyleSheet("background-color: black; color: white;")
+        layout.addWidget(self.image_label, 1)
+        
+        self.info_label = QLabel()
+        self.info_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.info_label)
+        
+        strip_layout = QHBoxLayout()
+        self.strip_labels = []
+        for i in range(self.STRIP_SIZE):
+            label = QLabel()
+            label.setAlignment(Qt.AlignCenter)
+            label.setFixedSize(104, 60)
+            strip_layout.addWidget(label)
+            self.strip_labels.append(label)
+        layout.addLayout(strip_layout)
+        
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, len(self.frames) - 1)
+        self.slider.valueChanged.connect(self.show_index)
+        layout.addWidget(self.slider)
         
-        # Release the camera when done
-        self.camera.release()
+        range_layout = QHBoxLayout()
+        mark_start_btn = QPushButton("Tandai Awal")
+        mark_start_btn.clicked.connect(self.mark_start)
+        mark_end_btn = QPushButton("Tandai Akhir")
+        mark_end_btn.clicked.connect(self.mark_end)
+        all_btn = QPushButton("Semua Frame")
+        all_btn.clicked.connect(self.select_all)
+        self.range_label = QLabel()
+        range_layout.addWidget(mark_start_btn)
+        range_layout.addWidget(mark_end_btn)
+        range_layout.addWidget(all_btn)
+        range_layout.addWidget(self.range_label, 1)
+        layout.addLayout(range_layout)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+        
+        # The full frame is only decoded once scrubbing pauses
+        self.full_frame_timer = QTimer()
+        self.full_frame_timer.setSingleShot(True)
+        self.full_frame_timer.setInterval(250)
+        self.full_frame_timer.timeout.connect(self.show_full_frame)
+        
+        self.update_range_label()
+        self.slider.setValue(self.end_index)
+        self.show_index(self.slider.value())
     
-    def stop(self):
-        self.active = False
-        self.wait()
+    def show_index(self, index):
+        if not self.frames:
+            return
+        frame = self.frames[index]
+        time_text = datetime.fromtimestamp(frame.timestamp).strftime("%d-%m-%Y %H:%M:%S")
+        self.info_label.setText(f"Frame {index + 1}/{len(self.frames)} - {time_text}")
+        
+        first = max(0, min(index - self.STRIP_SIZE // 2, len(self.frames) - self.STRIP_SIZE))
+        visible = self.frames[first:first + self.STRIP_SIZE]
+        self.worker.request(visible)
+        self.strip_first = first
+        for i, label in enumerate(self.strip_labels):
+            if i < len(visible):
+                self.set_image(label, self.cache.get(visible[i]))
+                selected = first + i == index
+                label.setStyleSheet("border: 2px solid orange;" if selected else "")
+            else:
+                label.clear()
+        self.set_image(self.image_label, self.cache.get(frame))
+        self.full_frame_timer.start()
     
-    def get_directory_size_mb(self, directory):
-        """Get directory size in MB"""
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(directory):
-            for f in filenames:
-                if f.endswith('.jpg'):
-                    fp = os.path.join(dirpath, f)
-                    total_size += os.path.getsize(fp)
-        return total_size / (1024 * 1024)  # Convert to MB
-    
-    def cleanup_old_files(self, size_to_remove_mb):
-        """Remove oldest JPG files until specified amount of space is freed"""
-        self.update_status.emit(f"Membersihkan file lama untuk menghemat ruang...")
-        files = []
-        for f in os.listdir(self.output_dir):
-            if f.endswith('.jpg'):
-                path = os.path.join(self.output_dir, f)
-                files.append((path, os.path.getctime(path)))
-        
-        # Sort files by creation time
-        files.sort(key=lambda x: x[1])
-        
-        # Delete oldest files until we've freed enough space
-        size_removed = 0
-        files_removed = 0
-        for file_path, _ in files:
-            if size_removed >= size_to_remove_mb * 1024 * 1024:
-                break
-                
-            file_size = os.path.getsize(file_path)
-            os.remove(file_path)
-            size_removed += file_size
-            files_removed += 1
-            
-        self.update_status.emit(f"Pembersihan selesai: {files_removed} file dihapus ({size_removed/(1024*1024):.1f} MB)")
+    def set_image(self, label, image):
+        if image is None:
+            label.setText("...")
+            return
+        h, w, c = image.shape
+        q_image = QImage(image.data, w, h, image.strides[0], QImage.Format_RGB888)
+        label.setPixmap(QPixmap.fromImage(q_image).scaled(label.width(), label.height(),
+                                                          Qt.KeepAspectRatio, Qt.SmoothTransformation))
+    
+    def show_full_frame(self):
+        """Replace the upscaled thumbnail with the real frame, decoded at a reduced scale"""
+        frame = self.frames[self.slider.value()]
+        try:
+            data = self.catalog.read_bytes(frame)
+        except (OSError, KeyError):
+            return
+        size = (self.image_label.width(), self.image_label.height())
+        image = decode_reduced(data, frame.width, frame.height, size=size)
+        if image is not None:
+            self.set_image(self.image_label, cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    
+    def on_thumbnail_ready(self, seq):
+        first = getattr(self, "strip_first", 0)
+        if any(frame.seq == seq for frame in self.frames[first:first + self.STRIP_SIZE]):
+            self.show_index(self.slider.value())
+    
+    def mark_start(self):
+        self.start_index = self.slider.value()
+        self.end_index = max(self.end_index, self.start_index)
+        self.update_range_label()
+    
+    def mark_end(self):
+        self.end_index = self.slider.value()
+        self.start_index = min(self.start_index, self.end_index)
+        self.update_range_label()
+    
+    def select_all(self):
+        self.start_index = 0
+        self.end_index = len(self.frames) - 1
+        self.update_range_label()
+    
+    def update_range_label(self):
+        if not self.frames:
+            self.range_label.setText("Tidak ada gambar")
+            return
+        start = datetime.fromtimestamp(self.frames[self.start_index].timestamp)
+        end = datetime.fromtimestamp(self.frames[self.end_index].timestamp)
+        self.range_label.setText(f"Rentang video: {start:%d-%m-%Y %H:%M} - {end:%d-%m-%Y %H:%M} "
+                                 f"({self.end_index - self.start_index + 1} frame)")
+    
+    def selected_range(self):
+        """(start, end) capture times to render, or None for every frame"""
+        if self.start_index == 0 and self.end_index == len(self.frames) - 1:
+            return None
+        return self.frames[self.start_index].timestamp, self.frames[self.end_index].timestamp
+    
+    def done(self, result):
+        self.full_frame_timer.stop()
+        self.worker.close()
+        super().done(result)
 
 class TimelapseApp(QMainWindow):
+    # Stages shown in the statistics panel
+    STATS_ROWS = (("camera_read", "Baca kamera"), ("encode", "Encode JPG"), ("write", "Tulis file"),
+                  ("queue_wait", "Antrian tulis"), ("preview_latency", "Latensi preview"),
+                  ("capture_jitter", "Jitter capture"), ("render_decode", "Decode render"))
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Work Timelapse Recorder")
         self.setMinimumSize(800, 600)
         
-        self.capture_thread = None
+        self.capture_thread = None  # The camera shown in the preview
+        self.capture_threads = []  # Every running camera, capture_thread first
+        self.camera_usage = {}  # Camera index -> storage used, while several cameras record
+        self.render_thread = None
         self.output_dir = "captures"
+        self.catalog = open_store(self.output_dir)
+        self.thumbnails = ThumbnailStore(self.output_dir).load(self.catalog.frames())
+        self.activity = ActivityIndex(self.output_dir).load(self.catalog.frames())
+        self.render_range = None  # (start, end) capture times picked in the frame browser
+        self.metrics = Metrics()  # Stage timings of the current recording and renders
+        self.metrics_logger = None
+        self.metrics_server = None
+        self.preview_server = None  # MJPEG stream of the live preview for remote viewers
         
         # Default settings
         self.compression = 85
@@ -205,10 +337,66 @@ class TimelapseApp(QMainWindow):
         storage_limit_layout.addWidget(self.storage_limit_input)
         storage_layout.addRow(storage_limit_layout)
         
-        # Auto cleanup checkbox
-        self.auto_cleanup_check = QCheckBox("Otomatis hapus file lama saat penuh")
+        # Auto cleanup checkbox, old captures are thinned out rather than deleted outright
+        cleanup_layout = QHBoxLayout()
+        self.auto_cleanup_check = QCheckBox("Otomatis tipiskan file lama saat penuh")
         self.auto_cleanup_check.setChecked(self.auto_cleanup)
-        storage_layout.addRow(self.auto_cleanup_check)
+        self.keep_all_input = QSpinBox()
+        self.keep_all_input.setRange(1, 168)
+        self.keep_all_input.setValue(24)
+        self.keep_all_input.setPrefix("semua frame ")
+        self.keep_all_input.setSuffix(" jam terakhir")
+        self.keep_all_input.setToolTip("Frame yang lebih lama disisakan satu per 10 menit, per jam, lalu per 6 jam")
+        cleanup_layout.addWidget(self.auto_cleanup_check)
+        cleanup_layout.addWidget(self.keep_all_input)
+        storage_layout.addRow(cleanup_layout)
+        
+        # Archiving, old captures are re-encoded smaller in the background
+        archive_layout = QHBoxLayout()
+        self.archive_check = QCheckBox("Kecilkan gambar lama:")
+        self.archive_check.setToolTip("Gambar yang lebih tua diubah ke format lebih hemat di latar belakang, "
+                                      "tanpa mengganggu capture (hanya folder JPG)")
+        self.archive_after_input = QSpinBox()
+        self.archive_after_input.setRange(1, 24 * 365)
+        self.archive_after_input.setValue(24 * 7)
+        self.archive_after_input.setPrefix("setelah ")
+        self.archive_after_input.setSuffix(" jam")
+        self.archive_format_select = QComboBox()
+        self.archive_format_select.addItem("WebP", "webp")
+        self.archive_format_select.addItem("JPG 640x360", "jpg")
+        archive_layout.addWidget(self.archive_check)
+        archive_layout.addWidget(self.archive_after_input)
+        archive_layout.addWidget(self.archive_format_select)
+        storage_layout.addRow(archive_layout)
+        
+        # Change detection
+        change_layout = QHBoxLayout()
+        self.skip_static_check = QCheckBox("Lewati frame tanpa perubahan")
+        self.change_threshold_input = QDoubleSpinBox()
+        self.change_threshold_input.setRange(0.5, 50.0)
+        self.change_threshold_input.setSingleStep(0.5)
+        self.change_threshold_input.setValue(3.0)
+        self.change_threshold_input.setToolTip("Perbedaan rata-rata tingkat abu-abu minimum agar frame disimpan")
+        self.keepalive_input = QSpinBox()
+        self.keepalive_input.setRange(1, 120)
+        self.keepalive_input.setValue(5)
+        self.keepalive_input.setPrefix("min. tiap ")
+        self.keepalive_input.setSuffix(" menit")
+        change_layout.addWidget(self.skip_static_check)
+        change_layout.addWidget(self.change_threshold_input)
+        change_layout.addWidget(self.keepalive_input)
+        storage_layout.addRow(change_layout)
+        
+        # Frame stacking, each capture is the average of the last camera frames before it
+        self.stack_input = QSpinBox()
+        self.stack_input.setRange(1, 32)
+        self.stack_input.setValue(1)
+        self.stack_input.setSpecialValueText("Tanpa penumpukan")
+        self.stack_input.setPrefix("Rata-rata ")
+        self.stack_input.setSuffix(" frame per capture")
+        self.stack_input.setToolTip("Mengurangi noise saat gelap dan memperkecil file JPG; "
+                                    "benda yang bergerak jadi sedikit kabur")
+        storage_layout.addRow("Penumpukan:", self.stack_input)
         
         # Resolution options
         resolution_layout = QHBoxLayout()
@@ -232,14 +420,37 @@ class TimelapseApp(QMainWindow):
         self.clean_storage_btn.clicked.connect(self.cleanup_storage)
         storage_layout.addRow(self.clean_storage_btn)
         
+        # Incremental video segments
+        segment_layout = QHBoxLayout()
+        self.segment_check = QCheckBox("Rekam segmen video (ekspor cepat)")
+        self.segment_minutes_input = QSpinBox()
+        self.segment_minutes_input.setRange(5, 1440)
+        self.segment_minutes_input.setValue(60)
+        self.segment_minutes_input.setSingleStep(15)
+        self.segment_minutes_input.setSuffix(" menit")
+        segment_layout.addWidget(self.segment_check)
+        segment_layout.addWidget(self.segment_minutes_input)
+        storage_layout.addRow(segment_layout)
+        
+        self.delete_after_seal_check = QCheckBox("Hapus JPG setelah segmen selesai")
+        storage_layout.addRow(self.delete_after_seal_check)
+        
+        # Frame packs instead of one JPG file per capture
+        self.pack_check = QCheckBox("Simpan dalam file pack (hemat inode)")
+        self.pack_check.setChecked(isinstance(self.catalog, FramePackStore))
+        self.pack_check.setToolTip("Gambar digabung ke beberapa file besar; gunakan \"Lihat Gambar\" untuk ekspor JPG")
+        self.pack_check.toggled.connect(self.switch_frame_store)
+        storage_layout.addRow(self.pack_check)
+        
         storage_group.setLayout(storage_layout)
         left_controls.addWidget(storage_group)
         
         # Interval selection
         interval_layout = QHBoxLayout()
         interval_label = QLabel("Interval Capture (detik):")
-        self.interval_input = QSpinBox()
-        self.interval_input.setRange(5, 3600)
+        self.interval_input = QDoubleSpinBox()
+        self.interval_input.setDecimals(2)
+        self.interval_input.setRange(MIN_INTERVAL, 3600)
         self.interval_input.setValue(60)
         self.interval_input.setSingleStep(5)
         
@@ -247,11 +458,70 @@ class TimelapseApp(QMainWindow):
         interval_layout.addWidget(self.interval_input)
         left_controls.addLayout(interval_layout)
         
+        # Different intervals by time of day, the interval above applies outside the rules
+        schedule_layout = QHBoxLayout()
+        self.schedule_check = QCheckBox("Jadwal:")
+        self.schedule_input = QLineEdit()
+        self.schedule_input.setPlaceholderText("sen-jum 08:00-17:00=10; 300")
+        self.schedule_input.setToolTip("Aturan dipisah titik koma: [hari] JAM-JAM=detik. "
+                                       "Angka saja mengganti interval di luar aturan.")
+        schedule_layout.addWidget(self.schedule_check)
+        schedule_layout.addWidget(self.schedule_input)
+        left_controls.addLayout(schedule_layout)
+        
+        # Preview rate, can be changed while recording
+        preview_layout = QHBoxLayout()
+        self.preview_fps_input = QSpinBox()
+        self.preview_fps_input.setRange(0, 30)
+        self.preview_fps_input.setValue(10)
+        self.preview_fps_input.setSpecialValueText("Mati")
+        self.preview_fps_input.setSuffix(" FPS")
+        self.preview_fps_input.valueChanged.connect(self.update_preview_settings)
+        
+        self.pause_preview_btn = QPushButton("Jeda Preview")
+        self.pause_preview_btn.setCheckable(True)
+        self.pause_preview_btn.toggled.connect(self.update_preview_settings)
+        
+        preview_layout.addWidget(QLabel("Preview:"))
+        preview_layout.addWidget(self.preview_fps_input)
+        preview_layout.addWidget(self.pause_preview_btn)
+        
+        # The preview streamed over HTTP, encoded once for every viewer
+        self.stream_port_input = QSpinBox()
+        self.stream_port_input.setRange(0, 65535)
+        self.stream_port_input.setValue(0)
+        self.stream_port_input.setSpecialValueText("Siaran mati")
+        self.stream_port_input.setPrefix("Port siaran: ")
+        self.stream_port_input.setToolTip("Pratinjau langsung (MJPEG) di http://127.0.0.1:PORT/, "
+                                          "bisa dibuka di browser atau VLC")
+        preview_layout.addWidget(self.stream_port_input)
+        left_controls.addLayout(preview_layout)
+        
+        # Low power: the camera scales frames itself and only saved/previewed frames are decoded
+        self.low_power_check = QCheckBox("Mode hemat daya (laptop dengan baterai)")
+        self.low_power_check.setToolTip("Resolusi diatur langsung di kamera dan frame hanya "
+                                        "di-decode saat disimpan atau ditampilkan")
+        left_controls.addWidget(self.low_power_check)
+        
+        # Camera read in its own process, its frame ring gives "capture now" a pre-roll
+        process_layout = QHBoxLayout()
+        self.process_capture_check = QCheckBox("Kamera di proses terpisah (pre-roll)")
+        self.process_capture_check.setToolTip("Frame dibaca proses lain lewat shared memory, "
+                                              "beberapa detik terakhir tetap tersedia untuk burst")
+        self.preroll_input = QDoubleSpinBox()
+        self.preroll_input.setRange(0.5, 30)
+        self.preroll_input.setValue(3)
+        self.preroll_input.setSuffix(" detik")
+        process_layout.addWidget(self.process_capture_check)
+        process_layout.addWidget(self.preroll_input)
+        left_controls.addLayout(process_layout)
+        
         # Camera selection
         camera_layout = QHBoxLayout()
         camera_label = QLabel("Kamera:")
         self.camera_select = QComboBox()
-        self.camera_select.addItem("Default Camera")
+        self.camera_select.addItem("Default Camera", 0)
+        self.camera_select.setToolTip("Mencari kamera...")
         
         camera_layout.addWidget(camera_label)
         camera_layout.addWidget(self.camera_select)
@@ -270,9 +540,21 @@ class TimelapseApp(QMainWindow):
         self.stop_btn.clicked.connect(self.stop_timelapse)
         self.stop_btn.setEnabled(False)
         
+        self.capture_now_btn = QPushButton("Ambil Sekarang")
+        self.capture_now_btn.clicked.connect(self.capture_now)
+        self.capture_now_btn.setEnabled(False)
+        
+        self.burst_btn = QPushButton("Burst")
+        self.burst_btn.setToolTip("Simpan semua frame dari pre-roll sebelum sampai sesudah tombol ditekan")
+        self.burst_btn.clicked.connect(self.capture_burst)
+        self.burst_btn.setEnabled(False)
+        
         self.view_images_btn = QPushButton("Lihat Gambar")
         self.view_images_btn.clicked.connect(self.view_captured_images)
         
+        self.browse_frames_btn = QPushButton("Jelajahi Frame")
+        self.browse_frames_btn.clicked.connect(self.open_frame_browser)
+        
         self.generate_video_btn = QPushButton("Buat Video")
         self.generate_video_btn.clicked.connect(self.generate_video)
         
@@ -281,9 +563,74 @@ class TimelapseApp(QMainWindow):
         
         right_controls.addWidget(self.start_btn)
         right_controls.addWidget(self.stop_btn)
+        right_controls.addWidget(self.capture_now_btn)
+        right_controls.addWidget(self.burst_btn)
         right_controls.addWidget(self.view_images_btn)
+        right_controls.addWidget(self.browse_frames_btn)
         right_controls.addWidget(self.generate_video_btn)
         right_controls.addWidget(self.cleanup_after_video_btn)
+        
+        self.render_range_label = QLabel("Rentang video: semua frame")
+        self.render_range_label.setWordWrap(True)
+        right_controls.addWidget(self.render_range_label)
+        
+        # Video length: every frame, or a summary sampled evenly over the recording
+        video_group = QGroupBox("Pengaturan Video")
+        video_layout = QFormLayout()
+        self.video_fps_input = QSpinBox()
+        self.video_fps_input.setRange(1, 60)
+        self.video_fps_input.setValue(10)
+        self.video_fps_input.setSuffix(" FPS")
+        video_layout.addRow("Kecepatan:", self.video_fps_input)
+        self.video_duration_input = QSpinBox()
+        self.video_duration_input.setRange(0, 3600)
+        self.video_duration_input.setValue(0)
+        self.video_duration_input.setSpecialValueText("Semua frame")
+        self.video_duration_input.setSuffix(" detik")
+        self.video_duration_input.setToolTip("Frame dipilih merata sepanjang waktu rekaman, "
+                                             "hanya frame terpilih yang dibaca")
+        video_layout.addRow("Durasi:", self.video_duration_input)
+        self.video_blend_input = QSpinBox()
+        self.video_blend_input.setRange(1, 16)
+        self.video_blend_input.setValue(1)
+        self.video_blend_input.setSpecialValueText("Tidak")
+        self.video_blend_input.setSuffix(" frame")
+        self.video_blend_input.setToolTip("Campur beberapa frame per frame video agar ringkasan lebih halus")
+        video_layout.addRow("Campur:", self.video_blend_input)
+        self.video_deflicker_check = QCheckBox("Kurangi kedip (deflicker)")
+        self.video_deflicker_check.setToolTip("Ratakan lompatan kecerahan akibat auto-exposure webcam")
+        video_layout.addRow(self.video_deflicker_check)
+        self.video_highlight_check = QCheckBox("Sorotan: hanya bagian paling ramai")
+        self.video_highlight_check.setToolTip("Pilih rentang dengan gerakan terbanyak sampai durasi video terpenuhi")
+        video_layout.addRow(self.video_highlight_check)
+        self.video_timestamp_check = QCheckBox("Tampilkan waktu capture")
+        self.video_timestamp_check.setToolTip("Tanggal dan jam tiap gambar ditulis di pojok kiri bawah video")
+        video_layout.addRow(self.video_timestamp_check)
+        self.video_label_input = QLineEdit()
+        self.video_label_input.setPlaceholderText("Teks tambahan, misalnya nama lokasi")
+        self.video_label_input.setToolTip("Ditulis di samping waktu capture (huruf ASCII)")
+        video_layout.addRow("Label:", self.video_label_input)
+        video_group.setLayout(video_layout)
+        right_controls.addWidget(video_group)
+        
+        # Live stage timings, optionally logged to a file or served over HTTP
+        stats_group = QGroupBox("Statistik")
+        stats_layout = QVBoxLayout()
+        self.stats_label = QLabel("Belum ada data")
+        self.stats_label.setStyleSheet("font-family: monospace;")
+        stats_layout.addWidget(self.stats_label)
+        self.metrics_log_check = QCheckBox("Catat metrik ke metrics.jsonl")
+        self.metrics_log_check.setToolTip("Ringkasan metrik ditulis tiap menit ke folder output")
+        stats_layout.addWidget(self.metrics_log_check)
+        self.metrics_port_input = QSpinBox()
+        self.metrics_port_input.setRange(0, 65535)
+        self.metrics_port_input.setValue(0)
+        self.metrics_port_input.setSpecialValueText("Mati")
+        self.metrics_port_input.setPrefix("Port metrik: ")
+        self.metrics_port_input.setToolTip("Sajikan metrik Prometheus di http://127.0.0.1:PORT/metrics")
+        stats_layout.addWidget(self.metrics_port_input)
+        stats_group.setLayout(stats_layout)
+        right_controls.addWidget(stats_group)
         right_controls.setAlignment(Qt.AlignTop)
         
         controls_layout.addLayout(right_controls)
@@ -299,10 +646,19 @@ class TimelapseApp(QMainWindow):
         # Update initial storage usage
         self.update_storage_display()
         
+        # Fill the camera list in the background, probing dead indices can take a while
+        self.camera_probe = CameraProbeThread()
+        self.camera_probe.found.connect(self.populate_cameras)
+        self.camera_probe.start()
+        
         # Setup timer for regular UI updates
         self.update_timer = QTimer()
         self.update_timer.timeout.connect(self.update_storage_display)
         self.update_timer.start(10000)  # Update every 10 seconds
+        
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
     
     def update_compression_label(self):
         self.compression = self.compress_slider.value()
@@ -311,7 +667,7 @@ class TimelapseApp(QMainWindow):
     def update_storage_display(self):
         """Update storage usage display"""
         if os.path.exists(self.output_dir):
-            current_size = self.get_directory_size_mb(self.output_dir)
+            current_size = self.catalog.total_mb() + segments_size(segments_dir(self.output_dir)) / (1024 * 1024)
             max_size = self.storage_limit_input.value()
             
             usage_percent = min(int(current_size / max_size * 100), 100)
@@ -327,47 +683,26 @@ class TimelapseApp(QMainWindow):
                 
             self.status_label.setText(f"Penggunaan storage: {current_size:.1f} MB / {max_size} MB ({usage_percent}%)")
     
-    def get_directory_size_mb(self, directory):
-        """Get directory size in MB"""
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(directory):
-            for f in filenames:
-                if f.endswith('.jpg'):
-                    fp = os.path.join(dirpath, f)
-                    total_size += os.path.getsize(fp)
-        return total_size / (1024 * 1024)  # Convert to MB
-    
     def cleanup_storage(self):
         """Manually clean up oldest files to save space"""
-        if not os.path.exists(self.output_dir) or not os.listdir(self.output_dir):
+        if not os.path.exists(self.output_dir) or len(self.catalog) == 0:
             QMessageBox.information(self, "Info", "Tidak ada file untuk dibersihkan.")
             return
             
         reply = QMessageBox.question(self, "Konfirmasi", 
-                                    "Ini akan menghapus 50% file terlama dari folder. Lanjutkan?",
+                                    "Ini akan mengosongkan 50% ruang dengan menipiskan file lama "
+                                    "(rentang waktu tetap utuh). Lanjutkan?",
                                     QMessageBox.Yes | QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            # Get all JPG files and sort by creation time
-            files = []
-            for f in os.listdir(self.output_dir):
-                if f.endswith('.jpg'):
-                    path = os.path.join(self.output_dir, f)
-                    files.append((path, os.path.getctime(path)))
-            
-            files.sort(key=lambda x: x[1])
-            
-            # Delete oldest 50% of files
-            files_to_delete = files[:len(files)//2]
-            bytes_removed = 0
-            
-            for file_path, _ in files_to_delete:
-                bytes_removed += os.path.getsize(file_path)
-                os.remove(file_path)
+            # Free half the space by thinning, oldest captures become sparser instead of disappearing
+            frames = plan_thinning(self.catalog.frames(), self.catalog.total_bytes // 2,
+                                   default_tiers(self.keep_all_input.value()))
+            files_deleted, bytes_removed = self.catalog.remove(frames)
             
             mb_removed = bytes_removed / (1024 * 1024)
             QMessageBox.information(self, "Pembersihan Selesai", 
-                                   f"Dihapus {len(files_to_delete)} file ({mb_removed:.1f} MB)")
+                                   f"Dihapus {files_deleted} file ({mb_removed:.1f} MB)")
             
             self.update_storage_display()
     
@@ -376,74 +711,306 @@ class TimelapseApp(QMainWindow):
         if dir_path:
             self.output_dir = dir_path
             self.dir_input.setText(self.output_dir)
+            self.open_catalog()
+            # Follow whatever the folder already holds
+            self.pack_check.blockSignals(True)
+            self.pack_check.setChecked(isinstance(self.catalog, FramePackStore))
+            self.pack_check.blockSignals(False)
             self.update_storage_display()
     
+    def open_catalog(self, packed=None):
+        """(Re)open the frame store, thumbnails and activity scores of the output folder"""
+        self.catalog.close()
+        self.thumbnails.close()
+        self.activity.close()
+        self.catalog = open_store(self.output_dir, packed=packed)
+        self.thumbnails = ThumbnailStore(self.output_dir).load(self.catalog.frames())
+        self.activity = ActivityIndex(self.output_dir).load(self.catalog.frames())
+        self.set_render_range(None)
+    
+    def switch_frame_store(self, packed):
+        """Reopen the output folder with the selected storage backend"""
+        self.open_catalog(packed=packed)
+        if packed:
+            self.update_status("Gambar baru disimpan dalam file pack")
+        else:
+            self.update_status("Gambar baru disimpan sebagai file JPG")
+        self.update_storage_display()
+    
     def start_timelapse(self):
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
             
         interval = self.interval_input.value()
+        schedule = None
+        if self.schedule_check.isChecked() and self.schedule_input.text().strip():
+            try:
+                schedule = parse_schedule(self.schedule_input.text(), interval)
+            except ValueError as e:
+                QMessageBox.warning(self, "Peringatan", str(e))
+                return
         self.compression = self.compress_slider.value()
         self.max_storage_mb = self.storage_limit_input.value()
         self.auto_cleanup = self.auto_cleanup_check.isChecked()
         self.resolution = self.resolution_select.currentData()
         
-        self.capture_thread = CaptureThread(
+        # Fresh statistics for every recording
+        self.metrics = Metrics()
+        settings = dict(
+            metrics=self.metrics,
             interval=interval, 
-            output_dir=self.output_dir,
+            schedule=schedule,
             compression=self.compression,
-            max_storage_mb=self.max_storage_mb,
             auto_cleanup=self.auto_cleanup,
-            resolution=self.resolution
+            resolution=self.resolution,
+            preview_size=(self.camera_view.width(), self.camera_view.height()),
+            segment_seconds=self.segment_minutes_input.value() * 60 if self.segment_check.isChecked() else 0,
+            delete_after_seal=self.segment_check.isChecked() and self.delete_after_seal_check.isChecked(),
+            change_threshold=self.change_threshold_input.value() if self.skip_static_check.isChecked() else 0,
+            keepalive_seconds=self.keepalive_input.value() * 60,
+            stack_frames=self.stack_input.value(),
+            keep_all_hours=self.keep_all_input.value(),
+            low_power=self.low_power_check.isChecked(),
+            process_capture=self.process_capture_check.isChecked(),
+            preroll_seconds=self.preroll_input.value(),
+            archive_after_hours=self.archive_after_input.value() if self.archive_check.isChecked() else 0,
+            archive_format=self.archive_format_select.currentData(),
+            # JPG archives only pay off at a smaller size, WebP keeps the resolution
+            archive_resolution=(640, 360) if self.archive_format_select.currentData() == "jpg" else (0, 0)
         )
+        selected = self.camera_select.currentData()
+        cameras = selected if isinstance(selected, list) else [selected or 0]
+        self.start_preview_stream()
+        
+        if len(cameras) == 1:
+            self.capture_threads = [CaptureThread(
+                output_dir=self.output_dir,
+                max_storage_mb=self.max_storage_mb,
+                camera_index=cameras[0],
+                catalog=self.catalog,
+                thumbnails=self.thumbnails,
+                activity=self.activity,
+                preview_fps=self.preview_fps_input.value(),
+                stream=self.preview_server,
+                **settings
+            )]
+        else:
+            # Every camera gets its own subfolder and share of the storage limit, and a
+            # shared clock gives their captures identical timestamps for the grid video
+            clock = CaptureClock(interval, schedule, align=True)
+            self.capture_threads = [CaptureThread(
+                output_dir=camera_dir(self.output_dir, index),
+                max_storage_mb=self.max_storage_mb / len(cameras),
+                camera_index=index,
+                clock=clock,
+                preview_fps=self.preview_fps_input.value() if i == 0 else 0,
+                stream=self.preview_server if i == 0 else None,
+                **settings
+            ) for i, index in enumerate(cameras)]
+        self.capture_thread = self.capture_threads[0]
+        self.camera_usage = {}
+        self.update_preview_settings()
         
-        self.capture_thread.update_frame.connect(self.update_frame)
-        self.capture_thread.update_status.connect(self.update_status)
-        self.capture_thread.update_storage.connect(self.update_storage_info)
-        self.capture_thread.start()
+        self.capture_thread.preview_ready.connect(self.update_frame)
+        for index, thread in zip(cameras, self.capture_threads):
+            if len(cameras) == 1:
+                thread.update_status.connect(self.update_status)
+                thread.update_storage.connect(self.update_storage_info)
+            else:
+                thread.update_status.connect(
+                    lambda message, index=index: self.update_status(f"[kamera {index}] {message}"))
+                thread.update_storage.connect(
+                    lambda current, maximum, index=index: self.update_camera_storage(index, current))
+            thread.start()
+        self.start_metrics_export()
         
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
+        self.capture_now_btn.setEnabled(True)
+        self.burst_btn.setEnabled(True)
         self.interval_input.setEnabled(False)
+        self.schedule_check.setEnabled(False)
+        self.schedule_input.setEnabled(False)
         self.browse_btn.setEnabled(False)
         self.compress_slider.setEnabled(False)
         self.storage_limit_input.setEnabled(False)
         self.auto_cleanup_check.setEnabled(False)
+        self.keep_all_input.setEnabled(False)
         self.resolution_select.setEnabled(False)
+        self.camera_select.setEnabled(False)
+        self.segment_check.setEnabled(False)
+        self.segment_minutes_input.setEnabled(False)
+        self.delete_after_seal_check.setEnabled(False)
+        self.skip_static_check.setEnabled(False)
+        self.change_threshold_input.setEnabled(False)
+        self.keepalive_input.setEnabled(False)
+        self.stack_input.setEnabled(False)
+        self.pack_check.setEnabled(False)
+        self.low_power_check.setEnabled(False)
+        self.process_capture_check.setEnabled(False)
+        self.preroll_input.setEnabled(False)
+        self.archive_check.setEnabled(False)
+        self.archive_after_input.setEnabled(False)
+        self.archive_format_select.setEnabled(False)
+        self.metrics_log_check.setEnabled(False)
+        self.metrics_port_input.setEnabled(False)
+        self.stream_port_input.setEnabled(False)
         
         self.update_status("Timelapse dimulai")
     
     def stop_timelapse(self):
-        if self.capture_thread and self.capture_thread.isRunning():
-            self.capture_thread.stop()
+        for thread in self.capture_threads:
+            if thread.isRunning():
+                thread.stop()
+        self.stop_metrics_export()
+        self.stop_preview_stream()
             
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
+        self.capture_now_btn.setEnabled(False)
+        self.burst_btn.setEnabled(False)
         self.interval_input.setEnabled(True)
+        self.schedule_check.setEnabled(True)
+        self.schedule_input.setEnabled(True)
         self.browse_btn.setEnabled(True)
         self.compress_slider.setEnabled(True)
         self.storage_limit_input.setEnabled(True)
         self.auto_cleanup_check.setEnabled(True)
+        self.keep_all_input.setEnabled(True)
         self.resolution_select.setEnabled(True)
+        self.camera_select.setEnabled(True)
+        self.segment_check.setEnabled(True)
+        self.segment_minutes_input.setEnabled(True)
+        self.delete_after_seal_check.setEnabled(True)
+        self.skip_static_check.setEnabled(True)
+        self.change_threshold_input.setEnabled(True)
+        self.keepalive_input.setEnabled(True)
+        self.stack_input.setEnabled(True)
+        self.pack_check.setEnabled(True)
+        self.low_power_check.setEnabled(True)
+        self.process_capture_check.setEnabled(True)
+        self.preroll_input.setEnabled(True)
+        self.archive_check.setEnabled(True)
+        self.archive_after_input.setEnabled(True)
+        self.archive_format_select.setEnabled(True)
+        self.metrics_log_check.setEnabled(True)
+        self.metrics_port_input.setEnabled(True)
+        self.stream_port_input.setEnabled(True)
         
         self.update_status("Timelapse dihentikan")
         self.update_storage_display()
     
-    def update_frame(self, frame):
-        h, w, c = frame.shape
-        bytes_per_line = 3 * w
-        q_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-        pixmap = QPixmap.fromImage(q_image)
-        
-        # Scale pixmap to fit in the label while preserving aspect ratio
-        scaled_pixmap = pixmap.scaled(self.camera_view.width(), self.camera_view.height(), 
-                                    Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    def capture_now(self):
+        """Save the current frame of every camera right away"""
+        for thread in self.capture_threads:
+            thread.engine.capture_now()
+    
+    def capture_burst(self):
+        """Save every frame from the pre-roll before until as long after the press"""
+        seconds = self.preroll_input.value()
+        for thread in self.capture_threads:
+            thread.engine.capture_now(before=seconds, after=seconds)
+    
+    def update_frame(self):
+        """Show the latest preview frame, already downscaled and in RGB by the capture thread"""
+        if not self.capture_thread:
+            return
+        frame = self.capture_thread.take_preview()
+        if frame is None:
+            return
         
-        self.camera_view.setPixmap(scaled_pixmap)
+        h, w, c = frame.shape
+        q_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888)
+        self.camera_view.setPixmap(QPixmap.fromImage(q_image))
+    
+    def start_metrics_export(self):
+        if self.metrics_log_check.isChecked():
+            self.metrics_logger = MetricsLogger(self.metrics, os.path.join(self.output_dir, "metrics.jsonl"))
+        port = self.metrics_port_input.value()
+        if port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port)
+            except OSError as e:
+                QMessageBox.warning(self, "Peringatan", f"Gagal membuka port metrik {port}: {str(e)}")
+    
+    def stop_metrics_export(self):
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if self.metrics_logger is not None:
+            self.metrics_logger.close()
+            self.metrics_logger = None
+    
+    def start_preview_stream(self):
+        port = self.stream_port_input.value()
+        if not port:
+            return
+        try:
+            self.preview_server = PreviewServer(port, metrics=self.metrics)
+            self.update_status(f"Pratinjau langsung di http://127.0.0.1:{self.preview_server.port}/")
+        except OSError as e:
+            QMessageBox.warning(self, "Peringatan", f"Gagal membuka port siaran {port}: {str(e)}")
+    
+    def stop_preview_stream(self):
+        if self.preview_server is not None:
+            self.preview_server.close()
+            self.preview_server = None
+    
+    def update_stats(self):
+        """Show p50/p95 of the main stages and the capture counters"""
+        if not self.stats_label.isVisible():
+            return
+        snapshot = self.metrics.snapshot()
+        timers, counters = snapshot["timers"], snapshot["counters"]
+        lines = [f"{label:<16} {timers[stage]['p50_ms']:>7.1f} / {timers[stage]['p95_ms']:>7.1f} ms"
+                 for stage, label in self.STATS_ROWS if stage in timers]
+        if not lines:
+            return
+        lines.insert(0, f"{'':<16} {'p50':>7} / {'p95':>7}")
+        lines.append(f"Tersimpan {counters.get('captures_saved', 0)}, "
+                     f"terlewat {counters.get('captures_dropped', 0)}, "
+                     f"telat {counters.get('captures_late', 0)}")
+        self.stats_label.setText("\n".join(lines))
+    
+    def update_preview_settings(self):
+        """Push preview rate, size and pause state to the running capture thread"""
+        if not self.capture_thread:
+            return
+        engine = self.capture_thread.engine
+        engine.preview_fps = self.preview_fps_input.value()
+        engine.preview_size = (self.camera_view.width(), self.camera_view.height())
+        engine.preview_enabled = (not self.pause_preview_btn.isChecked()
+                                  and not self.isMinimized())
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_preview_settings()
+    
+    def changeEvent(self, event):
+        # Stop producing preview frames while the window is minimized
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_preview_settings()
     
     def update_status(self, message):
         self.status_label.setText(message)
     
+    def update_camera_storage(self, index, current_size):
+        """Storage reported by one of several cameras, the bar shows their total"""
+        self.camera_usage[index] = current_size
+        self.update_storage_info(sum(self.camera_usage.values()), self.max_storage_mb)
+    
+    def populate_cameras(self, cameras):
+        """Fill the camera list with the devices found by the probe"""
+        self.camera_select.setToolTip("")
+        if not cameras:
+            return  # Keep "Default Camera", the probe may simply have missed it
+        self.camera_select.clear()
+        for index, width, height in cameras:
+            self.camera_select.addItem(f"Kamera {index} ({width}x{height})", index)
+        if len(cameras) > 1:
+            self.camera_select.addItem(f"Semua kamera ({len(cameras)})", [index for index, _, _ in cameras])
+    
     def update_storage_info(self, current_size, max_size):
         """Update storage info from the capture thread"""
         usage_percent = min(int(current_size / max_size * 100), 100)
@@ -459,127 +1026,172 @@ class TimelapseApp(QMainWindow):
     
     def generate_video_and_cleanup(self):
         """Generate video and then delete JPG files"""
-        success = self.generate_video(show_message=False)
+        self.generate_video(show_message=False, on_success=self.confirm_delete_rendered)
+    
+    def confirm_delete_rendered(self, frames):
+        """Offer to delete the JPG files that went into a finished video"""
+        if not frames:
+            return  # Nothing left to delete
+        reply = QMessageBox.question(self, "Hapus JPG", 
+                                   "Video berhasil dibuat. Hapus semua file JPG untuk menghemat ruang?",
+                                   QMessageBox.Yes | QMessageBox.No)
         
-        if success:
-            reply = QMessageBox.question(self, "Hapus JPG", 
-                                       "Video berhasil dibuat. Hapus semua file JPG untuk menghemat ruang?",
-                                       QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            # Only the rendered frames, captures made while rendering are kept
+            files_deleted, bytes_freed = self.catalog.remove(frames)
+            mb_freed = bytes_freed / (1024 * 1024)
             
-            if reply == QMessageBox.Yes:
-                files_deleted = 0
-                mb_freed = 0
-                
-                for f in os.listdir(self.output_dir):
-                    if f.endswith('.jpg'):
-                        file_path = os.path.join(self.output_dir, f)
-                        mb_freed += os.path.getsize(file_path) / (1024 * 1024)
-                        os.remove(file_path)
-                        files_deleted += 1
-                
-                QMessageBox.information(self, "Pembersihan Selesai", 
-                                      f"Dihapus {files_deleted} file JPG ({mb_freed:.1f} MB)")
-                self.update_storage_display()
+            QMessageBox.information(self, "Pembersihan Selesai", 
+                                  f"Dihapus {files_deleted} file JPG ({mb_freed:.1f} MB)")
+            self.update_storage_display()
     
-    def generate_video(self, show_message=True):
+    def generate_video(self, show_message=True, on_success=None):
+        """Start rendering the captured frames into a video in a background thread"""
+        fps = self.video_fps_input.value()
+        duration = self.video_duration_input.value()
+        label = self.video_label_input.text().strip()
+        overlay = None
+        if self.video_timestamp_check.isChecked() or label:
+            overlay = TextOverlay(label=label,
+                                  time_format=DEFAULT_TIME_FORMAT if self.video_timestamp_check.isChecked() else "")
+        # With segment recording, the sealed segments only have to be joined (plus the
+        # captures no segment holds). A range picked in the frame browser, a target
+        # duration, highlights, deflicker and the overlay are rendered from the frames.
+        segments = []
+        if self.segment_check.isChecked() and self.render_range is None:
+            segments = list_segments(segments_dir(self.output_dir))
+            if segments and (duration > 0 or self.video_highlight_check.isChecked() or overlay is not None
+                             or self.video_deflicker_check.isChecked()):
+                self.update_status("Durasi, sorotan, kurangi kedip dan teks dibuat dari gambar, "
+                                   "segmen video tidak dipakai")
+                segments = []
+        # A multi-camera recording keeps its frames in per-camera subfolders
+        camera_dirs = list_camera_dirs(self.output_dir) if len(self.catalog) == 0 and not segments else []
+        
         # Check if there are images to create a video
-        if not os.path.exists(self.output_dir) or not os.listdir(self.output_dir):
+        if not os.path.exists(self.output_dir) or (len(self.catalog) == 0 and not segments and not camera_dirs):
             QMessageBox.warning(self, "Peringatan", "Tidak ada gambar untuk membuat video!")
-            return False
+            return
         
-        try:
-            # Get output video path
+        if self.render_thread and self.render_thread.isRunning():
+            QMessageBox.information(self, "Info", "Video sedang dibuat.")
+            return
+        
+        if segments:
             video_path, _ = QFileDialog.getSaveFileName(self, "Simpan Video", 
-                                                    os.path.join(os.path.expanduser("~"), "timelapse.mp4"),
+                                                    os.path.join(os.path.expanduser("~"), "timelapse.avi"),
+                                                    "Video AVI (*.avi)")
+            if not video_path:
+                return
+            job = SegmentConcatJob(self.catalog, segments, video_path, fps=fps)
+            self.update_status(f"Menemukan {len(segments)} segmen video")
+        elif camera_dirs:
+            video_path, _ = QFileDialog.getSaveFileName(self, "Simpan Video", 
+                                                    os.path.join(os.path.expanduser("~"), "timelapse_grid.mp4"),
                                                     "Video Files (*.mp4)")
-            
             if not video_path:
-                return False
-                
-            # Get all jpg images and sort them by timestamp in filename
-            images = [img for img in os.listdir(self.output_dir) if img.endswith(".jpg")]
-            
-            # Debug info
-            self.update_status(f"Menemukan {len(images)} gambar")
-            if not images:
-                QMessageBox.warning(self, "Peringatan", "Tidak ada file JPG di direktori!")
-                return False
-            
-            # Sort by timestamp in filename (capture_YYYYMMDD_HHMMSS.jpg)
-            # This ensures proper chronological order
-            images.sort(key=lambda x: x.split('_')[1] + x.split('_')[2].split('.')[0])
-            
-            # Get frame size from first image
-            first_img_path = os.path.join(self.output_dir, images[0])
-            frame = cv2.imread(first_img_path)
-            if frame is None:
-                QMessageBox.warning(self, "Peringatan", f"Tidak bisa membaca file gambar: {first_img_path}")
-                return False
-                
-            h, w, _ = frame.shape
-            
-            # Create video writer with a different codec
-            # Try several codecs that might be available on Windows
-            try:
-                fourcc = cv2.VideoWriter_fourcc(*'XVID')  # Try XVID codec first
-                self.update_status("Menggunakan codec XVID")
-            except Exception:
-                try:
-                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Fallback to mp4v
-                    self.update_status("Menggunakan codec mp4v")
-                except Exception:
-                    fourcc = cv2.VideoWriter_fourcc(*'MJPG')  # Last resort - Motion JPEG
-                    self.update_status("Menggunakan codec MJPG")
-            
-            fps = 10  # Slower FPS might be better for timelapse
-            
-            # Debug info
-            self.update_status(f"Membuat video: {w}x{h} dengan {fps} FPS")
-            
-            out = cv2.VideoWriter(video_path, fourcc, fps, (w, h))
-            if not out.isOpened():
-                QMessageBox.warning(self, "Peringatan", "Gagal membuat file video. Coba codec lain.")
-                return False
-                
-            # Progress dialog
-            progress = QProgressBar(self)
-            progress.setGeometry(0, 0, 300, 25)
-            progress.setMaximum(len(images))
-            progress.setValue(0)
-            progress.show()
+                return
+            job = GridRenderJob([open_store(path) for path in camera_dirs], video_path, fps=fps,
+                                metrics=self.metrics, overlay=overlay)
+            self.update_status(f"Menggabungkan {len(camera_dirs)} kamera dalam satu video")
+        else:
+            # Get output video path, an .avi takes the captured JPEGs as they are (MJPEG)
+            video_path, _ = QFileDialog.getSaveFileName(self, "Simpan Video", 
+                                                    os.path.join(os.path.expanduser("~"), "timelapse.mp4"),
+                                                    "Video Files (*.mp4);;"
+                                                    "Video AVI MJPEG, tanpa encode ulang atau "
+                                                    "di semua inti CPU (*.avi)")
             
-            # Add images to video
-            for i, img_name in enumerate(images):
-                img_path = os.path.join(self.output_dir, img_name)
-                frame = cv2.imread(img_path)
-                
-                if frame is not None:
-                    out.write(frame)
-                    self.update_status(f"Menambahkan frame {i+1}/{len(images)}: {img_name}")
-                else:
-                    self.update_status(f"Gambar rusak: {img_path}")
-                
-                progress.setValue(i + 1)
-                QApplication.processEvents()
-                
-            # Release video writer
-            out.release()
+            if not video_path:
+                return
             
-            # Final check if file was created and has content
-            if os.path.exists(video_path) and os.path.getsize(video_path) > 1000:
-                if show_message:
-                    QMessageBox.information(self, "Sukses", f"Video berhasil dibuat: {video_path}")
-                return True
+            # Frames come from the catalog already in chronological order
+            frames = self.catalog.frames()
+            if self.render_range is not None:
+                start, end = self.render_range
+                frames = [frame for frame in frames if start <= frame.timestamp <= end]
+            self.update_status(f"Menemukan {len(frames)} gambar")
+            deflicker = DEFAULT_DEFLICKER_WINDOW if self.video_deflicker_check.isChecked() else 0
+            if self.video_highlight_check.isChecked():
+                if duration <= 0:
+                    QMessageBox.warning(self, "Peringatan", "Isi durasi video untuk membuat sorotan")
+                    return
+                job = HighlightRenderJob(self.catalog, frames, video_path, fps=fps, duration=duration,
+                                         activity=self.activity, metrics=self.metrics, deflicker=deflicker,
+                                         overlay=overlay)
+            elif duration > 0:
+                job = SampledRenderJob(self.catalog, frames, video_path, fps=fps, duration=duration,
+                                       blend=self.video_blend_input.value(), metrics=self.metrics,
+                                       deflicker=deflicker, overlay=overlay)
+                self.update_status(f"Video {duration} detik dari {len(job.frames)} gambar terpilih")
+            elif video_path.lower().endswith(".avi") and not deflicker and overlay is None:
+                job = PassthroughRenderJob(self.catalog, frames, video_path, fps=fps, metrics=self.metrics)
+            elif video_path.lower().endswith(".avi"):
+                # Deflicker and the overlay change the pixels, so every frame is re-encoded on every CPU core
+                job = ParallelRenderJob(self.catalog, frames, video_path, fps=fps, metrics=self.metrics,
+                                        deflicker=deflicker, overlay=overlay)
             else:
-                if show_message:
-                    QMessageBox.warning(self, "Peringatan", "Video dibuat tetapi mungkin kosong atau rusak. Coba codec lain.")
-                return False
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Gagal membuat video: {str(e)}")
-            import traceback
-            self.update_status(traceback.format_exc())
-            return False
+                # Only the MJPEG AVI can be rendered in parallel, its parts are joined without decoding
+                job = RenderJob(self.catalog, frames, video_path, fps=fps, metrics=self.metrics,
+                                deflicker=deflicker, overlay=overlay)
+                self.update_status("Video .mp4 dibuat di satu proses, "
+                                   "simpan sebagai .avi untuk memakai semua inti CPU")
+        
+        self.render_thread = RenderThread(job)
+        
+        # Progress dialog
+        self.render_progress = QProgressDialog("Membuat video...", "Batal", 0, 0, self)
+        self.render_progress.setWindowTitle("Buat Video")
+        self.render_progress.setMinimumDuration(0)
+        self.render_progress.setValue(0)
+        self.render_progress.canceled.connect(job.cancel)
+        
+        self.render_thread.progress.connect(self.update_render_progress)
+        self.render_thread.status.connect(self.update_status)
+        self.render_thread.finished_render.connect(
+            lambda ok, message: self.render_finished(ok, message, job, show_message, on_success))
+        self.render_thread.start()
+        
+        self.generate_video_btn.setEnabled(False)
+        self.cleanup_after_video_btn.setEnabled(False)
+    
+    def update_render_progress(self, done, total):
+        self.render_progress.setMaximum(total)
+        self.render_progress.setValue(done)
+        self.update_status(f"Menambahkan frame {done}/{total}")
+    
+    def render_finished(self, ok, message, job, show_message, on_success):
+        self.render_progress.reset()
+        self.generate_video_btn.setEnabled(True)
+        self.cleanup_after_video_btn.setEnabled(True)
+        
+        if job.cancelled:
+            self.update_status("Pembuatan video dibatalkan")
+        elif ok:
+            self.update_status(f"Video berhasil dibuat: {job.video_path}")
+            if show_message:
+                QMessageBox.information(self, "Sukses", f"Video berhasil dibuat: {job.video_path}")
+            if on_success:
+                on_success(job.frames)
+        else:
+            QMessageBox.warning(self, "Peringatan", f"Gagal membuat video: {message}")
+    
+    def open_frame_browser(self):
+        """Browse the captures with thumbnails and pick the frames to render"""
+        if len(self.catalog) == 0:
+            QMessageBox.warning(self, "Peringatan", "Tidak ada gambar yang ditemukan!")
+            return
+        browser = FrameBrowser(self.catalog, self.thumbnails, self.render_range, self)
+        if browser.exec_() == QDialog.Accepted:
+            self.set_render_range(browser.selected_range())
+    
+    def set_render_range(self, render_range):
+        self.render_range = render_range
+        if render_range is None:
+            self.render_range_label.setText("Rentang video: semua frame")
+        else:
+            start, end = (datetime.fromtimestamp(t) for t in render_range)
+            self.render_range_label.setText(f"Rentang video: {start:%d-%m-%Y %H:%M} - {end:%d-%m-%Y %H:%M}")
     
     def view_captured_images(self):
         """Open the output directory to view captured images"""
@@ -588,32 +1200,58 @@ class TimelapseApp(QMainWindow):
             return
             
         # Check if there are any JPG images
-        images = [img for img in os.listdir(self.output_dir) if img.endswith(".jpg")]
-        if not images:
+        if len(self.catalog) == 0:
             QMessageBox.warning(self, "Peringatan", "Tidak ada gambar yang ditemukan!")
             return
+        
+        folder = self.output_dir
+        if isinstance(self.catalog, FramePackStore):
+            # Frames live inside pack files, write them out as JPGs first
+            folder = QFileDialog.getExistingDirectory(self, "Pilih Direktori Ekspor JPG")
+            if not folder:
+                return
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                count = self.catalog.export_jpegs(folder)
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"Gagal mengekspor gambar: {str(e)}")
+                return
+            finally:
+                QApplication.restoreOverrideCursor()
+            self.update_status(f"Diekspor {count} gambar ke {folder}")
             
         # Open directory with default file explorer
         try:
             import subprocess
             if sys.platform == 'win32':
-                os.startfile(self.output_dir)
+                os.startfile(folder)
             elif sys.platform == 'darwin':  # macOS
-                subprocess.call(['open', self.output_dir])
+                subprocess.call(['open', folder])
             else:  # Linux
-                subprocess.call(['xdg-open', self.output_dir])
+                subprocess.call(['xdg-open', folder])
             
-            self.update_status(f"Membuka folder: {self.output_dir}")
+            self.update_status(f"Membuka folder: {folder}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Gagal membuka folder: {str(e)}")
     
     def closeEvent(self, event):
-        # Stop the capture thread if it's running
-        if self.capture_thread and self.capture_thread.isRunning():
-            self.capture_thread.stop()
+        # Stop the capture threads if they're running
+        for thread in self.capture_threads:
+            if thread.isRunning():
+                thread.stop()
+        self.stop_metrics_export()
+        self.stop_preview_stream()
+        self.camera_probe.wait()
+        if self.render_thread and self.render_thread.isRunning():
+            self.render_thread.job.cancel()
+            self.render_thread.wait()
+        self.catalog.close()
+        self.thumbnails.close()
+        self.activity.close()
         event.accept()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Render worker processes in the frozen executable
     app = QApplication(sys.argv)
     window = TimelapseApp()
     window.show()
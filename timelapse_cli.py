@@ -0,0 +1,504 @@
+"""Headless command line entry point for capturing and rendering timelapses.
+
+Never imports Qt, and cv2/numpy are only loaded once a subcommand actually
+needs them, so the tool starts quickly from cron, systemd or a one-dir
+PyInstaller build:
+
+    python timelapse_cli.py capture -o captures -i 60
+    python timelapse_cli.py render -o captures timelapse.mp4
+    python timelapse_cli.py export -o captures jpg_folder
+    python timelapse_cli.py archive -o captures --after 168
+    python timelapse_cli.py capture --camera 0,1 -o captures
+    python timelapse_cli.py render --grid -o captures grid.mp4
+
+Pass --timing to print how long startup took. While capturing, SIGUSR1
+saves a frame right away and SIGUSR2 saves a burst around that moment.
+"""
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+
+_LOG_LOCK = threading.Lock()  # Several cameras log from their own threads
+
+
+def log(message):
+    with _LOG_LOCK:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+def parse_resolution(value):
+    """Parse "1280x720" (or "0" for the camera's own resolution)"""
+    if value in ("0", "asli"):
+        return (0, 0)
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Resolusi tidak valid: {value} (contoh: 1280x720)")
+    return (width, height)
+
+
+def parse_schedule(value):
+    """Parse a capture schedule such as "08:00-17:00=10; 300", see capture_schedule"""
+    import capture_schedule
+    try:
+        return capture_schedule.parse_schedule(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_cameras(value):
+    """Parse "0", "0,1", "semua" (every camera found) or a frame source such as synthetic:1280x720@30"""
+    if value in ("semua", "all"):
+        return None
+    parts = value.split(",")
+    if all(part.strip().isdigit() for part in parts):
+        return [int(part) for part in parts]
+    return [value]  # Synthetic camera or video file, see frame_source
+
+
+def log_timings(metrics):
+    """Log the per-stage timings collected during a command"""
+    for stage, timer in sorted(metrics.snapshot()["timers"].items()):
+        log(f"{stage}: {timer['count']}x, rata-rata {timer['mean_ms']:.2f} ms, "
+            f"p95 {timer['p95_ms']:.2f} ms, maks {timer['max_ms']:.2f} ms")
+
+
+def cmd_capture(args):
+    imported = time.perf_counter()
+    from activity import ActivityIndex
+    from capture_engine import CaptureEngine
+    from cameras import MultiCapture, probe_cameras
+    from metrics import Metrics, MetricsLogger, MetricsServer
+    from preview_server import PreviewServer
+    if args.timing:
+        log(f"Impor modul capture: {(time.perf_counter() - imported) * 1000:.0f} ms")
+
+    def show_storage(current_mb, max_mb):
+        if args.verbose:
+            log(f"Penggunaan storage: {current_mb:.1f} MB / {max_mb} MB")
+
+    cameras = args.camera
+    if cameras is None:
+        cameras = [index for index, _, _ in probe_cameras()]
+        if not cameras:
+            log("Tidak ada kamera yang ditemukan!")
+            return 1
+        log(f"Kamera ditemukan: {', '.join(str(index) for index in cameras)}")
+
+    metrics = Metrics()
+    interval = args.interval if args.interval is not None else 60
+    if args.schedule is not None:
+        # An explicit -i is the interval outside the schedule's rules
+        if args.interval is not None:
+            args.schedule.default_interval = interval
+        interval = args.schedule.default_interval
+    settings = dict(
+        interval=interval,
+        schedule=args.schedule,
+        compression=args.quality,
+        max_storage_mb=args.max_storage,
+        auto_cleanup=args.auto_cleanup,
+        keep_all_hours=args.keep_all_hours,
+        resolution=args.resolution,
+        preview_fps=0,
+        segment_seconds=args.segments * 60,
+        delete_after_seal=args.delete_after_seal,
+        max_captures=args.count,
+        change_threshold=args.skip_static,
+        keepalive_seconds=args.keepalive,
+        stack_frames=args.stack,
+        packed=True if args.pack else None,
+        low_power=args.low_power,
+        process_capture=args.process_capture,
+        preroll_seconds=args.preroll,
+        archive_after_hours=args.archive_after,
+        archive_format=args.archive_format,
+        archive_quality=args.archive_quality,
+        archive_resolution=args.archive_resolution,
+        metrics=metrics,
+        on_status=log,
+        on_storage=show_storage,
+    )
+    if len(cameras) == 1:
+        engine = CaptureEngine(output_dir=args.output, camera_index=cameras[0], **settings)
+    else:
+        # One worker per camera, in cam0, cam1, ... subfolders of the output directory
+        engine = MultiCapture(cameras, output_dir=args.output, **settings)
+    engines = engine.engines if len(cameras) > 1 else [engine]
+    # Motion scores for highlight videos, recorded as the captures are saved
+    for capture in engines:
+        capture.activity = ActivityIndex(capture.output_dir).load(capture.catalog.frames())
+
+    stream_server = None
+    if args.stream_port:
+        try:
+            stream_server = PreviewServer(args.stream_port, host=args.stream_host, fps=args.stream_fps,
+                                          metrics=metrics)
+        except OSError as e:
+            log(f"Gagal membuka port pratinjau {args.stream_port}: {e}")
+            return 1
+        # With several cameras the stream shows the first one
+        engines[0].stream = stream_server
+        log(f"Pratinjau langsung di http://{args.stream_host}:{stream_server.port}/")
+
+    # Stop cleanly (flushing pending writes and sealing segments) on Ctrl+C or systemd stop
+    def request_stop(signum, frame):
+        engine.stop()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    # kill -USR1 saves a frame right away, kill -USR2 a burst around this moment
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: engine.capture_now())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: engine.capture_now(args.preroll, args.preroll))
+    if args.duration > 0:
+        timer = threading.Timer(args.duration, engine.stop)
+        timer.daemon = True
+        timer.start()
+
+    metrics_logger = metrics_server = None
+    if args.metrics_log:
+        metrics_logger = MetricsLogger(metrics, args.metrics_log, interval=args.metrics_interval)
+    if args.metrics_port:
+        metrics_server = MetricsServer(metrics, args.metrics_port)
+        log(f"Metrik tersedia di http://127.0.0.1:{metrics_server.port}/metrics")
+
+    plan = args.schedule.describe() if args.schedule is not None else f"{interval:g} detik"
+    log(f"Timelapse dimulai: interval {plan}, output {args.output}")
+    try:
+        engine.run()
+    finally:
+        if stream_server is not None:
+            stream_server.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if metrics_logger is not None:
+            metrics_logger.close()
+        for capture in engines:
+            capture.activity.close()
+    if args.timing and engine.first_frame_time is not None:
+        log(f"Frame kamera pertama {(engine.first_frame_time - _START) * 1000:.0f} ms setelah start")
+    if args.timing:
+        log_timings(metrics)
+    log(f"Timelapse dihentikan: {engine.saved_count} capture tersimpan")
+    return 0 if engine.first_frame_time is not None else 1
+
+
+def cmd_render(args):
+    imported = time.perf_counter()
+    from frame_catalog import open_store
+    from metrics import Metrics
+    from activity import ActivityIndex
+    from overlay import DEFAULT_TIME_FORMAT, TextOverlay
+    from video_render import (RenderJob, GridRenderJob, HighlightRenderJob, ParallelRenderJob, PassthroughRenderJob,
+                              SampledRenderJob)
+    from segment_recorder import SegmentConcatJob, segments_dir, list_segments
+    from cameras import list_camera_dirs
+    if args.timing:
+        log(f"Impor modul render: {(time.perf_counter() - imported) * 1000:.0f} ms")
+
+    if not os.path.isdir(args.output):
+        log(f"Direktori tidak ditemukan: {args.output}")
+        return 1
+    if args.jobs != 1 and not args.video.lower().endswith(".avi"):
+        log("-j/--jobs hanya untuk output .avi (MJPEG), video lain dirender di satu proses")
+        return 1
+    if args.jobs != 1 and (args.duration > 0 or args.segments or args.grid or args.passthrough):
+        log("-j/--jobs tidak bisa digabung dengan --duration, --segments, --grid atau --passthrough")
+        return 1
+    if args.passthrough and not args.video.lower().endswith(".avi"):
+        log("--passthrough menghasilkan MJPEG AVI, gunakan nama file .avi")
+        return 1
+    if args.passthrough and (args.deflicker or args.duration > 0 or args.segments or args.grid):
+        log("--passthrough tidak bisa digabung dengan --deflicker, --duration, --segments atau --grid")
+        return 1
+    if args.highlights and (args.duration <= 0 or args.segments or args.grid or args.passthrough):
+        log("--highlights butuh --duration dan tidak bisa digabung dengan --segments, --grid atau --passthrough")
+        return 1
+    overlay = None
+    if args.timestamp or args.label:
+        if args.segments or args.passthrough:
+            log("--timestamp dan --label tidak bisa digabung dengan --segments atau --passthrough")
+            return 1
+        overlay = TextOverlay(label=args.label, time_format=DEFAULT_TIME_FORMAT if args.timestamp else "",
+                              position=args.overlay_position)
+    if args.deflicker_window < 2:
+        log("--deflicker-window minimal 2 frame")
+        return 1
+    if args.segments and (args.duration > 0 or args.deflicker):
+        log("--segments hanya menggabung segmen, tidak bisa digabung dengan --duration atau --deflicker")
+        return 1
+    if args.deflicker and args.grid:
+        log("--deflicker tidak berlaku untuk --grid, diabaikan")
+    deflicker = args.deflicker_window if args.deflicker else 0
+    catalog = open_store(args.output)
+    metrics = Metrics()
+    job = activity = None
+    try:
+        if args.segments:
+            segments = list_segments(segments_dir(args.output))
+            if not segments:
+                log("Tidak ada segmen video untuk digabung!")
+                return 1
+            job = SegmentConcatJob(catalog, segments, args.video, fps=args.fps)
+        elif args.grid:
+            camera_dirs = list_camera_dirs(args.output)
+            if not camera_dirs:
+                log("Tidak ada folder kamera (cam0, cam1, ...) untuk digabung!")
+                return 1
+            log(f"Menggabungkan {len(camera_dirs)} kamera dalam satu video")
+            job = GridRenderJob([open_store(path) for path in camera_dirs], args.video, fps=args.fps,
+                                metrics=metrics, overlay=overlay)
+        else:
+            frames = catalog.frames()
+            log(f"Menemukan {len(frames)} gambar")
+            if args.highlights:
+                activity = ActivityIndex(args.output).load(frames)
+                job = HighlightRenderJob(catalog, frames, args.video, fps=args.fps, duration=args.duration,
+                                         activity=activity, metrics=metrics, deflicker=deflicker,
+                                         overlay=overlay)
+            elif args.duration > 0:
+                job = SampledRenderJob(catalog, frames, args.video, fps=args.fps, duration=args.duration,
+                                       blend=args.blend, metrics=metrics, deflicker=deflicker,
+                                       overlay=overlay)
+                log(f"Video {args.duration:g} detik: {len(job.plan)} frame video dari "
+                    f"{len(job.frames)} gambar terpilih")
+            elif args.passthrough:
+                job = PassthroughRenderJob(catalog, frames, args.video, fps=args.fps, metrics=metrics)
+            elif args.jobs != 1:
+                job = ParallelRenderJob(catalog, frames, args.video, fps=args.fps, processes=args.jobs or None,
+                                        metrics=metrics, deflicker=deflicker, overlay=overlay)
+            else:
+                job = RenderJob(catalog, frames, args.video, fps=args.fps, metrics=metrics,
+                                deflicker=deflicker, overlay=overlay)
+
+        def show_progress(done, total):
+            log(f"Menambahkan frame {done}/{total}")
+
+        start = time.perf_counter()
+        job.run(progress=show_progress, status=log)
+        log(f"Video berhasil dibuat: {args.video} ({job.frames_written} frame, "
+            f"{time.perf_counter() - start:.1f} detik)")
+        if args.timing:
+            log_timings(metrics)
+
+        if args.delete_jpg:
+            files_deleted, bytes_freed = catalog.remove(job.frames)
+            log(f"Dihapus {files_deleted} file JPG ({bytes_freed / (1024 * 1024):.1f} MB)")
+    except KeyboardInterrupt:
+        if job is not None:
+            job.cancel()
+        log("Pembuatan video dibatalkan")
+        return 130
+    except Exception as e:
+        log(f"Gagal membuat video: {e}")
+        return 1
+    finally:
+        if activity is not None:
+            activity.close()
+        catalog.close()
+    return 0
+
+
+def cmd_cameras(args):
+    from cameras import probe_cameras
+
+    cameras = probe_cameras()
+    if not cameras:
+        log("Tidak ada kamera yang ditemukan!")
+        return 1
+    for index, width, height in cameras:
+        print(f"{index}\t{width}x{height}")
+    return 0
+
+
+def cmd_export(args):
+    from frame_catalog import open_store
+    from frame_pack import FramePackStore
+
+    store = open_store(args.output)
+    try:
+        if not isinstance(store, FramePackStore):
+            log(f"Tidak ada file pack di {args.output}, gambar sudah berupa file JPG")
+            return 1
+
+        def show_progress(done, total):
+            if args.verbose or done == total:
+                log(f"Mengekspor gambar {done}/{total}")
+
+        count = store.export_jpegs(args.dest, progress=show_progress)
+        log(f"Diekspor {count} gambar ke {args.dest}")
+    except OSError as e:
+        log(f"Gagal mengekspor gambar: {e}")
+        return 1
+    finally:
+        store.close()
+    return 0
+
+
+def cmd_archive(args):
+    from frame_archive import ArchiveWorker
+    from frame_catalog import FrameCatalog, open_store
+
+    if not os.path.isdir(args.output):
+        log(f"Direktori tidak ditemukan: {args.output}")
+        return 1
+    catalog = open_store(args.output)
+    try:
+        if not isinstance(catalog, FrameCatalog):
+            log("Pengarsipan hanya untuk folder JPG, gambar dalam file pack tidak diubah")
+            return 1
+        before = catalog.total_mb()
+        archiver = ArchiveWorker(catalog, args.after, args.format, args.quality, args.resolution,
+                                 processes=args.jobs or os.cpu_count() or 1)
+        try:
+            count, saved = archiver.archive()
+        finally:
+            archiver.close()
+        log(f"{count} gambar diarsipkan, {saved / (1024 * 1024):.1f} MB dihemat "
+            f"({before:.1f} MB -> {catalog.total_mb():.1f} MB)")
+    except KeyboardInterrupt:
+        log("Pengarsipan dibatalkan")
+        return 130
+    finally:
+        catalog.close()
+    return 0
+
+
+def add_archive_arguments(parser, prefix=""):
+    """Format, quality and size options shared by capture --archive-... and archive"""
+    parser.add_argument(f"--{prefix}format", choices=("webp", "jpg"), default="webp",
+                        help="format gambar arsip (default: webp)")
+    parser.add_argument(f"--{prefix}quality", type=int, default=80, metavar="KUALITAS",
+                        help="kualitas gambar arsip 1-100 (default: 80)")
+    parser.add_argument(f"--{prefix}resolution", type=parse_resolution, default=(0, 0), metavar="WxH",
+                        help="perkecil gambar arsip agar muat dalam WxH (default: ukuran asli)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Perekam timelapse tanpa GUI")
+    parser.add_argument("--timing", action="store_true", help="tampilkan waktu startup dan waktu per tahap")
+    parser.add_argument("-v", "--verbose", action="store_true", help="tampilkan penggunaan storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    capture = sub.add_parser("capture", help="rekam gambar dari kamera")
+    capture.add_argument("-o", "--output", default="captures", help="direktori output (default: captures)")
+    capture.add_argument("-i", "--interval", type=float, default=None,
+                         help="interval capture dalam detik, boleh pecahan (default: 60)")
+    capture.add_argument("--schedule", type=parse_schedule, metavar="JADWAL",
+                         help='interval menurut jam, mis. "sen-jum 08:00-17:00=10; 300"')
+    capture.add_argument("-q", "--quality", type=int, default=85, help="kualitas JPG 0-100 (default: 85)")
+    capture.add_argument("-r", "--resolution", type=parse_resolution, default=(0, 0),
+                         help="resolusi, misalnya 1280x720 (default: asli dari kamera)")
+    capture.add_argument("--camera", type=parse_cameras, default=[0],
+                         help="indeks kamera, beberapa dipisah koma, \"semua\", synthetic:LxT@FPS "
+                              "atau file video (default: 0)")
+    capture.add_argument("--max-storage", type=int, default=1000, help="batas penyimpanan dalam MB")
+    capture.add_argument("--auto-cleanup", action="store_true", help="tipiskan file lama saat penuh")
+    capture.add_argument("--keep-all-hours", type=int, default=24, metavar="JAM",
+                         help="saat menipiskan, simpan semua frame JAM jam terakhir (default: 24)")
+    capture.add_argument("--segments", type=int, default=0, metavar="MENIT",
+                         help="rekam segmen video sepanjang MENIT menit (0: mati)")
+    capture.add_argument("--delete-after-seal", action="store_true",
+                         help="hapus JPG setelah segmennya selesai")
+    capture.add_argument("--skip-static", type=float, default=0, metavar="AMBANG",
+                         help="lewati frame yang berbeda kurang dari AMBANG tingkat abu-abu (0: mati)")
+    capture.add_argument("--keepalive", type=int, default=300, metavar="DETIK",
+                         help="tetap simpan minimal satu frame tiap DETIK detik (default: 300)")
+    capture.add_argument("--stack", type=int, default=0, metavar="N",
+                         help="simpan rata-rata N frame kamera terakhir sebelum tiap capture, "
+                              "mengurangi noise saat gelap (0: mati)")
+    capture.add_argument("--pack", action="store_true",
+                         help="simpan gambar dalam file pack, bukan satu JPG per capture")
+    capture.add_argument("--low-power", action="store_true",
+                         help="resolusi diatur di kamera, frame hanya di-decode saat disimpan")
+    capture.add_argument("--process-capture", action="store_true",
+                         help="baca kamera di proses terpisah lewat shared memory (pre-roll untuk burst)")
+    capture.add_argument("--preroll", type=float, default=3, metavar="DETIK",
+                         help="frame terakhir yang disimpan untuk burst (SIGUSR2), default: 3")
+    capture.add_argument("--archive-after", type=float, default=0, metavar="JAM",
+                         help="kecilkan gambar yang lebih tua dari JAM jam di latar belakang (0: mati)")
+    add_archive_arguments(capture, "archive-")
+    capture.add_argument("--metrics-log", metavar="FILE",
+                         help="tulis metrik (JSON per baris) ke file secara berkala")
+    capture.add_argument("--metrics-interval", type=float, default=60, metavar="DETIK",
+                         help="jeda antar penulisan metrik (default: 60)")
+    capture.add_argument("--metrics-port", type=int, default=0, metavar="PORT",
+                         help="sajikan metrik Prometheus di http://127.0.0.1:PORT/metrics")
+    capture.add_argument("--stream-port", type=int, default=0, metavar="PORT",
+                         help="siarkan pratinjau langsung (MJPEG) di http://127.0.0.1:PORT/")
+    capture.add_argument("--stream-host", default="127.0.0.1", metavar="ALAMAT",
+                         help="alamat server pratinjau, 0.0.0.0 agar bisa dibuka dari jaringan")
+    capture.add_argument("--stream-fps", type=float, default=5, metavar="FPS",
+                         help="frame per detik pratinjau langsung (default: 5)")
+    capture.add_argument("--count", type=int, default=0, help="berhenti setelah sejumlah capture")
+    capture.add_argument("--duration", type=float, default=0, help="berhenti setelah sejumlah detik")
+    capture.set_defaults(func=cmd_capture)
+
+    render = sub.add_parser("render", help="buat video dari gambar yang diambil")
+    render.add_argument("video", help="file video output")
+    render.add_argument("-o", "--output", default="captures", help="direktori capture (default: captures)")
+    render.add_argument("--fps", type=float, default=10, help="FPS video (default: 10)")
+    render.add_argument("--segments", action="store_true",
+                        help="gabungkan segmen video tanpa encode ulang (output .avi)")
+    render.add_argument("--grid", action="store_true",
+                        help="gabungkan rekaman multi-kamera (cam0, cam1, ...) berdampingan")
+    render.add_argument("-d", "--duration", type=float, default=0, metavar="DETIK",
+                        help="panjang video; frame dipilih merata sepanjang waktu rekaman (default: semua frame)")
+    render.add_argument("--blend", type=int, default=1, metavar="N",
+                        help="dengan --duration, campur hingga N frame per frame video agar lebih halus")
+    render.add_argument("--highlights", action="store_true",
+                        help="dengan --duration, hanya bagian dengan gerakan terbanyak")
+    render.add_argument("--timestamp", action="store_true",
+                        help="tulis tanggal dan jam capture di setiap frame video")
+    render.add_argument("--label", default="", metavar="TEKS",
+                        help="teks tambahan di samping waktu capture, misalnya nama lokasi")
+    render.add_argument("--overlay-position", choices=("bottom-left", "bottom-right", "top-left", "top-right"),
+                        default="bottom-left",
+                        help="pojok untuk --timestamp dan --label (default: bottom-left)")
+    render.add_argument("--deflicker", action="store_true", help="ratakan kedip auto-exposure")
+    render.add_argument("--deflicker-window", type=int, default=15, metavar="N",
+                        help="dengan --deflicker, kecerahan dirata-rata atas N frame (default: 15)")
+    render.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="render di N proses (0 = semua inti CPU), hanya untuk output .avi (MJPEG)")
+    render.add_argument("--passthrough", action="store_true",
+                        help="salin JPG apa adanya ke MJPEG AVI tanpa decode/encode (output .avi)")
+    render.add_argument("--delete-jpg", action="store_true", help="hapus JPG setelah video dibuat")
+    render.set_defaults(func=cmd_render)
+
+    cameras = sub.add_parser("cameras", help="tampilkan kamera yang tersedia")
+    cameras.set_defaults(func=cmd_cameras)
+
+    export = sub.add_parser("export", help="ekspor gambar dari file pack sebagai JPG")
+    export.add_argument("dest", help="direktori tujuan")
+    export.add_argument("-o", "--output", default="captures", help="direktori capture (default: captures)")
+    export.set_defaults(func=cmd_export)
+
+    archive = sub.add_parser("archive", help="kecilkan gambar lama (WebP atau resolusi lebih kecil)")
+    archive.add_argument("-o", "--output", default="captures", help="direktori capture (default: captures)")
+    archive.add_argument("--after", type=float, default=24 * 7, metavar="JAM",
+                         help="hanya gambar yang lebih tua dari JAM jam (default: 168)")
+    add_archive_arguments(archive)
+    archive.add_argument("-j", "--jobs", type=int, default=0, metavar="N",
+                         help="jumlah proses (default: semua inti CPU)")
+    archive.set_defaults(func=cmd_archive)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.timing:
+        log(f"Startup CLI: {(time.perf_counter() - _START) * 1000:.0f} ms")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # Render worker processes in the frozen build
+    sys.exit(main())
@@ -0,0 +1,738 @@
+"""Timelapse video rendering, independent of the GUI.
+
+A RenderJob decodes the catalog frames with a small thread pool that runs
+ahead of the cv2.VideoWriter through a bounded window, so decoding overlaps
+with encoding while memory use stays bounded. It reports throttled progress
+and can be cancelled from another thread. GridRenderJob does the same for
+several cameras at once, tiling the frames that share a capture time.
+ParallelRenderJob splits a long sequence over several processes,
+SampledRenderJob renders a summary of a target length from a subset,
+HighlightRenderJob one made of the busiest spans (see activity), and
+PassthroughRenderJob copies the captured JPEGs into an MJPEG AVI as they are.
+With deflicker set, frames are brightness-corrected first (see deflicker).
+"""
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+import mjpeg_avi
+from activity import fill_activity
+from deflicker import apply_lut, deflicker_luts, frame_brightness
+from frame_catalog import jpeg_size
+
+
+class RenderCancelled(Exception):
+    """Raised by RenderJob.run when cancel() was called"""
+
+
+def choose_fourcc():
+    """Pick a video codec, returns (fourcc, codec name)"""
+    # Try several codecs that might be available on Windows
+    try:
+        return cv2.VideoWriter_fourcc(*'XVID'), "XVID"  # Try XVID codec first
+    except Exception:
+        try:
+            return cv2.VideoWriter_fourcc(*'mp4v'), "mp4v"  # Fallback to mp4v
+        except Exception:
+            return cv2.VideoWriter_fourcc(*'MJPG'), "MJPG"  # Last resort - Motion JPEG
+
+
+def most_common_size(frames):
+    """The (width, height) shared by most frames, from catalog metadata only"""
+    sizes = Counter((frame.width, frame.height) for frame in frames if frame.width and frame.height)
+    if not sizes:
+        return None
+    return sizes.most_common(1)[0][0]
+
+
+def fit_frame(image, size):
+    """Scale an image to fit (width, height), padding with black to keep the aspect ratio"""
+    w, h = size
+    ih, iw = image.shape[:2]
+    if (iw, ih) == (w, h):
+        return image
+    scale = min(w / iw, h / ih)
+    nw, nh = max(1, round(iw * scale)), max(1, round(ih * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (nw, nh), interpolation=interpolation)
+    if (nw, nh) == (w, h):
+        return resized
+    canvas = np.zeros((h, w, 3), dtype=np.uint8)
+    x, y = (w - nw) // 2, (h - nh) // 2
+    canvas[y:y + nh, x:x + nw] = resized
+    return canvas
+
+
+class RenderJob:
+    """Render a list of catalog frames into a video file.
+
+    With a metrics.Metrics registry, decode, wait and video write times are
+    recorded per frame. deflicker is the number of frames the brightness is
+    smoothed over, 0 renders the frames as they are. An overlay.TextOverlay
+    given as `overlay` draws each frame's capture time into the video.
+    """
+
+    def __init__(self, catalog, frames, video_path, fps=10, decode_threads=4, prefetch=16,
+                 progress_interval=0.25, metrics=None, deflicker=0, overlay=None):
+        self.catalog = catalog
+        self.frames = list(frames)
+        self.video_path = video_path
+        self.fps = fps
+        self.decode_threads = max(1, decode_threads)
+        self.prefetch = max(1, prefetch)
+        self.progress_interval = progress_interval  # Minimum seconds between progress reports
+        self.frame_size = None
+        self.frames_written = 0
+        self.frames_skipped = 0
+        self.metrics = metrics
+        self.deflicker = deflicker
+        self._luts = None  # frame seq -> deflicker lookup table
+        self.overlay = overlay
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _read(self, frame):
+        try:
+            data = self.catalog.read_bytes(frame)
+        except OSError:
+            return None
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def _decode(self, frame):
+        image = self._read(frame)
+        if image is None:
+            return None
+        return self._annotate(frame, self._correct(frame, fit_frame(image, self.frame_size)))
+
+    def _correct(self, frame, image):
+        """Apply the frame's deflicker lookup table, if there is one"""
+        lut = self._luts.get(frame.seq) if self._luts is not None else None
+        return image if lut is None else apply_lut(image, lut)
+
+    def _annotate(self, frame, image):
+        """Draw the overlay text for the frame's capture time, if there is an overlay"""
+        return image if self.overlay is None else self.overlay.apply(image, frame.timestamp)
+
+    def _brightness(self, frame):
+        try:
+            return frame_brightness(self.catalog.read_bytes(frame))
+        except OSError:
+            return None
+
+    def _prepare_deflicker(self, status):
+        """Measure every frame's brightness and compute its correction table"""
+        if not self.deflicker or not self.frames:
+            return
+        status(f"Menganalisis kecerahan {len(self.frames)} gambar untuk deflicker")
+        started = time.perf_counter()
+        brightness = []
+        with ThreadPoolExecutor(max_workers=self.decode_threads, thread_name_prefix="RenderDeflicker") as pool:
+            for value in pool.map(self._brightness, self.frames):
+                if self._cancel.is_set():
+                    raise RenderCancelled()
+                brightness.append(value)
+        luts = deflicker_luts(brightness, self.deflicker)
+        self._luts = {frame.seq: lut for frame, lut in zip(self.frames, luts)}
+        if self.metrics is not None:
+            self.metrics.observe("deflicker_analyze", time.perf_counter() - started)
+
+    def _timed_decode(self, item):
+        started = time.perf_counter()
+        image = self._decode(item)
+        self.metrics.observe("render_decode", time.perf_counter() - started)
+        return image
+
+    def _first_readable_size(self):
+        for frame in self.frames:
+            image = self._read(frame)
+            if image is not None:
+                return image.shape[1], image.shape[0]
+        return None
+
+    def _items(self):
+        """What run() turns into video frames, one _decode() call each"""
+        return self.frames
+
+    def _video_size(self):
+        return most_common_size(self.frames) or self._first_readable_size()
+
+    def _describe(self, item):
+        return self.catalog.path(item)
+
+    def _write_frames(self, items, sink, progress, status):
+        """Run _decode() over the items on the thread pool and hand each result to sink(), in order.
+
+        Up to `prefetch` items are decoded ahead. An item that decodes to
+        None is counted as skipped and reported. Raises RenderCancelled as
+        soon as the job is cancelled; cleaning up the output is up to the
+        caller.
+        """
+        decode = self._decode if self.metrics is None else self._timed_decode
+        clock = time.perf_counter
+        total = len(items)
+        last_report = 0
+        with ThreadPoolExecutor(max_workers=self.decode_threads, thread_name_prefix="RenderDecode") as pool:
+            pending = deque()
+            upcoming = iter(items)
+            for item in upcoming:
+                pending.append((item, pool.submit(decode, item)))
+                if len(pending) >= self.prefetch:
+                    break
+
+            done = 0
+            while pending:
+                if self._cancel.is_set():
+                    for _, future in pending:
+                        future.cancel()
+                    raise RenderCancelled()
+
+                item, future = pending.popleft()
+                next_item = next(upcoming, None)
+                if next_item is not None:
+                    pending.append((next_item, pool.submit(decode, next_item)))
+
+                started = clock()
+                result = future.result()
+                waited = clock()
+                if result is not None:
+                    sink(result)
+                    self.frames_written += 1
+                else:
+                    self.frames_skipped += 1
+                    status(f"Gambar rusak: {self._describe(item)}")
+                if self.metrics is not None:
+                    # Time spent waiting here means decoding is the bottleneck
+                    self.metrics.observe("render_wait", waited - started)
+                    if result is not None:
+                        self.metrics.observe("video_write", clock() - waited)
+                    self.metrics.count("frames_rendered" if result is not None else "frames_unreadable")
+
+                done += 1
+                now = time.monotonic()
+                if progress and (now - last_report >= self.progress_interval or done == total):
+                    last_report = now
+                    progress(done, total)
+
+    def run(self, progress=None, status=None):
+        """Render the video; progress(done, total) and status(message) are optional callbacks.
+
+        Returns the number of frames written. Raises RenderCancelled if the job
+        was cancelled and RuntimeError if the video could not be created; the
+        partial file is removed whenever the render does not finish.
+        """
+        status = status or (lambda message: None)
+        items = self._items()
+        total = len(items)
+        if total == 0:
+            raise RuntimeError("Tidak ada gambar untuk membuat video!")
+
+        # Every frame is normalized to the size most of the captures share, so a
+        # resolution change between sessions no longer breaks the video
+        self.frame_size = self._video_size()
+        if self.frame_size is None:
+            raise RuntimeError("Tidak bisa membaca file gambar")
+        w, h = self.frame_size
+        self._prepare_deflicker(status)
+
+        fourcc, codec = choose_fourcc()
+        status(f"Menggunakan codec {codec}")
+        status(f"Membuat video: {w}x{h} dengan {self.fps} FPS")
+
+        out = cv2.VideoWriter(self.video_path, fourcc, self.fps, (w, h))
+        if not out.isOpened():
+            raise RuntimeError("Gagal membuat file video. Coba codec lain.")
+
+        try:
+            self._write_frames(items, out.write, progress, status)
+        except BaseException:
+            # Cancelled or failed: no writer handle left open, no truncated video left behind
+            out.release()
+            try:
+                os.remove(self.video_path)
+            except OSError:
+                pass
+            raise
+        out.release()
+
+        # Final check if file was created and has content
+        if not os.path.exists(self.video_path) or os.path.getsize(self.video_path) <= 1000:
+            raise RuntimeError("Video dibuat tetapi mungkin kosong atau rusak. Coba codec lain.")
+        return self.frames_written
+
+
+class GridRenderJob(RenderJob):
+    """Render several cameras side by side, one grid cell per camera.
+
+    Frames are matched on their capture time, which a shared CaptureClock
+    keeps identical across cameras. A camera without a frame for some time
+    shows its previous frame (or black until its first one).
+    """
+
+    def __init__(self, catalogs, video_path, fps=10, **kwargs):
+        super().__init__(catalogs[0], [], video_path, fps=fps, **kwargs)
+        self.catalogs = list(catalogs)
+        self.columns = math.ceil(math.sqrt(len(self.catalogs)))
+        self.rows = math.ceil(len(self.catalogs) / self.columns)
+        self.cell_size = None
+
+        # One row per capture time, holding each camera's latest frame at that time
+        by_time = {}
+        for column, catalog in enumerate(self.catalogs):
+            for frame in catalog.frames():
+                by_time.setdefault(round(frame.timestamp, 3), {})[column] = frame
+        latest = [None] * len(self.catalogs)
+        self.grid = []
+        for timestamp in sorted(by_time):
+            for column, frame in by_time[timestamp].items():
+                latest[column] = frame
+            self.grid.append(tuple(latest))
+
+    def _items(self):
+        return self.grid
+
+    def _video_size(self):
+        self.cell_size = most_common_size([frame for catalog in self.catalogs for frame in catalog.frames()])
+        if self.cell_size is None:
+            return None
+        w, h = self.cell_size
+        # Video writers want even dimensions
+        return (w * self.columns) // 2 * 2, (h * self.rows) // 2 * 2
+
+    def _decode(self, cells):
+        w, h = self.cell_size
+        canvas = np.zeros((h * self.rows, w * self.columns, 3), dtype=np.uint8)
+        decoded = 0
+        for i, (catalog, frame) in enumerate(zip(self.catalogs, cells)):
+            if frame is None:
+                continue
+            try:
+                data = catalog.read_bytes(frame)
+            except OSError:
+                continue
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            row, column = divmod(i, self.columns)
+            canvas[row * h:(row + 1) * h, column * w:(column + 1) * w] = fit_frame(image, self.cell_size)
+            decoded += 1
+        if decoded == 0:
+            return None
+        # The cameras share a clock, the newest cell holds the time of this grid row
+        newest = max((frame for frame in cells if frame is not None), key=lambda frame: frame.timestamp)
+        return self._annotate(newest, canvas[:self.frame_size[1], :self.frame_size[0]])
+
+    def _describe(self, cells):
+        return ", ".join(catalog.path(frame) for catalog, frame in zip(self.catalogs, cells) if frame)
+
+
+def plan_sampling(frames, frame_count, blend=1, gap_factor=10):
+    """Pick the frames for a video of frame_count frames, spread evenly over the capture time.
+
+    Returns one tuple of frames per video frame: the frame closest to its
+    point in time, plus (with blend > 1) up to blend frames evenly spread
+    over the stretch of time that video frame stands for. Gaps much longer
+    than the usual interval (nights, recording paused) are shortened to one
+    interval, so the video does not sit on one frame through them.
+    """
+    frames = list(frames)
+    if frame_count <= 0 or len(frames) <= frame_count:
+        return [(frame,) for frame in frames]
+
+    times = np.array([frame.timestamp for frame in frames], dtype=np.float64)
+    steps = np.diff(times)
+    if len(steps):
+        usual = float(np.median(steps)) or 1.0
+        steps = np.minimum(steps, usual * gap_factor)
+    timeline = np.concatenate(([0.0], np.cumsum(steps)))
+
+    targets = np.linspace(0.0, timeline[-1], frame_count)
+    after = np.clip(np.searchsorted(timeline, targets), 1, len(frames) - 1)
+    before = after - 1
+    chosen = np.where(targets - timeline[before] <= timeline[after] - targets, before, after)
+
+    if blend <= 1:
+        return [(frames[i],) for i in chosen]
+    # Every video frame stands for the frames between the midpoints to its neighbours
+    bounds = np.searchsorted(timeline, (targets[:-1] + targets[1:]) / 2)
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(frames)]))
+    plan = []
+    for index, start, end in zip(chosen, starts, ends):
+        if end - start <= 1:
+            plan.append((frames[index],))
+            continue
+        picks = np.unique(np.linspace(start, end - 1, min(blend, end - start)).round().astype(int))
+        plan.append(tuple(frames[i] for i in picks))
+    return plan
+
+
+class SampledRenderJob(RenderJob):
+    """Render a video of a target length from evenly sampled frames.
+
+    Only the frames in the plan (see plan_sampling) are decoded, so a month
+    of captures becomes a short summary in seconds. Blended frames are
+    averaged in one vectorized step per video frame.
+    """
+
+    def __init__(self, catalog, frames, video_path, fps=30, duration=30, blend=1, **kwargs):
+        self.plan = plan_sampling(frames, int(round(duration * fps)), blend)
+        used = {}
+        for group in self.plan:
+            for frame in group:
+                used[frame.seq] = frame
+        # Only the frames that made it into the video count as rendered
+        super().__init__(catalog, sorted(used.values(), key=lambda frame: frame.timestamp), video_path,
+                         fps=fps, **kwargs)
+        self.duration = duration
+        self.blend = blend
+
+    def _items(self):
+        return self.plan
+
+    def _decode(self, group):
+        images = [self._correct(frame, fit_frame(image, self.frame_size))
+                  for frame, image in ((frame, self._read(frame)) for frame in group) if image is not None]
+        if not images:
+            return None
+        if len(images) == 1:
+            return self._annotate(group[0], images[0])
+        stack = np.stack(images)
+        # Blended frames are labelled with the time of the middle one
+        return self._annotate(group[len(group) // 2], stack.mean(axis=0, dtype=np.float32).round().astype(np.uint8))
+
+    def _describe(self, group):
+        return ", ".join(self.catalog.path(frame) for frame in group)
+
+
+HIGHLIGHT_SPAN_SECONDS = 2  # Shortest stretch of video a highlight is shown for
+
+
+def plan_highlights(scores, frame_count, span):
+    """Indices of the frame_count frames in the busiest spans, in chronological order.
+
+    scores are the frames' activity (NaN counts as none). They are averaged
+    over `span` frames, so a single noisy frame does not make a highlight,
+    and spans of `span` frames around the highest averages are taken until
+    frame_count frames are selected.
+    """
+    scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=0.0)
+    n = len(scores)
+    if frame_count <= 0 or n <= frame_count:
+        return list(range(n))
+    span = max(1, min(int(span), n))
+    if span > 1:
+        padded = np.pad(scores, (span // 2, span - 1 - span // 2), mode="edge")
+        scores = np.convolve(padded, np.ones(span) / span, mode="valid")
+
+    selected = np.zeros(n, dtype=bool)
+    count = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if selected[i]:
+            continue
+        start = min(max(0, i - span // 2), n - span)
+        new = np.flatnonzero(~selected[start:start + span])[:frame_count - count] + start
+        selected[new] = True
+        count += len(new)
+        if count >= frame_count:
+            break
+    return np.flatnonzero(selected).tolist()
+
+
+class HighlightRenderJob(RenderJob):
+    """Render a video of a target length from the busiest parts of the recording.
+
+    The frames are ranked by their activity scores (see activity), and only
+    the frames of the chosen spans are decoded. Frames without a score yet
+    are scored from a 1/8 scale decode first, and the scores are kept in
+    `activity` for the next render.
+    """
+
+    def __init__(self, catalog, frames, video_path, fps=30, duration=30, activity=None, **kwargs):
+        super().__init__(catalog, frames, video_path, fps=fps, **kwargs)
+        self.candidates = self.frames
+        self.duration = duration
+        self.activity = activity
+
+    def _select(self, status):
+        started = time.perf_counter()
+        scores = fill_activity(self.catalog, self.candidates, self.activity, threads=self.decode_threads,
+                               cancelled=self._cancel.is_set)
+        if self._cancel.is_set():
+            raise RenderCancelled()
+        span = max(1, round(HIGHLIGHT_SPAN_SECONDS * self.fps))
+        chosen = plan_highlights(scores, int(round(self.duration * self.fps)), span)
+        self.frames = [self.candidates[i] for i in chosen]
+        if self.metrics is not None:
+            self.metrics.observe("highlight_select", time.perf_counter() - started)
+        status(f"Sorotan: {len(self.frames)} frame paling ramai dari {len(self.candidates)} gambar")
+
+    def run(self, progress=None, status=None):
+        """Pick the busiest frames, then render them like RenderJob.run"""
+        status = status or (lambda message: None)
+        if self.candidates:
+            self._select(status)
+        return super().run(progress, status)
+
+
+MIN_CHUNK_FRAMES = 100  # Smaller chunks spend more time starting up than encoding
+CHUNK_PROGRESS_EVERY = 10  # Frames between progress messages from a worker
+
+_worker_progress = None
+_worker_cancel = None
+
+
+def _init_render_worker(progress_queue, cancel_event):
+    global _worker_progress, _worker_cancel
+    _worker_progress = progress_queue
+    _worker_cancel = cancel_event
+    cv2.setNumThreads(1)  # One process per core already keeps every core busy
+
+
+def _read_frame(directory, frame):
+    if getattr(frame, "pack", None) is not None:
+        from frame_pack import read_packed_frame
+        return read_packed_frame(directory, frame)
+    with open(os.path.join(directory, frame.name), "rb") as f:
+        return f.read()
+
+
+def _render_chunk(chunk, directory, frames, part_path, size, quality, luts=None, overlay=None):
+    """Encode one chunk of frames into a part file of '00dc' chunks, runs in a worker process.
+
+    luts holds a deflicker lookup table (or None) per frame, overlay is an
+    optional TextOverlay. Returns (JPEG sizes of the frames written, names
+    of unreadable frames), see mjpeg_avi.MjpegAviWriter.append_chunks().
+    """
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    sizes = []
+    unreadable = []
+    with open(part_path, "wb") as part:
+        for done, frame in enumerate(frames, 1):
+            if _worker_cancel.is_set():
+                raise RenderCancelled()
+            try:
+                data = _read_frame(directory, frame)
+            except OSError:
+                data = None
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+            ok = False
+            if image is not None:
+                image = fit_frame(image, size)
+                if luts is not None and luts[done - 1] is not None:
+                    image = apply_lut(image, luts[done - 1])
+                if overlay is not None:
+                    image = overlay.apply(image, frame.timestamp)
+                ok, encoded = cv2.imencode(".jpg", image, encode_param)
+            if ok:
+                mjpeg_avi.write_chunk(part, encoded)
+                sizes.append(len(encoded))
+            else:
+                unreadable.append(frame.name)
+            if done % CHUNK_PROGRESS_EVERY == 0 or done == len(frames):
+                _worker_progress.put((chunk, done))
+    return sizes, unreadable
+
+
+class ParallelRenderJob(RenderJob):
+    """Render a long frame sequence on several processes, into an MJPEG AVI.
+
+    The frames are split into contiguous chunks and every chunk is encoded
+    into its own part file by a worker process, which reports the size of
+    each JPEG. The parts are then copied into the video in bulk with the
+    index built from those sizes (mjpeg_avi), so the result is the same as
+    a sequential render. Progress is summed over the workers. Workers read
+    the frames themselves, so the catalog must be a folder store
+    (FrameCatalog or FramePackStore) on the local disk.
+    """
+
+    def __init__(self, catalog, frames, video_path, fps=10, processes=None, quality=90, **kwargs):
+        super().__init__(catalog, frames, video_path, fps=fps, **kwargs)
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.quality = quality
+
+    def _chunks(self):
+        """Contiguous slices of the frames, a few per process to even out the load"""
+        count = max(1, min(self.processes * 3, len(self.frames) // MIN_CHUNK_FRAMES))
+        step = math.ceil(len(self.frames) / count)
+        return [self.frames[i:i + step] for i in range(0, len(self.frames), step)]
+
+    def run(self, progress=None, status=None):
+        """Render the video, see RenderJob.run"""
+        status = status or (lambda message: None)
+        total = len(self.frames)
+        if total == 0:
+            raise RuntimeError("Tidak ada gambar untuk membuat video!")
+        self.frame_size = self._video_size()
+        if self.frame_size is None:
+            raise RuntimeError("Tidak bisa membaca file gambar")
+        # Video players want even dimensions
+        w, h = self.frame_size[0] // 2 * 2, self.frame_size[1] // 2 * 2
+        self.frame_size = (w, h)
+        self._prepare_deflicker(status)
+
+        chunks = self._chunks()
+        processes = min(self.processes, len(chunks))
+        part_paths = [f"{self.video_path}.part{i:03d}" for i in range(len(chunks))]
+        status(f"Membuat video MJPEG: {w}x{h} dengan {self.fps} FPS, "
+               f"{len(chunks)} bagian di {processes} proses")
+
+        # spawn rather than fork: the GUI has threads running that a fork would copy mid-flight
+        context = multiprocessing.get_context("spawn")
+        progress_queue = context.Queue()
+        cancel_event = context.Event()
+        done_per_chunk = [0] * len(chunks)
+        part_sizes = [None] * len(chunks)
+        last_report = 0
+        started = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                     initializer=_init_render_worker,
+                                     initargs=(progress_queue, cancel_event)) as pool:
+                futures = {pool.submit(_render_chunk, i, self.catalog.directory, chunk, part_paths[i],
+                                       self.frame_size, self.quality,
+                                       [self._luts.get(frame.seq) for frame in chunk] if self._luts else None,
+                                       self.overlay): i
+                           for i, chunk in enumerate(chunks)}
+                pending = set(futures)
+                try:
+                    while pending:
+                        if self._cancel.is_set():
+                            cancel_event.set()
+                        finished, pending = wait(pending, timeout=self.progress_interval,
+                                                 return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            sizes, unreadable = future.result()  # Re-raises a worker's error
+                            part_sizes[futures[future]] = sizes
+                            self.frames_written += len(sizes)
+                            self.frames_skipped += len(unreadable)
+                            for name in unreadable:
+                                status(f"Gambar rusak: {name}")
+                        while True:
+                            try:
+                                chunk, done = progress_queue.get_nowait()
+                            except queue.Empty:
+                                break
+                            done_per_chunk[chunk] = done
+                        now = time.monotonic()
+                        if progress and now - last_report >= self.progress_interval:
+                            last_report = now
+                            progress(sum(done_per_chunk), total)
+                except BaseException:
+                    cancel_event.set()  # Stop the other workers instead of waiting for them
+                    raise
+            if self._cancel.is_set():
+                raise RenderCancelled()
+            if self.metrics is not None:
+                self.metrics.observe("render_chunks", time.perf_counter() - started)
+
+            if self.frames_written == 0:
+                raise RuntimeError("Tidak ada gambar yang bisa dibaca")
+
+            status(f"Menggabungkan {len(part_paths)} bagian video")
+            joined = time.perf_counter()
+            writer = mjpeg_avi.MjpegAviWriter(self.video_path, w, h, self.fps)
+            try:
+                for path, sizes in zip(part_paths, part_sizes):
+                    with open(path, "rb") as part:
+                        writer.append_chunks(part, sizes)
+                    os.remove(path)
+                writer.close()
+            except BaseException:
+                writer.abort()
+                raise
+            if self.metrics is not None:
+                self.metrics.observe("render_join", time.perf_counter() - joined)
+                self.metrics.count("frames_rendered", self.frames_written)
+        finally:
+            for path in part_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if progress:
+            progress(total, total)
+        return self.frames_written
+
+
+class PassthroughRenderJob(RenderJob):
+    """Mux the captured JPEG bytes into an MJPEG AVI without decoding them.
+
+    A frame of the video size is copied byte for byte, so the export runs
+    at disk read speed. Only frames of another size or format (an archived
+    WebP, a capture from before a resolution change) are decoded, fitted and
+    re-encoded at `quality`. Files are read ahead by a small thread pool.
+    Deflicker and overlays change the pixels, ParallelRenderJob does those.
+    """
+
+    def __init__(self, catalog, frames, video_path, fps=10, quality=90, **kwargs):
+        super().__init__(catalog, frames, video_path, fps=fps, **kwargs)
+        self.quality = quality
+        self.frames_copied = 0
+        self.frames_reencoded = 0
+
+    def _decode(self, frame):
+        """(JPEG bytes for the video, whether they were copied unchanged), None if unreadable"""
+        try:
+            data = self.catalog.read_bytes(frame)
+        except OSError:
+            return None
+        if jpeg_size(data[:65536]) == self.frame_size:
+            return data, True
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        ok, encoded = cv2.imencode(".jpg", fit_frame(image, self.frame_size),
+                                   [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        return (encoded.tobytes(), False) if ok else None
+
+    def _add(self, writer, result):
+        data, copied = result
+        writer.add_jpeg(data)
+        if copied:
+            self.frames_copied += 1
+        else:
+            self.frames_reencoded += 1
+
+    def run(self, progress=None, status=None):
+        """Write the video, see RenderJob.run"""
+        status = status or (lambda message: None)
+        items = self._items()
+        if not items:
+            raise RuntimeError("Tidak ada gambar untuk membuat video!")
+        self.frame_size = self._video_size()
+        if self.frame_size is None:
+            raise RuntimeError("Tidak bisa membaca file gambar")
+        w, h = self.frame_size
+        status(f"Menyalin JPEG ke MJPEG AVI: {w}x{h} dengan {self.fps} FPS, tanpa encode ulang")
+
+        writer = mjpeg_avi.MjpegAviWriter(self.video_path, w, h, self.fps)
+        started = time.perf_counter()
+        try:
+            self._write_frames(items, lambda result: self._add(writer, result), progress, status)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        if self.metrics is not None:
+            self.metrics.observe("render_passthrough", time.perf_counter() - started)
+            self.metrics.count("frames_passthrough", self.frames_copied)
+            self.metrics.count("frames_reencoded", self.frames_reencoded)
+        if self.frames_reencoded:
+            status(f"{self.frames_reencoded} gambar berbeda ukuran atau format di-encode ulang")
+        if self.frames_written == 0:
+            raise RuntimeError("Tidak ada gambar yang bisa dibaca")
+        return self.frames_written